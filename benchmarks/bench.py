@@ -0,0 +1,340 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from contextlib import contextmanager
+from pathlib import Path
+
+from synth import SynthParams, add_param_args, generate, params_from_args
+
+# Times the plugin on a synthetic project:
+#   python benchmarks/bench.py --depth 2 --instances 8 --footprints 200 -o results.json
+#   python benchmarks/bench.py ... --compare previous.json
+#
+# The parse and geometry phases only need Python, everything from the hierarchy on
+# needs pcbnew, so run it with KiCad's interpreter to get the full picture. Phases
+# that can't run are listed under "skipped" in the results.
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent / "src"
+PACKAGE = "projinst"
+
+RESULTS_VERSION = 1
+
+
+def install_package():
+    """Make the plugin importable as PACKAGE without running its __init__."""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(PLUGIN_DIR)]
+        sys.modules[PACKAGE] = package
+
+
+# At import, worker processes started from here load this file again and need it too
+install_package()
+
+
+def import_plugin(name: str):
+    """Import a plugin module without running the package __init__, which registers the action plugin."""
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+class Timings:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.samples = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def measure(self, name: str, function):
+        """Run `function` `repeat` times, timing each run. Returns the last result."""
+        result = None
+        for _ in range(self.repeat):
+            with self.phase(name):
+                result = function()
+        return result
+
+    def results(self) -> dict:
+        return {
+            name: {
+                "total": sum(samples),
+                "calls": len(samples),
+                "median": statistics.median(samples),
+                "min": min(samples),
+                "max": max(samples),
+            }
+            for name, samples in self.samples.items()
+        }
+
+
+def memory_usage() -> dict:
+    """Current and peak resident memory of this process in bytes, None where they can't be read."""
+    usage = {"current": None, "peak": None}
+
+    try:
+        import resource
+    except ImportError:
+        return usage
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    usage["peak"] = peak if sys.platform == "darwin" else peak * 1024
+
+    try:
+        with open("/proc/self/statm") as fp:
+            usage["current"] = int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    return usage
+
+
+def bench_parse(project, timings: Timings):
+    simpleSchParser = import_plugin("simpleSchParser")
+    simplePcbParser = import_plugin("simplePcbParser")
+
+    for sheet in project.sheets:
+        timings.measure("parse.schematic", lambda: simpleSchParser.sch_parse_file(sheet))
+
+    timings.measure("parse.footprintIndex", lambda: simplePcbParser.pcb_read_footprints(project.leafBoard))
+    timings.measure("parse.rootFootprintIndex", lambda: simplePcbParser.pcb_read_footprints(project.rootBoard))
+
+
+def bench_geometry(params: SynthParams, leafCount: int, timings: Timings, workers: int):
+    """Placing a template of the synthetic size for every instance, serially and on worker processes."""
+    geometry = import_plugin("geometry")
+    transform = import_plugin("transform")
+
+    def columns(count: int):
+        return transform.point_columns((i * 1000, i * 2000) for i in range(count))
+
+    # A few pads per footprint and a few corners per zone, roughly what the boards hold
+    template = geometry.TemplateGeometry(
+        columns(params.footprints * 4), columns(params.tracks), columns(params.tracks),
+        columns(params.drawings * 2), columns(params.zones * 16),
+    )
+    rigids = [transform.RigidTransform(90 * i, i * 10**6, 0) for i in range(leafCount)]
+
+    timings.measure("geometry.serial", lambda: [geometry.place(template, rigid) for rigid in rigids])
+    if workers > 1:
+        timings.measure("geometry.workers", lambda: geometry._place_parallel(template, rigids, workers))
+
+
+def bench_plugin(project, timings: Timings, counts: dict, memory: dict):
+    hdata = import_plugin("hdata")
+    placement = import_plugin("placement")
+    pcbnew = sys.modules["pcbnew"]
+
+    # Hierarchy construction, without and with the schematic cache. Nothing is
+    # carried over between runs, so every SheetFile is built again
+    def uncached():
+        hdata.sheetFileManager.sheetDict.clear()
+        sheetFile = hdata.SheetFile(hdata.sch_from_brd_path(project.rootBoard))
+        with timings.phase("hierarchy.generateSubsheets"):
+            return hdata.RootInstance(sheetFile)
+
+    timings.measure("hierarchy.uncached", uncached)
+
+    project.rootBoard.with_suffix(".projinst.cache.json").unlink(missing_ok=True)
+    hdata.sheetFileManager.sheetDict.clear()
+    with timings.phase("hierarchy.coldCache"):
+        hdata.build_hierarchy(project.rootBoard)
+
+    def warm():
+        hdata.sheetFileManager.sheetDict.clear()
+        return hdata.build_hierarchy(project.rootBoard)
+
+    rootInstance = timings.measure("hierarchy.warmCache", warm)
+    leaves = list(rootInstance.leaves())
+    counts["leaves"] = len(leaves)
+
+    # Sub-board loading
+    def load_leaf():
+        handle = hdata.LazyBoard(project.leafBoard)
+        return handle.get()
+
+    timings.measure("load.subBoard", load_leaf)
+    targetBoard = timings.measure("load.rootBoard", lambda: pcbnew.LoadBoard(str(project.rootBoard)))
+
+    # applyBoard, phase by phase, the same steps in the same order
+    sheetFile = leaves[0].sheetFile
+    template = timings.measure("apply.template", sheetFile.buildTemplate)
+    counts["template"] = {
+        "footprints": len(template.footprints),
+        "tracks": len(template.tracks),
+        "drawings": len(template.drawings),
+        "zones": len(template.zones),
+    }
+
+    with timings.phase("apply.boardIndex"):
+        boardIndex = placement.BoardIndex(targetBoard)
+
+    for leaf in leaves:
+        fpTranslator = placement.FootprintTranslator(boardIndex, leaf._uuidPath)
+        targetAnchor = fpTranslator.getTarget(template.anchorFootprint)
+        if not targetAnchor:
+            raise RuntimeError(f"Anchor not found for {leaf._uuidPath}")
+
+        with timings.phase("apply.context"):
+            context = placement.ReplicateContext(
+                template.anchorFootprint, targetAnchor, leaf._uuid, boardIndex
+            )
+        with timings.phase("apply.clear"):
+            placement.clear_volatile_items(context)
+        with timings.phase("apply.footprints"):
+            netMap = placement.enforce_position_footprints(context, fpTranslator, template)
+        with timings.phase("apply.drawings"):
+            placement.copy_drawings(context, template)
+        with timings.phase("apply.tracks"):
+            placement.copy_traces(context, template, netMap)
+        with timings.phase("apply.zones"):
+            placement.copy_zones(context, template, netMap)
+
+    with timings.phase("apply.commit"):
+        boardIndex.commit()
+
+    # Again, but through applyChildren on a clean board. The second pass replaces
+    # what the first one made, which is the common case of re-applying
+    for leaf in leaves:
+        leaf.enabled = True
+    targetBoard = pcbnew.LoadBoard(str(project.rootBoard))
+    memory["beforeApply"] = memory_usage()
+    with timings.phase("applyChildren.first"):
+        rootInstance.applyChildren(targetBoard=targetBoard)
+    with timings.phase("applyChildren.again"):
+        summary = rootInstance.applyChildren(targetBoard=targetBoard)
+    counts["applied"] = len(summary["applied"])
+    counts["failed"] = len(summary["failed"])
+
+    # Sub-boards are released after they're applied, what's left is the root board
+    # and what the plugin keeps between runs
+    memory["afterApply"] = memory_usage()
+    counts["loadedBoards"] = sum(
+        sheetFile.hasBoard and sheetFile._boardHandle.loaded
+        for sheetFile in hdata.sheetFileManager.sheetDict.values()
+    )
+
+
+def environment() -> dict:
+    env = {
+        "python": sys.version,
+        "platform": platform.platform(),
+    }
+
+    try:
+        env["commit"] = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=PLUGIN_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        env["commit"] = None
+
+    try:
+        transform = import_plugin("transform")
+        env["numpy"] = transform.numpy is not None
+    except ImportError:
+        env["numpy"] = None
+
+    pcbnew = sys.modules.get("pcbnew")
+    env["kicad"] = pcbnew.GetBuildVersion() if pcbnew else None
+    return env
+
+
+def run(params: SynthParams, workDir: Path, repeat: int, workers: int) -> dict:
+    timings = Timings(repeat)
+    counts = {}
+    memory = {}
+    skipped = []
+
+    with timings.phase("generate"):
+        project = generate(workDir, params)
+    counts["sheets"] = len(project.sheets)
+    counts["instances"] = project.leafCount
+
+    bench_parse(project, timings)
+    bench_geometry(params, project.leafCount, timings, workers)
+
+    try:
+        import pcbnew  # noqa: F401
+    except ImportError:
+        skipped += ["hierarchy", "load", "apply", "applyChildren"]
+    else:
+        bench_plugin(project, timings, counts, memory)
+    memory["end"] = memory_usage()
+
+    return {
+        "version": RESULTS_VERSION,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": params._asdict(),
+        "repeat": repeat,
+        "environment": environment(),
+        "counts": counts,
+        "phases": timings.results(),
+        "memory": memory,
+        "skipped": skipped,
+    }
+
+
+def compare(results: dict, previous: dict):
+    """Print the total of every phase next to the one from an earlier run."""
+    if previous.get("params") != results["params"]:
+        print("Warning: the runs used different parameters", file=sys.stderr)
+
+    print(f"{'phase':32} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name, phase in results["phases"].items():
+        before = previous.get("phases", {}).get(name)
+        if not before:
+            print(f"{name:32} {'':>10} {phase['total']:10.4f}")
+            continue
+        ratio = phase["total"] / before["total"] if before["total"] else float("inf")
+        print(f"{name:32} {before['total']:10.4f} {phase['total']:10.4f} {ratio:7.2f}")
+
+    before = previous.get("memory", {}).get("end", {}).get("peak")
+    after = results["memory"]["end"]["peak"]
+    if before and after:
+        print(f"{'peak memory (MB)':32} {before / 1e6:10.1f} {after / 1e6:10.1f} {after / before:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plugin on a synthetic project.")
+    add_param_args(parser)
+    parser.add_argument("-o", "--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each repeatable phase")
+    parser.add_argument("--workdir", type=Path, help="Where to generate the project, a temporary directory by default")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Worker processes for the geometry.workers phase, below 2 skips it",
+    )
+    parser.add_argument("--compare", type=Path, help="Results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    params = params_from_args(args)
+    if args.workdir:
+        results = run(params, args.workdir, args.repeat, args.workers)
+    else:
+        with tempfile.TemporaryDirectory(prefix="projinst-bench-") as workDir:
+            results = run(params, Path(workDir), args.repeat, args.workers)
+
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+    else:
+        for name, phase in results["phases"].items():
+            print(f"{name:32} {phase['total']:10.4f}s over {phase['calls']} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+import argparse
+import itertools
+import random
+import uuid
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+# Writes a synthetic hierarchical project for the benchmarks:
+#
+#   Root.kicad_sch/.kicad_pcb       `instances` sheets of L<depth-1>
+#   L<n>/L<n>.kicad_sch             `instances` sheets of L<n-1>, no board so it's a branch
+#   ...
+#   Leaf/Leaf.kicad_sch/.kicad_pcb  the replicated sub-project
+#
+# The root board already has every footprint of every instance, placed in a grid,
+# the way it would be after updating the PCB from the schematic.
+#
+# Only the parts of the file formats the plugin and pcbnew.LoadBoard need are written,
+# the schematics won't open cleanly in eeschema (there are no library symbols).
+
+SCH_VERSION = 20231120
+PCB_VERSION = 20240108
+
+PCB_LAYERS = """\t(layers
+\t\t(0 "F.Cu" signal)
+\t\t(31 "B.Cu" signal)
+\t\t(36 "B.SilkS" user "B.Silkscreen")
+\t\t(37 "F.SilkS" user "F.Silkscreen")
+\t\t(38 "B.Mask" user)
+\t\t(39 "F.Mask" user)
+\t\t(44 "Edge.Cuts" user)
+\t\t(46 "B.CrtYd" user "B.Courtyard")
+\t\t(47 "F.CrtYd" user "F.Courtyard")
+\t\t(48 "B.Fab" user)
+\t\t(49 "F.Fab" user)
+\t)
+"""
+
+# Footprint grid pitch inside a sub-board, and the spacing between instances on the root board
+FOOTPRINT_PITCH = 5.0
+INSTANCE_MARGIN = 20.0
+
+
+class SynthParams(NamedTuple):
+    # Levels of sheets between the root and the leaf sub-project, 1 puts the leaves on the root
+    depth: int = 2
+    # Sheets per schematic, the root has instances ** depth leaves
+    instances: int = 4
+    footprints: int = 50
+    tracks: int = 200
+    zones: int = 4
+    drawings: int = 50
+    seed: int = 0
+
+
+class SynthProject(NamedTuple):
+    params: SynthParams
+    rootBoard: Path
+    rootSheet: Path
+    leafBoard: Path
+    # Every schematic that was written, root first
+    sheets: List[Path]
+    leafCount: int
+
+
+class _Uuids:
+    """Reproducible uuids, so the same parameters always produce the same files."""
+
+    def __init__(self, seed: int):
+        self._random = random.Random(seed)
+
+    def __call__(self) -> str:
+        return str(uuid.UUID(int=self._random.getrandbits(128), version=4))
+
+
+def _mm(value: float) -> str:
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+def _grid(index: int, columns: int, pitch: float):
+    return (index % columns) * pitch, (index // columns) * pitch
+
+
+def _columns(count: int) -> int:
+    return max(1, int(count ** 0.5 + 0.999))
+
+
+def _sheet_block(uuidStr: str, name: str, sheetFile: str, index: int) -> str:
+    x, y = _grid(index, 8, 25.4)
+    return f"""\t(sheet
+\t\t(at {_mm(x + 25.4)} {_mm(y + 25.4)})
+\t\t(size 15.24 10.16)
+\t\t(uuid "{uuidStr}")
+\t\t(property "Sheetname" "{name}"
+\t\t\t(at {_mm(x + 25.4)} {_mm(y + 24.4)} 0)
+\t\t)
+\t\t(property "Sheetfile" "{sheetFile}"
+\t\t\t(at {_mm(x + 25.4)} {_mm(y + 36.4)} 0)
+\t\t)
+\t)
+"""
+
+
+def _symbol_block(uuidStr: str, reference: str, index: int) -> str:
+    x, y = _grid(index, 20, 7.62)
+    return f"""\t(symbol
+\t\t(lib_id "Device:R_Small")
+\t\t(at {_mm(x + 25.4)} {_mm(y + 25.4)} 0)
+\t\t(unit 1)
+\t\t(in_bom yes)
+\t\t(on_board yes)
+\t\t(uuid "{uuidStr}")
+\t\t(property "Reference" "{reference}"
+\t\t\t(at {_mm(x + 26.4)} {_mm(y + 24.4)} 0)
+\t\t)
+\t\t(property "Value" "10k"
+\t\t\t(at {_mm(x + 26.4)} {_mm(y + 26.4)} 0)
+\t\t)
+\t\t(property "Footprint" "Resistor_SMD:R_0603_1608Metric"
+\t\t\t(at {_mm(x + 25.4)} {_mm(y + 25.4)} 0)
+\t\t)
+\t)
+"""
+
+
+def _schematic(uuidStr: str, body: str) -> str:
+    return f"""(kicad_sch
+\t(version {SCH_VERSION})
+\t(generator "projinst-bench")
+\t(uuid "{uuidStr}")
+\t(paper "A4")
+\t(lib_symbols)
+{body}\t(sheet_instances
+\t\t(path "/"
+\t\t\t(page "1")
+\t\t)
+\t)
+)
+"""
+
+
+def _footprint_block(
+    uuids: _Uuids, reference: str, path: str, x: float, y: float, angle: float, nets
+) -> str:
+    pads = "".join(
+        f"""\t\t(pad "{number}" smd roundrect
+\t\t\t(at {_mm(offset)} 0 {_mm(angle)})
+\t\t\t(size 0.8 0.95)
+\t\t\t(layers "F.Cu" "F.Mask")
+\t\t\t(roundrect_rratio 0.25)
+\t\t\t(net {code} "{name}")
+\t\t\t(uuid "{uuids()}")
+\t\t)
+"""
+        for number, offset, (code, name) in zip(("1", "2"), (-0.825, 0.825), nets)
+    )
+    return f"""\t(footprint "Resistor_SMD:R_0603_1608Metric"
+\t\t(layer "F.Cu")
+\t\t(uuid "{uuids()}")
+\t\t(at {_mm(x)} {_mm(y)} {_mm(angle)})
+\t\t(property "Reference" "{reference}"
+\t\t\t(at 0 -1.43 {_mm(angle)})
+\t\t\t(layer "F.SilkS")
+\t\t\t(uuid "{uuids()}")
+\t\t\t(effects
+\t\t\t\t(font
+\t\t\t\t\t(size 1 1)
+\t\t\t\t\t(thickness 0.15)
+\t\t\t\t)
+\t\t\t)
+\t\t)
+\t\t(property "Value" "10k"
+\t\t\t(at 0 1.43 {_mm(angle)})
+\t\t\t(layer "F.Fab")
+\t\t\t(uuid "{uuids()}")
+\t\t\t(effects
+\t\t\t\t(font
+\t\t\t\t\t(size 1 1)
+\t\t\t\t\t(thickness 0.15)
+\t\t\t\t)
+\t\t\t)
+\t\t)
+\t\t(path "{path}")
+\t\t(attr smd)
+\t\t(fp_line
+\t\t\t(start -1.48 -0.73)
+\t\t\t(end 1.48 -0.73)
+\t\t\t(stroke
+\t\t\t\t(width 0.05)
+\t\t\t\t(type solid)
+\t\t\t)
+\t\t\t(layer "F.CrtYd")
+\t\t\t(uuid "{uuids()}")
+\t\t)
+{pads}\t)
+"""
+
+
+def _board(nets: List[str], body: str) -> str:
+    netTable = "".join(f'\t(net {code} "{name}")\n' for code, name in enumerate(nets))
+    return f"""(kicad_pcb
+\t(version {PCB_VERSION})
+\t(generator "projinst-bench")
+\t(general
+\t\t(thickness 1.6)
+\t\t(legacy_teardrops no)
+\t)
+\t(paper "A4")
+{PCB_LAYERS}\t(setup
+\t\t(pad_to_mask_clearance 0)
+\t)
+{netTable}{body})
+"""
+
+
+def _leaf_board(params: SynthParams, uuids: _Uuids, rng: random.Random, symbolUuids: List[str]) -> str:
+    columns = _columns(params.footprints)
+    size = columns * FOOTPRINT_PITCH
+    netCount = params.footprints + 1
+    nets = [""] + [f"/N{index}" for index in range(1, netCount + 1)]
+
+    parts = []
+    for index, symbolUuid in enumerate(symbolUuids):
+        x, y = _grid(index, columns, FOOTPRINT_PITCH)
+        # Footprint i sits between nets i and i + 1, like a resistor ladder
+        padNets = [(index + 1, nets[index + 1]), (index + 2, nets[index + 2])]
+        parts.append(_footprint_block(
+            uuids, f"R{index + 1}", "/" + symbolUuid, x + 10, y + 10, 0, padNets
+        ))
+
+    for _ in range(params.tracks):
+        x1, y1 = rng.uniform(10, 10 + size), rng.uniform(10, 10 + size)
+        x2, y2 = x1 + rng.uniform(-3, 3), y1 + rng.uniform(-3, 3)
+        parts.append(f"""\t(segment
+\t\t(start {_mm(x1)} {_mm(y1)})
+\t\t(end {_mm(x2)} {_mm(y2)})
+\t\t(width 0.25)
+\t\t(layer "F.Cu")
+\t\t(net {rng.randrange(1, netCount + 1)})
+\t\t(uuid "{uuids()}")
+\t)
+""")
+
+    for _ in range(params.drawings):
+        x1, y1 = rng.uniform(10, 10 + size), rng.uniform(10, 10 + size)
+        parts.append(f"""\t(gr_line
+\t\t(start {_mm(x1)} {_mm(y1)})
+\t\t(end {_mm(x1 + rng.uniform(0.5, 3))} {_mm(y1)})
+\t\t(stroke
+\t\t\t(width 0.1)
+\t\t\t(type default)
+\t\t)
+\t\t(layer "F.SilkS")
+\t\t(uuid "{uuids()}")
+\t)
+""")
+
+    # Zones tile the sub-board
+    zoneColumns = _columns(params.zones)
+    cell = size / zoneColumns
+    for index in range(params.zones):
+        code = index % netCount + 1
+        x1, y1 = _grid(index, zoneColumns, cell)
+        x1 += 10
+        y1 += 10
+        x2 = x1 + cell
+        y2 = y1 + cell
+        parts.append(f"""\t(zone
+\t\t(net {code})
+\t\t(net_name "{nets[code]}")
+\t\t(layer "B.Cu")
+\t\t(uuid "{uuids()}")
+\t\t(hatch edge 0.5)
+\t\t(connect_pads
+\t\t\t(clearance 0.5)
+\t\t)
+\t\t(min_thickness 0.25)
+\t\t(filled_areas_thickness no)
+\t\t(fill
+\t\t\t(thermal_gap 0.5)
+\t\t\t(thermal_bridge_width 0.5)
+\t\t)
+\t\t(polygon
+\t\t\t(pts
+\t\t\t\t(xy {_mm(x1)} {_mm(y1)}) (xy {_mm(x2)} {_mm(y1)}) (xy {_mm(x2)} {_mm(y2)}) (xy {_mm(x1)} {_mm(y2)})
+\t\t\t)
+\t\t)
+\t)
+""")
+
+    return _board(nets, "".join(parts))
+
+
+def _root_board(
+    params: SynthParams, uuids: _Uuids, instancePaths: List[str], symbolUuids: List[str]
+) -> str:
+    columns = _columns(params.footprints)
+    size = columns * FOOTPRINT_PITCH
+    instanceColumns = _columns(len(instancePaths))
+
+    nets = [""]
+    parts = []
+    for instanceIndex, instancePath in enumerate(instancePaths):
+        originX, originY = _grid(instanceIndex, instanceColumns, size + INSTANCE_MARGIN)
+        firstNet = len(nets)
+        nets += [f"/I{instanceIndex}/N{index}" for index in range(1, params.footprints + 2)]
+
+        # Scattered on purpose, applying is what lines them up
+        for index, symbolUuid in enumerate(symbolUuids):
+            x, y = _grid(index, columns, FOOTPRINT_PITCH * 1.5)
+            padNets = [
+                (firstNet + index, nets[firstNet + index]),
+                (firstNet + index + 1, nets[firstNet + index + 1]),
+            ]
+            parts.append(_footprint_block(
+                uuids, f"R{instanceIndex * params.footprints + index + 1}",
+                f"{instancePath}/{symbolUuid}",
+                originX + x + 10, originY + y + 10, 90 if index % 2 else 0, padNets,
+            ))
+
+    return _board(nets, "".join(parts))
+
+
+def generate(outDir: Path, params: Optional[SynthParams] = None) -> SynthProject:
+    """Write a synthetic project to `outDir` and describe what was written."""
+    params = params or SynthParams()
+    if params.depth < 1:
+        raise ValueError("depth must be at least 1")
+
+    uuids = _Uuids(params.seed)
+    rng = random.Random(params.seed)
+    outDir.mkdir(parents=True, exist_ok=True)
+    sheets = []
+
+    # Leaf sub-project
+    leafDir = outDir / "Leaf"
+    leafDir.mkdir(exist_ok=True)
+    symbolUuids = [uuids() for _ in range(params.footprints)]
+    leafSheet = leafDir / "Leaf.kicad_sch"
+    leafSheet.write_text(_schematic(uuids(), "".join(
+        _symbol_block(symbolUuid, f"R{index + 1}", index)
+        for index, symbolUuid in enumerate(symbolUuids)
+    )), encoding="utf-8")
+    leafBoard = leafDir / "Leaf.kicad_pcb"
+    leafBoard.write_text(_leaf_board(params, uuids, rng, symbolUuids), encoding="utf-8")
+
+    # Branch levels, each one `instances` sheets of the level below. Sheet file paths
+    # are relative to the schematic that has the sheet
+    childFile = "Leaf/Leaf.kicad_sch"
+    levelSheetUuids = []
+    for level in range(1, params.depth):
+        levelDir = outDir / f"L{level}"
+        levelDir.mkdir(exist_ok=True)
+        sheetUuids = [uuids() for _ in range(params.instances)]
+        levelSheet = levelDir / f"L{level}.kicad_sch"
+        levelSheet.write_text(_schematic(uuids(), "".join(
+            _sheet_block(sheetUuid, f"S{level}_{index}", "../" + childFile, index)
+            for index, sheetUuid in enumerate(sheetUuids)
+        )), encoding="utf-8")
+        sheets.append(levelSheet)
+        levelSheetUuids.append(sheetUuids)
+        childFile = f"L{level}/L{level}.kicad_sch"
+
+    rootSheetUuids = [uuids() for _ in range(params.instances)]
+    rootSheet = outDir / "Root.kicad_sch"
+    rootSheet.write_text(_schematic(uuids(), "".join(
+        _sheet_block(sheetUuid, f"Top_{index}", childFile, index)
+        for index, sheetUuid in enumerate(rootSheetUuids)
+    )), encoding="utf-8")
+
+    # uuid path of every leaf instance, outermost sheet first
+    levels = [rootSheetUuids] + levelSheetUuids[::-1]
+    instancePaths = ["/" + "/".join(chain) for chain in itertools.product(*levels)]
+
+    rootBoard = outDir / "Root.kicad_pcb"
+    rootBoard.write_text(_root_board(params, uuids, instancePaths, symbolUuids), encoding="utf-8")
+
+    # Stale state from an earlier run would make the plugin skip instances
+    for stale in (rootBoard.with_suffix(".projinst.json"), rootBoard.with_suffix(".projinst.cache.json")):
+        stale.unlink(missing_ok=True)
+
+    return SynthProject(
+        params, rootBoard, rootSheet, leafBoard,
+        [rootSheet] + sheets[::-1] + [leafSheet], len(instancePaths),
+    )
+
+
+def add_param_args(parser: argparse.ArgumentParser):
+    defaults = SynthParams()
+    for name in SynthParams._fields:
+        parser.add_argument(f"--{name}", type=int, default=getattr(defaults, name))
+
+
+def params_from_args(args: argparse.Namespace) -> SynthParams:
+    return SynthParams(**{name: getattr(args, name) for name in SynthParams._fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic hierarchical KiCad project.")
+    parser.add_argument("output", type=Path, help="Directory to write the project to")
+    add_param_args(parser)
+    args = parser.parse_args()
+
+    project = generate(args.output, params_from_args(args))
+    print(f"{project.rootBoard}: {project.leafCount} instances of {project.leafBoard}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
-from .hplugin import ProjectInstancesPlugin
+import multiprocessing
 
-ProjectInstancesPlugin().register()
+# Worker processes started by geometry.py import this package to get at placeworker,
+# and shouldn't load pcbnew and wx for a plugin nobody will see
+if multiprocessing.current_process().name == "MainProcess":
+    from .hplugin import ProjectInstancesPlugin
+
+    ProjectInstancesPlugin().register()
@@ -0,0 +1,92 @@
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pcbnew
+
+from .profiling import profiler
+
+logger = logging.getLogger("hierpcb")
+
+
+class LazyBoard:
+    """A handle to a sub-board that is only loaded the first time it is needed."""
+
+    def __init__(self, boardPath: Path):
+        self._boardPath = boardPath
+        self._board = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._boardPath
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Optional[pcbnew.BOARD]:
+        """Load the board if needed, returns None if the board file is invalid."""
+        # Either the prefetcher or the main thread gets to load it, never both
+        with self._lock:
+            if not self._loaded:
+                self._board = self._load()
+                self._loaded = True
+            return self._board
+
+    def _load(self):
+        logger.info(f"Loading board {self._boardPath}")
+        with profiler.span("loadBoard", path=str(self._boardPath)):
+            try:
+                return pcbnew.LoadBoard(str(self._boardPath))
+            except Exception:
+                logger.warning(f"{str(self._boardPath)} Board file invalid")
+                return None
+
+    def release(self):
+        with self._lock:
+            self._board = None
+            self._loaded = False
+
+
+class BoardPrefetcher:
+    """
+    Warms LazyBoards on a worker thread while the dialog is open.
+
+    Off by default: pcbnew is not documented as thread safe and the SWIG wrappers
+    may hold the GIL while loading, so enable it with the "prefetchBoards" setting.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def prefetch(self, lazyBoard: LazyBoard):
+        if lazyBoard.loaded:
+            return
+
+        self._queue.put(lazyBoard)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="ProjectInstancesPrefetch", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                lazyBoard = self._queue.get(timeout=1)
+            except queue.Empty:
+                return
+            lazyBoard.get()
+
+    def cancel(self):
+        """Drop any queued boards, the board currently loading still finishes."""
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
@@ -1,30 +1,75 @@
 import contextlib
 import logging
+import os
+import stat
+import tempfile
 from pathlib import Path
 from types import TracebackType
-from typing import Any
+from typing import Any, Optional
 import json
 
 logger = logging.getLogger("hierpcb")
 
+# Keys are short paths into the nested config, like ("applied", uuidPath). Per instance
+# data is keyed by the full uuid path under one section, so a lookup is a dict access per
+# level and never a walk down the hierarchy.
+
 
 class ConfigMan(contextlib.AbstractContextManager):
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, compact: Optional[bool] = None):
         self.path = path
+        # None leaves it to the "compactConfig" setting
+        self.compact = compact
+        self.config = {}
+        # Keys set or cleared since the file was read, nothing is written without them
+        self.dirty = set()
 
     def __enter__(self) -> "ConfigMan":
+        self.read()
+        return self
+
+    def __exit__(self, *args):
+        if self.dirty:
+            self.write()
+        else:
+            logger.debug(f"No changes to {self.path}, not writing it")
+        return super().__exit__(*args)
+
+    def read(self):
+        """(Re)load the file, dropping any changes that weren't written."""
         try:
             with self.path.open("r") as fp:
                 self.config = json.load(fp)
         except FileNotFoundError:
-            logger.warning(f"Config file {self.path} not found. Creating new one.")
+            logger.warning(f"Config file {self.path} not found. It will be created if anything is saved.")
             self.config = {}
-        return self
+        self.dirty = set()
 
-    def __exit__(self, *args):
-        with self.path.open("w") as fp:
-            json.dump(self.config, fp, indent=2)
-        return super().__exit__(*args)
+    def write(self):
+        """Write the config through a temporary file, so a failed write leaves the old file intact."""
+        compact = self.compact
+        if compact is None:
+            compact = self.get("settings", "compactConfig", default=False)
+
+        fd, tempPath = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                if compact:
+                    json.dump(self.config, fp, separators=(",", ":"))
+                else:
+                    json.dump(self.config, fp, indent=2)
+            # mkstemp makes the file private, keep the permissions the config had
+            try:
+                os.chmod(tempPath, stat.S_IMODE(self.path.stat().st_mode))
+            except FileNotFoundError:
+                os.chmod(tempPath, 0o644)
+            os.replace(tempPath, self.path)
+        except BaseException:
+            Path(tempPath).unlink(missing_ok=True)
+            raise
+
+        logger.debug(f"Wrote {len(self.dirty)} changed keys to {self.path}")
+        self.dirty = set()
 
     def get(self, *key: str, default=None):
         node = self.config
@@ -40,7 +85,9 @@ class ConfigMan(contextlib.AbstractContextManager):
             node = node.get(k)
             if node is None:
                 return
-        node.pop(key[-1], None)
+        if key[-1] in node:
+            del node[key[-1]]
+            self.dirty.add(key)
 
     def set(self, *key: str, value, create_missing=True):
         node = self.config
@@ -55,4 +102,8 @@ class ConfigMan(contextlib.AbstractContextManager):
                 else:
                     raise KeyError(f"Key {'.'.join(prefix)} not found in config.")
             node = node_next
+
+        if terminal in node and node[terminal] == value:
+            return
         node[terminal] = value
+        self.dirty.add(key)
@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pcbnew
+
+from .cfgman import ConfigMan
+from .hdata import RootInstance, sheetFileManager, build_hierarchy, reapply_changed
+from .plan import plan_totals
+from .profiling import profiler, summarize, write_trace
+from .watch import DEFAULT_DEBOUNCE, DEFAULT_INTERVAL, SheetWatcher
+
+logger = logging.getLogger("hierpcb")
+
+# Replicate project instances without the PCB editor:
+#   python <plugin folder>/projinst_cli.py path/to/root.kicad_pcb [--instance NAME_OR_UUID_PATH ...]
+# A JSON summary of what was done is printed to stdout. With --watch it keeps running
+# and applies sub-projects again as they're saved, printing a summary for each.
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="projinst",
+        description="Apply sub-project layouts to a root board without opening the PCB editor.",
+    )
+    parser.add_argument("board", type=Path, help="The root .kicad_pcb")
+    parser.add_argument(
+        "-o", "--output", type=Path,
+        help="Where to save the result, defaults to overwriting the root board",
+    )
+    parser.add_argument(
+        "-i", "--instance", action="append", default=[],
+        help="Only apply this instance, by sheet name or uuid path. Can be repeated",
+    )
+    parser.add_argument(
+        "--all", action="store_true",
+        help="Apply every instance, not just the ones enabled in the .projinst.json",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Re-apply instances that haven't changed since the last run",
+    )
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Only print what would change, the board and config are left alone",
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help="Worker processes to place instances on, overrides the geometryWorkers setting",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Write a timing trace next to the output board and print a summary to stderr",
+    )
+    parser.add_argument(
+        "--profile-swig", action="store_true",
+        help="Also count calls into pcbnew, slows the run down",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="After applying, keep applying the instances of sub-projects that are saved, until interrupted",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=DEFAULT_INTERVAL,
+        help="Seconds between checks for changed files in --watch mode",
+    )
+    parser.add_argument(
+        "--debounce", type=float, default=DEFAULT_DEBOUNCE,
+        help="Seconds a changed file has to stay the same before it's applied in --watch mode",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log to stderr")
+    args = parser.parse_args(argv)
+    if args.watch and args.plan:
+        parser.error("--watch can't be combined with --plan")
+    return args
+
+
+def select_instances(rootInstance: RootInstance, selectors: List[str], applyAll: bool):
+    """Override which leaves are enabled for this run, the config file keeps its own."""
+    if not selectors and not applyAll:
+        return
+
+    for leaf in rootInstance.leaves():
+        leaf.enabled = applyAll or any(
+            selector in (leaf.name, leaf._uuidPath, leaf._uuid) for selector in selectors
+        )
+
+
+def run(args: argparse.Namespace) -> dict:
+    timings = {}
+    boardPath = args.board.resolve()
+
+    start = time.perf_counter()
+    with profiler.span("loadBoard", path=str(boardPath)):
+        board = pcbnew.LoadBoard(str(boardPath))
+    timings["loadBoard"] = time.perf_counter() - start
+
+    outputPath = (args.output or boardPath).resolve()
+
+    with ConfigMan(boardPath.with_suffix(".projinst.json")) as cfg:
+        start = time.perf_counter()
+        rootInstance = build_hierarchy(boardPath)
+        sheetFileManager.load_file_data(cfg)
+        rootInstance.load(cfg)
+        select_instances(rootInstance, args.instance, args.all)
+        timings["hierarchy"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        force = args.force or cfg.get("settings", "force", default=False)
+        with profiler.span("apply"):
+            summary = rootInstance.applyChildren(
+                cfg, force=force, targetBoard=board, dryRun=args.plan, workers=args.workers
+            )
+        timings["apply"] = time.perf_counter() - start
+
+        # What was applied is only remembered if it ends up in the root board,
+        # otherwise the next run on the root board would skip those instances
+        if outputPath != boardPath or args.plan:
+            cfg.read()
+
+    summary["board"] = str(boardPath)
+    summary["output"] = str(outputPath)
+    summary["timings"] = timings
+
+    if args.plan:
+        summary["totals"] = plan_totals(summary["plan"])
+        return summary
+
+    start = time.perf_counter()
+    with profiler.span("saveBoard"):
+        pcbnew.SaveBoard(str(outputPath), board)
+    timings["save"] = time.perf_counter() - start
+    return summary
+
+
+def watch(args: argparse.Namespace):
+    """Apply the instances of changed sub-projects to the output board until interrupted."""
+    boardPath = args.board.resolve()
+    outputPath = (args.output or boardPath).resolve()
+    # Carries on from what the first run saved
+    board = pcbnew.LoadBoard(str(outputPath))
+    watcher = SheetWatcher(sheetFileManager, debounce=args.debounce)
+
+    def prepare(rootInstance: RootInstance):
+        select_instances(rootInstance, args.instance, args.all)
+
+    logger.info(f"Watching {len(sheetFileManager.sheetDict)} sheets for changes")
+    try:
+        while True:
+            time.sleep(args.interval)
+            changed = watcher.poll()
+            if not changed:
+                continue
+
+            with ConfigMan(boardPath.with_suffix(".projinst.json")) as cfg:
+                summary = reapply_changed(boardPath, changed, cfg, board, prepare)
+                if outputPath != boardPath:
+                    cfg.read()
+
+            if summary["applied"]:
+                pcbnew.SaveBoard(str(outputPath), board)
+
+            json.dump(summary, sys.stdout)
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(logging.StreamHandler(sys.stderr))
+
+    if args.profile or args.profile_swig:
+        profiler.start(args.profile_swig)
+
+    try:
+        summary = run(args)
+    finally:
+        trace = profiler.stop()
+
+    if trace:
+        tracePath = Path(summary["output"]).with_suffix(".projinst.trace.json")
+        write_trace(trace, tracePath)
+        summary["trace"] = str(tracePath)
+        sys.stderr.write(summarize(trace) + "\n")
+
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+    if args.watch:
+        sys.stdout.flush()
+        watch(args)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
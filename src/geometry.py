@@ -0,0 +1,89 @@
+import logging
+import multiprocessing
+import multiprocessing.spawn
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from .placeworker import InstanceGeometry, TemplateGeometry, init_worker, place, place_in_worker
+from .profiling import profiler
+from .transform import RigidTransform
+
+logger = logging.getLogger("hierpcb")
+
+# Where every item of a template ends up for each instance, worked out ahead of
+# applying so it can be spread over worker processes. Only plain numbers cross
+# the process boundary, the board itself is only ever touched on the main thread.
+#
+# Starting workers costs a few hundred ms and the results have to be sent back, so
+# this only pays off for boards with many instances of large sub-boards. It's off
+# unless "geometryWorkers" is set, and even then small jobs are placed serially.
+# benchmarks/bench.py times both, check it before turning workers on.
+
+# Below this many points over all instances, workers are never started
+PARALLEL_MIN_POINTS = 1_000_000
+
+
+def python_executable() -> Optional[str]:
+    """An interpreter to start workers with. Inside KiCad sys.executable can be KiCad itself."""
+    for candidate in (sys.executable, getattr(sys, "_base_executable", None)):
+        if candidate and Path(candidate).name.lower().startswith("python"):
+            return candidate
+
+    # KiCad ships its python next to its own binaries
+    binDir = Path(sys.executable).parent
+    for name in ("python3", "python", "python.exe", "python3.exe"):
+        if (binDir / name).exists():
+            return str(binDir / name)
+    return None
+
+
+def place_many(
+    geometry: TemplateGeometry,
+    rigids: List[RigidTransform],
+    workers: int = 0
+) -> List[InstanceGeometry]:
+    """
+    Place `geometry` for every transform, on up to `workers` processes.
+    Runs serially with fewer than two workers, for jobs under PARALLEL_MIN_POINTS
+    or if the workers can't be started.
+    """
+    with profiler.span("geometry", instances=len(rigids), workers=workers):
+        if workers > 1 and len(rigids) > 1 and point_count(geometry) * len(rigids) >= PARALLEL_MIN_POINTS:
+            try:
+                return _place_parallel(geometry, rigids, min(workers, len(rigids)))
+            except Exception:
+                logger.exception("Worker processes failed, placing instances serially")
+
+        return [place(geometry, rigid) for rigid in rigids]
+
+
+def point_count(geometry: TemplateGeometry) -> int:
+    return sum(len(xs) for xs, _ in geometry)
+
+
+def _place_parallel(geometry: TemplateGeometry, rigids: List[RigidTransform], workers: int):
+    executable = python_executable()
+    if executable is None:
+        raise RuntimeError("No python interpreter found to start workers with")
+
+    # Forking the editor with its UI threads isn't safe, workers always start fresh
+    context = multiprocessing.get_context("spawn")
+    # The executable is shared by the whole process, put back whatever KiCad had set
+    previous = multiprocessing.spawn.get_executable()
+    context.set_executable(executable)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(geometry,),
+        ) as pool:
+            chunksize = max(1, len(rigids) // (workers * 4))
+            placed = list(pool.map(place_in_worker, rigids, chunksize=chunksize))
+    finally:
+        context.set_executable(previous)
+
+    logger.info(f"Placed {len(rigids)} instances on {workers} worker processes")
+    return placed
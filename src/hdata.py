@@ -1,12 +1,24 @@
+import hashlib
 import logging
+import os
+import threading
 from pathlib import Path
+from typing import Callable, List, Optional
 
 from .cfgman import ConfigMan
+from .schcache import SheetCache
 from .simpleSchParser import sch_parse_file
+from .simplePcbParser import pcb_read_footprints
+from .sexpscan import SexpError
+from .boardload import LazyBoard, BoardPrefetcher
 from .placement import *
+from .template import REGIONS, ReplicationTemplate
+from .plan import plan_instance
+from .geometry import InstanceGeometry, place_many
+from .hierindex import HierarchyIndex
+from .profiling import profiler
 
 import pcbnew
-import wx
 
 logger = logging.getLogger("hierpcb")
 
@@ -14,16 +26,59 @@ def sch_from_brd_path(brdPath):
     return brdPath.with_suffix(".kicad_sch")
 def brd_from_sch_path(schPath):
     return schPath.with_suffix(".kicad_pcb")
+def refresh_editor(board: pcbnew.BOARD):
+    """Redraw the PCB editor, if `board` is the one it has open. No-op when headless."""
+    editorBoard = pcbnew.GetBoard()
+    if editorBoard is not None and editorBoard.GetFileName() == board.GetFileName():
+        pcbnew.Refresh()
+
+def commit_changes(boardIndex: BoardIndex):
+    """Rebuild connectivity and redraw the editor once, after all changes to the board."""
+    if not boardIndex.commit():
+        return
+
+    #Fixes issues with traces lingering after being deleted
+    with profiler.span("refresh"):
+        refresh_editor(boardIndex.board)
+
+def file_stat_key(path: Path):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class HierarchyCancelled(Exception):
+    pass
+
+class SheetReader:
+    """What one read of a hierarchy uses: its own schematic cache, and an event that cancels it."""
+    def __init__(self, cache: Optional[SheetCache] = None, cancel: Optional[threading.Event] = None):
+        self.cache = cache
+        self.cancel = cancel
+
+    def parse(self, sheetPath: Path) -> dict:
+        with profiler.span("parseSheet", path=str(sheetPath)):
+            if self.cache is None:
+                return sch_parse_file(sheetPath)
+            return self.cache.parse(sheetPath)
+
+    def check(self):
+        """Raise HierarchyCancelled if the read was cancelled."""
+        if self.cancel is not None and self.cancel.is_set():
+            raise HierarchyCancelled()
 
 # Used to make sure every instance of a sheet is referencing the same data
 class SheetFileManager():
     def __init__(self):
         self.sheetDict = {}
+        self.prefetcher = BoardPrefetcher()
     
-    def get_file_by_path(self, sheetPath: Path):
-        if not self.sheetDict.get(sheetPath):
-            # Sheet doesn't exist, create it
-            self.sheetDict[sheetPath] = SheetFile(sheetPath)
+    def get_file_by_path(self, sheetPath: Path, reader: Optional[SheetReader] = None):
+        sheetFile = self.sheetDict.get(sheetPath)
+        if not sheetFile or sheetFile.isStale():
+            # Sheet doesn't exist (or changed since the last run), create it
+            self.sheetDict[sheetPath] = SheetFile(sheetPath, reader)
         
         return self.sheetDict[sheetPath]
     
@@ -32,6 +87,19 @@ class SheetFileManager():
             sheetFile:SheetFile
             sheetFile.load(cfg)
 
+    def prefetch_boards(self):
+        """Start loading every known sub-board in the background."""
+        for sheetFile in self.sheetDict.values():
+            sheetFile:SheetFile
+            sheetFile.prefetch(self.prefetcher)
+
+    def release_boards(self):
+        """Release every loaded sub-board, only the footprint indexes are kept between runs."""
+        self.prefetcher.cancel()
+        for sheetFile in self.sheetDict.values():
+            sheetFile:SheetFile
+            sheetFile.releaseBoard()
+
     def save_file_data(self, cfg: ConfigMan):
         for sheetFile  in self.sheetDict.values():
             sheetFile:SheetFile
@@ -42,7 +110,7 @@ sheetFileManager = SheetFileManager()
 # A board always has a sheet
 # A sheet doesn't always have a board
 class SheetFile():
-    def __init__(self, sheetPath: Path):
+    def __init__(self, sheetPath: Path, reader: Optional[SheetReader] = None):
         
         if not isinstance(sheetPath, Path) :
             raise ValueError(f"Didn't get type pathlib.Path, instead got: {type(sheetPath)}")
@@ -51,12 +119,24 @@ class SheetFile():
             raise FileNotFoundError("Base Board Sch. not found: " + str(schematicPath))
         
         self._sheetPath = sheetPath.resolve()
-        self._sheet = sch_parse_file(sheetPath)
+        self._sheetStat = file_stat_key(sheetPath)
+        self._sheet = (reader or SheetReader()).parse(sheetPath)
         self._uuid = self._sheet.get("uuid")
         self._boardPath = sheetPath.with_suffix(".kicad_pcb").resolve()
 
-        self._board = None
-        self._fpByRef =[]
+        self._boardStat = file_stat_key(self._boardPath)
+
+        # The board itself is only loaded once replication needs it,
+        # the dialog works from the footprint index read from the file
+        self._boardHandle = None
+        self._boardHash = None
+        # The last compiled template and the anchor and region it was compiled with
+        self._template = None
+        self._templateKey = None
+        # What tracks, drawings and zones are copied from, see template.REGIONS
+        self._region = "all"
+        self._footprints = []
+        self._fpByRef = []
         self._anchorRef = None
 
         #Check Board Path
@@ -65,24 +145,63 @@ class SheetFile():
             return
 
         try:
-            board = pcbnew.LoadBoard(str(self._boardPath))
-        except:
+            with profiler.span("footprintIndex", path=str(self._boardPath)):
+                footprints = pcb_read_footprints(self._boardPath)
+        except (SexpError, ValueError, IndexError, UnicodeDecodeError):
             logger.warn(f"{str(self._boardPath)} Board file invalid")
             return
 
-        if len(board.GetFootprints()) < 1:
+        if len(footprints) < 1:
             logger.warn(f"{str(self._boardPath)} Has no footprints")
             return
 
         logger.info(f"Valid Board found for {sheetPath}")
-        self._board = board
-        self._fpByRef = [ fp.GetReferenceAsString() for fp in board.GetFootprints() ]
-        
+        self._boardHandle = LazyBoard(self._boardPath)
+        self._footprints = footprints
+        self._fpByRef = [ fp.reference for fp in footprints ]
+
         # Default anchor as first footprint
         self._anchorRef = self.fpByRef[0]
 
-    def generate_subsheets(self, parentUUIDPath):
+    def fileStats(self):
+        """The current modification time and size of the schematic and the board."""
+        return file_stat_key(self._sheetPath), file_stat_key(self._boardPath)
+
+    def isStale(self):
+        """True if the schematic or board changed on disk since they were read."""
+        return self.fileStats() != (self._sheetStat, self._boardStat)
+
+    def generate_subsheets(
+        self,
+        parentUUIDPath,
+        onInstance: Optional[Callable] = None,
+        reader: Optional[SheetReader] = None
+    ):
+        """
+        Build the instances of this sheet's sub-sheets. `onInstance(instance, done, total)`
+        is called as each one is finished, along with everything below it. Raises
+        HierarchyCancelled if the `reader` is cancelled on the way.
+        """
+        reader = reader or SheetReader()
+        returnedList = self.direct_subsheets(parentUUIDPath, reader)
+
+        for done, instance in enumerate(returnedList, 1):
+            # Depth first with a stack, deep hierarchies don't run into the recursion limit
+            stack = [instance]
+            while stack:
+                reader.check()
+                current = stack.pop()
+                if not current.sheetFile.hasBoard:
+                    current._subSheets = current.sheetFile.direct_subsheets(current._uuidPath, reader)
+                    stack += current._subSheets
+
+            if onInstance:
+                onInstance(instance, done, len(returnedList))
 
+        return returnedList
+
+    def direct_subsheets(self, parentUUIDPath, reader: Optional[SheetReader] = None):
+        """The instances of this sheet's sub-sheets, without anything below them."""
         sheetInstanceList = self._sheet.get("sheet", {})
 
         logger.info(f"{len(sheetInstanceList)} sheet instances entries in {self._sheetPath}")
@@ -93,16 +212,48 @@ class SheetFile():
             sheetPath = self._sheetPath.parent / instanceData["property"]["Sheetfile"]
             sheetPath.resolve()
 
-            sheetInfo = sheetFileManager.get_file_by_path( sheetPath )
+            sheetInfo = sheetFileManager.get_file_by_path( sheetPath, reader )
 
             returnedList.append( SheetInstance(sheetInfo, instanceData, parentUUIDPath))
 
         return returnedList
 
+    def buildTemplate(self) -> Optional[ReplicationTemplate]:
+        """Compile the sub-board around the selected anchor, loading the board if needed."""
+        # Previewing and then applying shouldn't compile the same template twice
+        key = (self.anchorRef, repr(self.region))
+        if self._template is not None and self._templateKey == key:
+            return self._template
+
+        board = self.board
+        if not board:
+            return None
+
+        with profiler.span("template", path=str(self._boardPath)):
+            self._template = ReplicationTemplate.fromBoard(board, self.anchorRef, self.region)
+        self._templateKey = key
+        return self._template
+
+    def releaseBoard(self):
+        """Drop the loaded sub-board and the template compiled from it, both are loaded again when needed."""
+        if self._boardHandle is None or not self._boardHandle.loaded:
+            return
+
+        logger.info(f"Releasing board {self._boardPath}")
+        self._template = None
+        self._templateKey = None
+        self._boardHandle.release()
+
     def makeRootSheet(self):
         # The root board is gotten with pcbnew.GetBoard()
         # This also makes the root act like a branch instead of leaf
-        self._board = None
+        self._boardHandle = None
+        self._footprints = []
+        self._fpByRef = []
+
+    def prefetch(self, prefetcher: BoardPrefetcher):
+        if self._boardHandle:
+            prefetcher.prefetch(self._boardHandle)
 
     # Only Leaf SheetFiles need to save/load
     def save(self, cfg: ConfigMan):
@@ -110,29 +261,86 @@ class SheetFile():
         # So selecting footprints will overwrite the other copies
         logger.debug(f"Saving anchor {self.anchorRef} for {self._sheetPath}") 
         cfg.set(self._uuid, value=self.anchorRef)
+        # Copies of a sheet share its uuid but not their board, so the region goes by board
+        boardKey = self.boardKey(cfg)
+        cfg.clear("region", self._uuid)
+        if self.region == "all":
+            cfg.clear("region", boardKey)
+        else:
+            cfg.set("region", boardKey, value=self.region)
 
     def load(self, cfg: ConfigMan):
         savedRef = cfg.get(self._uuid)
         self.anchorRef = savedRef
+        self.region = cfg.get("region", self.boardKey(cfg), default="all")
+
+    def boardKey(self, cfg: ConfigMan) -> str:
+        """The sub-board's path relative to the root board, the config file sits next to it."""
+        try:
+            return Path(os.path.relpath(self._boardPath, cfg.path.resolve().parent)).as_posix()
+        except ValueError:
+            # On another drive than the root board
+            return self._boardPath.as_posix()
+
+    @property
+    def hasBoard(self):
+        """A valid board exists for this sheet, doesn't load it."""
+        return self._boardHandle is not None
 
     @property
     def board(self):
-        return self._board
+        if not self._boardHandle:
+            return None
+
+        return self._boardHandle.get()
+
+    @property
+    def footprints(self):
+        """The footprint index read from the board file, see PcbFootprint."""
+        return self._footprints
+
+    @property
+    def boardHash(self):
+        """Digest of the sub-board file, the SheetFile is rebuilt if the file changes."""
+        if self._boardHash is None:
+            self._boardHash = hashlib.sha1(self._boardPath.read_bytes()).hexdigest()
+        return self._boardHash
+
+    @property
+    def anchorPath(self):
+        """KIID path of the anchor footprint within the sub-board."""
+        for footprint in self._footprints:
+            if footprint.reference == self.anchorRef:
+                return footprint.path
+        return None
 
     @property
     def fpByRef(self):
-        if not self.board:
+        if not self.hasBoard:
             return None
 
         return self._fpByRef
 
+    @property
+    def region(self):
+        """One of template.REGIONS, or [left, top, right, bottom] in mm."""
+        return self._region
+
+    @region.setter
+    def region(self, value):
+        rectangle = isinstance(value, list) and len(value) == 4
+        if not rectangle and value not in REGIONS:
+            logger.warn(f"Unknown replication region {value!r}, copying everything")
+            value = "all"
+        self._region = value
+
     @property
     def anchorRef(self):
         return self._anchorRef
 
     @anchorRef.setter
     def anchorRef(self, value):
-        if not self.board:
+        if not self.hasBoard:
             return None
 
         if not value in self.fpByRef:
@@ -153,91 +361,324 @@ class SheetInstance():
         self._name = subSheetDict["property"]["Sheetname"]
         self._uuid = subSheetDict["uuid"]
         self._uuidPath = parentUUIDPath + "/" + self._uuid
+        # Filled in by SheetFile.generate_subsheets
+        self._subSheets = []
+        self._index: Optional[HierarchyIndex] = None
 
-        if not sheetData.board:
-            self._subSheets = sheetData.generate_subsheets(self._uuidPath)
-
-    def ancestorHasValidBoard(self):
-        if self._sheet.board:
-            #We are a valid board, return true
-            logger.info(f"Valid board for {self._uuid}")
-            return True
+    @property
+    def index(self) -> HierarchyIndex:
+        """The index of the hierarchy this instance is in, or of just its subtree if it isn't in one."""
+        if self._index is None:
+            HierarchyIndex().add(self)
+        return self._index
 
-        for subSheet in self._subSheets:
-            if subSheet.ancestorHasValidBoard():
-                logger.info(f"Valid child board for {self._uuid}")
-                return True
+    @property
+    def parent(self) -> Optional["SheetInstance"]:
+        return self.index.parent(self._uuidPath)
 
-        logger.info(f"No Valid Child board for {self._uuid}")
-        return False
+    def ancestorHasValidBoard(self):
+        """True if this instance or one below it has a board."""
+        return self.index.hasValidBoard[self._uuidPath]
 
     # Only leaves need to save whether they are enabled or not
     def save(self, cfg: ConfigMan):
-        if not self.sheetFile.board:
-            for childInstance in self._subSheets:
-                childInstance.save(cfg)
-            return
-
-        # BUG: When you copy a sheet, a new uuid is not generated
-        # So selecting footprints will overwrite the other copies
-        logger.debug(f"Saving info for {self._uuid}") 
-        cfg.set(self._uuid, value=self.enabled)
+        for leaf in self.leaves():
+            logger.debug(f"Saving info for {leaf._uuidPath}")
+            cfg.set("enabled", leaf._uuidPath, value=leaf.enabled)
+            # Older versions kept this by sheet uuid, which copies of a sheet share
+            cfg.clear(leaf._uuid)
 
     def load(self, cfg: ConfigMan):
-        if not self.sheetFile.board:
-            for childInstance in self._subSheets:
-                childInstance.load(cfg)
-            return
+        for leaf in self.leaves():
+            savedEnabled = cfg.get("enabled", leaf._uuidPath)
+            if savedEnabled is None:
+                savedEnabled = cfg.get(leaf._uuid, default=False)
+            leaf.enabled = savedEnabled
+
+    def leaves(self):
+        """Every leaf instance at or below this one, in schematic order."""
+        return self.index.leavesBelow(self._uuidPath)
+
+    def checkState(self) -> Optional[bool]:
+        """True if every leaf at or below this instance is enabled, False if none are, None if some are."""
+        if self._sheet.hasBoard:
+            return self.enabled
+
+        seen = set()
+        for leaf in self.leaves():
+            seen.add(leaf.enabled)
+            if len(seen) > 1:
+                return None
+        return seen.pop() if seen else False
+
+    def setEnabledRecursively(self, value: bool):
+        """Enable or disable every leaf at or below this instance."""
+        for leaf in self.leaves():
+            leaf.enabled = value
+
+    def applyChildren(
+        self,
+        cfg: Optional[ConfigMan] = None,
+        force: bool = False,
+        targetBoard: Optional[pcbnew.BOARD] = None,
+        dryRun: bool = False,
+        workers: Optional[int] = None,
+        sheetFiles: Optional[set] = None
+    ) -> dict:
+        """
+        Apply every enabled leaf below this instance to `targetBoard`, the board open
+        in the editor by default. Returns a summary of what was done.
+
+        With `dryRun` the board isn't changed, the instances that would be applied are
+        listed under "planned" and what applying them would do under "plan", see plan.py.
+
+        `workers` is how many processes to place instances on, the "geometryWorkers"
+        setting by default, see geometry.py. With `sheetFiles` only the leaves of those
+        sheet files are considered.
+        """
+        if targetBoard is None:
+            targetBoard = pcbnew.GetBoard()
+        boardIndex = BoardIndex(targetBoard)
+        keepBoards = False
+        if cfg is not None:
+            boardIndex.reuseZoneFills = cfg.get("settings", "reuseZoneFills", default=False)
+            keepBoards = cfg.get("settings", "keepSubBoards", default=False)
+            if workers is None:
+                workers = cfg.get("settings", "geometryWorkers", default=0)
+        workers = workers or 0
+
+        summary = {
+            "applied": [],
+            "skipped": [],
+            "failed": [],
+            "footprints": 0,
+            "tracks": 0,
+            "drawings": 0,
+            "zones": 0,
+        }
+        if dryRun:
+            summary["planned"] = []
+            summary["plan"] = []
+
+        # Every enabled leaf of the same sheet file shares one compiled template,
+        # so each sub-board is only read through SWIG once
+        instancesBySheetFile = {}
+        for leaf in self.leaves():
+            if not leaf.enabled:
+                continue
+            if sheetFiles is not None and leaf.sheetFile not in sheetFiles:
+                continue
+            # Instances applied before from the same inputs are skipped,
+            # without ever loading their sub-board
+            if not force and cfg is not None and leaf.isUpToDate(cfg, boardIndex):
+                logger.info(f"Skipping unchanged instance {leaf._uuidPath}")
+                summary["skipped"].append(leaf._uuidPath)
+                continue
+            instancesBySheetFile.setdefault(leaf.sheetFile, []).append(leaf)
+
+        for sheetFile, instances in instancesBySheetFile.items():
+            template = sheetFile.buildTemplate()
+            if not template:
+                summary["failed"] += [instance._uuidPath for instance in instances]
+                continue
+
+            # Where everything goes for each instance is worked out up front, on worker
+            # processes if there are any. The board is only changed on this thread
+            placed = {}
+            if not dryRun and workers > 1:
+                transforms = {}
+                for instance in instances:
+                    rigid = instance.anchorTransform(template, boardIndex)
+                    if rigid is not None:
+                        transforms[instance] = rigid
+                placed = dict(zip(transforms, place_many(template.geometry, list(transforms.values()), workers)))
+
+            for instance in instances:
+                if dryRun:
+                    plan = instance.planBoard(template, cfg, boardIndex)
+                    if plan is None:
+                        summary["failed"].append(instance._uuidPath)
+                    else:
+                        summary["planned"].append(instance._uuidPath)
+                        summary["plan"].append(plan)
+                    continue
+
+                with profiler.span("instance", path=instance._uuidPath, name=instance.name):
+                    applied = instance.applyBoard(template, cfg, boardIndex, placed.get(instance))
+                if not applied:
+                    summary["failed"].append(instance._uuidPath)
+                    continue
+
+                summary["applied"].append(instance._uuidPath)
+                summary["footprints"] += len(template.footprints)
+                summary["tracks"] += len(template.tracks)
+                summary["drawings"] += len(template.drawings)
+                summary["zones"] += len(template.zones)
+
+            # Only one sub-board is loaded at a time. Everything copied from it
+            # now belongs to the target board, so it can go
+            if not dryRun and not keepBoards:
+                sheetFile.releaseBoard()
+
+        # Connectivity and the screen are only updated once, after every instance
+        commit_changes(boardIndex)
+        return summary
+
+    def applyRecord(self, cfg: ConfigMan, boardIndex: BoardIndex) -> Optional[dict]:
+        """
+        What an apply of this instance depends on: the sub-board, the anchor and where the
+        anchor is, the settings that change the result, and what's on the board for it.
+        """
+        anchorRef = self._sheet.anchorRef
+        anchorPath = self._sheet.anchorPath
+        if anchorPath is None:
+            return None
 
-        savedEnabled = cfg.get(self._uuid, default=False)
-        self.enabled = savedEnabled
+        targetAnchor = boardIndex.footprintByPath(self._uuidPath + anchorPath)
+        if not targetAnchor:
+            return None
 
+        position = targetAnchor.GetPosition()
+        record = {
+            "boardHash": self._sheet.boardHash,
+            "anchor": anchorRef,
+            "pose": [
+                position.x,
+                position.y,
+                targetAnchor.GetOrientationDegrees(),
+                targetAnchor.IsFlipped(),
+            ],
+            "settings": [
+                cfg.get("settings", "incremental", default=False),
+                cfg.get("settings", "reuseZoneFills", default=False),
+            ],
+            # The record is kept even if the board isn't saved, or the apply is undone
+            "target": target_fingerprint(boardIndex, self._uuid, self._uuidPath),
+        }
+        # Left out for the whole board, so records from before regions existed still match
+        if self._sheet.region != "all":
+            record["region"] = self._sheet.region
+        return record
+
+    def anchorTransform(self, template: ReplicationTemplate, boardIndex: BoardIndex) -> Optional[RigidTransform]:
+        """The transform from the sub-board to this instance, None if its anchor isn't on the board."""
+        targetAnchor = FootprintTranslator(boardIndex, self._uuidPath).getTarget(template.anchorFootprint)
+        if not targetAnchor:
+            return None
+        return PositionTransform(template.anchorFootprint, targetAnchor).rigid
 
-    def applyChildren(self):
-        if self._sheet.board :
-            # Schematics with a board actually replicate
-            self.applyBoard()
-        else:
-            # Schematics without a board get a replicate signal
-            # That they pass up the tree
-            for subSheet in self._subSheets:
-                subSheet.applyChildren()
+    def isUpToDate(self, cfg: ConfigMan, boardIndex: BoardIndex) -> bool:
+        lastApplied = cfg.get("applied", self._uuidPath)
+        if not lastApplied:
+            return False
+        return lastApplied == self.applyRecord(cfg, boardIndex)
+
+    def planBoard(
+        self,
+        template: ReplicationTemplate,
+        cfg: Optional[ConfigMan],
+        boardIndex: BoardIndex
+    ) -> Optional[dict]:
+        """What applyBoard would do, without changing the board. None if it can't be applied."""
+        fpTranslator = FootprintTranslator(boardIndex, self._uuidPath)
+        subSheetAnchor = fpTranslator.getTarget(template.anchorFootprint)
+        if not subSheetAnchor:
+            logger.warning(f"Anchor {self._sheet.anchorRef} not found on the board for {self._uuidPath}")
+            return None
 
-    def applyBoard(self):
+        previous = None
+        if cfg is not None and cfg.get("settings", "incremental", default=False):
+            previous = cfg.get("replicated", self._uuidPath, default={})
+
+        plan = plan_instance(boardIndex, template, fpTranslator, subSheetAnchor, self._uuid, previous)
+        plan.update(path=self._uuidPath, name=self.name, anchor=self._sheet.anchorRef)
+        return plan
+
+    def applyBoard(
+        self,
+        template: Optional[ReplicationTemplate] = None,
+        cfg: Optional[ConfigMan] = None,
+        boardIndex: Optional[BoardIndex] = None,
+        placed: Optional[InstanceGeometry] = None
+    ):
+        """
+        Enforce the positions of objects in PCB template on PCB mutate. Returns true if applied.
+        `placed` are the positions for this instance if they were worked out ahead, see geometry.py.
+        """
         if not self.enabled:
-            return
+            return False
+
+        if template is None:
+            template = self._sheet.buildTemplate()
+            if not template:
+                return False
 
-        """Enforce the positions of objects in PCB template on PCB mutate."""
-        targetBoard = pcbnew.GetBoard()
-        sourceBoard = self._sheet.board
+        ownIndex = boardIndex is None
+        if ownIndex:
+            boardIndex = BoardIndex(pcbnew.GetBoard())
+            if cfg is not None:
+                boardIndex.reuseZoneFills = cfg.get("settings", "reuseZoneFills", default=False)
 
-        fpTranslator = FootprintTranslator(targetBoard, self._uuidPath)
+        fpTranslator = FootprintTranslator(boardIndex, self._uuidPath)
 
         # TODO: Anchor on non-footprints?
         # Alternatives to anchor footprint:
         # Align centers: looses rotation
         # Find the anchor footprint on the PCBs:
-        subPcbAnchor = sourceBoard.Footprints()[0]# self._sourceBoard.anchorFootprint
+        subPcbAnchor = template.anchorFootprint
         subSheetAnchor = fpTranslator.getTarget(subPcbAnchor)
 
         if not subSheetAnchor:
-            return
-
-        replContext: ReplicateContext = ReplicateContext(subPcbAnchor, subSheetAnchor, self._uuid)
-
-        # Clear Volatile items first
-        clear_volatile_items(replContext.group)
+            logger.warning(f"Anchor {self._sheet.anchorRef} not found on the board for {self._uuidPath}")
+            return False
 
-        # First, move the footprints and create the net mapping:
-        netMap = enforce_position_footprints(replContext, fpTranslator)
+        replContext: ReplicateContext = ReplicateContext(
+            subPcbAnchor, subSheetAnchor, self._uuid, boardIndex, placed
+        )
 
-        # Recreate Volatile items:
-        copy_drawings(replContext)
-        copy_traces  (replContext, netMap)
-        copy_zones   (replContext, netMap) 
+        if cfg is not None and cfg.get("settings", "incremental", default=False):
+            # Only touch the tracks, drawings and zones that changed since the last run
+            with profiler.span("footprints"):
+                netMap = enforce_position_footprints(replContext, fpTranslator, template)
+                profiler.count("footprints", len(template.footprints))
 
-        #Fixes issues with traces lingering after being deleted
-        pcbnew.Refresh()
+            previous = cfg.get("replicated", self._uuidPath, default={})
+            with profiler.span("sync"):
+                mapping = sync_volatile_items(replContext, template, netMap, previous)
+            cfg.set("replicated", self._uuidPath, value=mapping)
+        else:
+            # Clear Volatile items first
+            with profiler.span("clear"):
+                clear_volatile_items(replContext)
+
+            # First, move the footprints and create the net mapping:
+            with profiler.span("footprints"):
+                netMap = enforce_position_footprints(replContext, fpTranslator, template)
+                profiler.count("footprints", len(template.footprints))
+
+            # Recreate Volatile items:
+            with profiler.span("drawings"):
+                copy_drawings(replContext, template)
+                profiler.count("drawings", len(template.drawings))
+            with profiler.span("tracks"):
+                copy_traces  (replContext, template, netMap)
+                profiler.count("tracks", len(template.tracks))
+            with profiler.span("zones"):
+                copy_zones   (replContext, template, netMap) 
+                profiler.count("zones", len(template.zones))
+
+            # Everything was recreated, any mapping from an incremental run is stale
+            if cfg is not None:
+                cfg.clear("replicated", self._uuidPath)
+
+        # Remember what this apply was made from, see isUpToDate
+        if cfg is not None:
+            cfg.set("applied", self._uuidPath, value=self.applyRecord(cfg, boardIndex))
+
+        # Applied on its own, otherwise applyChildren commits once after every instance
+        if ownIndex:
+            commit_changes(boardIndex)
+        return True
 
     @property
     def name(self):
@@ -250,14 +691,14 @@ class SheetInstance():
     # We only need to save enabled for leaves
     @property
     def enabled(self):
-        if not self.sheetFile.board:
+        if not self.sheetFile.hasBoard:
             return False
 
         return self._enabled
 
     @enabled.setter
     def enabled(self, value: bool):
-        if not self.sheetFile.board:
+        if not self.sheetFile.hasBoard:
             logger.warn(f"Tried to change enabled on nonleaf instance: {self._uuid}")
             return
 
@@ -266,11 +707,130 @@ class SheetInstance():
 
 
 class RootInstance(SheetInstance):
-    def __init__(self, sheetFile: SheetFile):
+    def __init__(
+        self,
+        sheetFile: SheetFile,
+        onInstance: Optional[Callable] = None,
+        reader: Optional[SheetReader] = None
+    ):
         sheetFile.makeRootSheet()
         self._sheet = sheetFile
         self._uuid = ""
         self._uuidPath = ""
         self._name = "Root"
+        self._index = HierarchyIndex()
+        self._index.open(self)
+
+        # Each of the root's sub-sheets is indexed as soon as it's built,
+        # so the dialog can use it while the rest is still being read
+        def indexed(instance: SheetInstance, done: int, total: int):
+            self._index.add(instance, self._uuidPath)
+            if onInstance:
+                onInstance(instance, done, total)
+
+        self._subSheets = sheetFile.generate_subsheets(self._uuidPath, indexed, reader)
+        self._index.close(self)
+
+
+def build_hierarchy(
+    boardPath: Path,
+    onInstance: Optional[Callable] = None,
+    cancel: Optional[threading.Event] = None
+) -> RootInstance:
+    """
+    Read the schematic hierarchy of the root board at `boardPath`.
+    `onInstance` is passed on to generate_subsheets for the root's sub-sheets.
+    Setting `cancel` stops the read with HierarchyCancelled.
+    """
+    sheetPath = sch_from_brd_path(boardPath)
+
+    # Unchanged schematics are read back from the cache instead of being parsed
+    with profiler.span("hierarchy"), SheetCache(boardPath.with_suffix(".projinst.cache.json")) as cache:
+        reader = SheetReader(cache, cancel)
+        sheetFile = SheetFile(sheetPath, reader)
+        return RootInstance(sheetFile, onInstance, reader)
+
+
+class HierarchyScan:
+    """
+    Runs build_hierarchy on a background thread. `onInstance(instance, done, total)` is
+    called for each of the root's sub-sheets as it is finished, and `onDone(rootInstance,
+    error)` at the end. Both are called from the scan thread, and not at all once cancelled.
+    """
+    def __init__(self, boardPath: Path, onInstance: Callable, onDone: Callable):
+        self.boardPath = boardPath
+        self._onInstance = onInstance
+        self._onDone = onDone
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="projinst-scan", daemon=True)
+        self.rootInstance: Optional[RootInstance] = None
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """Stop the scan and wait for the thread, it no longer touches the sheet files after this."""
+        self._cancel.set()
+        if self._thread.is_alive():
+            self._thread.join()
 
-        self._subSheets = sheetFile.generate_subsheets(self._uuidPath)
\ No newline at end of file
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def wait(self) -> Optional[RootInstance]:
+        self._thread.join()
+        return self.rootInstance
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self):
+        def onInstance(instance: SheetInstance, done: int, total: int):
+            if not self.cancelled:
+                self._onInstance(instance, done, total)
+
+        try:
+            self.rootInstance = build_hierarchy(self.boardPath, onInstance, self._cancel)
+        except HierarchyCancelled:
+            logger.info("Reading the hierarchy was cancelled")
+            return
+        except Exception as error:
+            logger.exception("Reading the hierarchy failed")
+            if not self.cancelled:
+                self._onDone(None, error)
+            return
+        if not self.cancelled:
+            self._onDone(self.rootInstance, None)
+
+
+def reapply_changed(
+    boardPath: Path,
+    changed: List[Path],
+    cfg: ConfigMan,
+    targetBoard: pcbnew.BOARD,
+    prepare: Optional[Callable[[RootInstance], None]] = None
+) -> dict:
+    """
+    Read the hierarchy again and apply the instances of the `changed` sheet files.
+    Sheet files that didn't change are reused as they are, so only the changed ones are
+    read again. `prepare` can change which instances are enabled before applying.
+    """
+    logger.info(f"Changed on disk: {', '.join(str(path) for path in changed)}")
+
+    with profiler.span("watch", changed=len(changed)):
+        rootInstance = build_hierarchy(boardPath)
+        sheetFileManager.load_file_data(cfg)
+        rootInstance.load(cfg)
+        if prepare is not None:
+            prepare(rootInstance)
+
+        sheetFiles = {
+            sheetFileManager.sheetDict[path] for path in changed if path in sheetFileManager.sheetDict
+        }
+        # Instances whose sub-board didn't actually change are still skipped, see isUpToDate
+        summary = rootInstance.applyChildren(cfg, targetBoard=targetBoard, sheetFiles=sheetFiles)
+
+    summary["changed"] = [str(path) for path in changed]
+    return summary
@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional
+
+# Only needs the instances' uuid paths, names, sub-sheets and whether their sheet file
+# has a board, so it doesn't depend on pcbnew. The instances are hdata.SheetInstance.
+
+
+class HierarchyIndex:
+    """
+    Every instance of a hierarchy by uuid path, with its parent, whether there's a board
+    at or below it, and the leaves in schematic order. Built in one post-order pass
+    without recursion. The leaves below an instance are a contiguous slice of `leafList`.
+    """
+    def __init__(self):
+        self.nodes: Dict[str, "SheetInstance"] = {}
+        self.parents: Dict[str, str] = {}
+        self.hasValidBoard: Dict[str, bool] = {}
+        self.leafList: List["SheetInstance"] = []
+        self._leafStart: Dict[str, int] = {}
+        self._leafEnd: Dict[str, int] = {}
+
+    def open(self, instance: "SheetInstance", parentPath: Optional[str] = None):
+        """Start indexing `instance`, everything added before close() is below it."""
+        path = instance._uuidPath
+        self.nodes[path] = instance
+        instance._index = self
+        if parentPath is not None:
+            self.parents[path] = parentPath
+        self._leafStart[path] = len(self.leafList)
+        if instance.sheetFile.hasBoard:
+            self.leafList.append(instance)
+
+    def close(self, instance: "SheetInstance"):
+        path = instance._uuidPath
+        self._leafEnd[path] = len(self.leafList)
+        # Leaves are exactly the instances with a board, so a board below means a leaf below
+        self.hasValidBoard[path] = self._leafEnd[path] > self._leafStart[path]
+
+    def add(self, instance: "SheetInstance", parentPath: Optional[str] = None):
+        """Index `instance` and everything below it."""
+        stack = [(instance, parentPath, False)]
+        while stack:
+            current, currentParent, finished = stack.pop()
+            if finished:
+                self.close(current)
+                continue
+
+            self.open(current, currentParent)
+            stack.append((current, currentParent, True))
+            for child in reversed(current._subSheets):
+                stack.append((child, current._uuidPath, False))
+
+    def get(self, uuidPath: str) -> Optional["SheetInstance"]:
+        return self.nodes.get(uuidPath)
+
+    def parent(self, uuidPath: str) -> Optional["SheetInstance"]:
+        parentPath = self.parents.get(uuidPath)
+        return None if parentPath is None else self.nodes.get(parentPath)
+
+    def leavesBelow(self, uuidPath: str) -> List["SheetInstance"]:
+        # Still being built, only the leaves found so far
+        end = self._leafEnd.get(uuidPath, len(self.leafList))
+        return self.leafList[self._leafStart[uuidPath]:end]
+
+    def names(self, uuidPath: str) -> List[str]:
+        """Sheet names from below the root down to the instance at `uuidPath`."""
+        names = []
+        while uuidPath in self.parents:
+            names.append(self.nodes[uuidPath].name)
+            uuidPath = self.parents[uuidPath]
+        return names[::-1]
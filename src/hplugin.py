@@ -5,13 +5,16 @@ import sys
 import time
 import traceback
 from pathlib import Path
+from typing import List
 
 import pcbnew
 import wx
 
 from .cfgman import ConfigMan
+from .profiling import profiler, summarize, write_trace
+from .watch import DEFAULT_DEBOUNCE, DEFAULT_INTERVAL, SheetWatcher
 
-from .hdata import SheetFile,SheetInstance,RootInstance,sheetFileManager
+from .hdata import SheetInstance,sheetFileManager,reapply_changed
 
 from .interface import DlgHPCBRun
 
@@ -52,24 +55,127 @@ class ProjectInstancesPlugin(pcbnew.ActionPlugin):
         )
 
         with ConfigMan(boardPath.with_suffix(".projinst.json")) as cfg:
-            RunActual(cfg, wx_frame)
+            # Timing spans are only recorded when asked for, see profiling.py
+            if cfg.get("settings", "profile", default=False):
+                profiler.start(cfg.get("settings", "profileSwigCalls", default=False))
 
+            try:
+                RunActual(cfg, wx_frame)
+            finally:
+                trace = profiler.stop()
+                # Sub-boards loaded for a preview that wasn't applied aren't kept around either
+                if not cfg.get("settings", "keepSubBoards", default=False):
+                    sheetFileManager.release_boards()
 
-def RunActual(cfg, wx_frame: wx.Window):
+        if trace:
+            write_trace(trace, boardPath.with_suffix(".projinst.trace.json"))
+            summary = summarize(trace)
+            logger.info(summary)
+            wx.MessageBox(summary, "ProjectInstances timings", wx.OK | wx.ICON_INFORMATION, wx_frame)
 
-    boardPath = Path(pcbnew.GetBoard().GetFileName())
-    sheetPath = boardPath.with_suffix(".kicad_sch")
 
-    sheetFile = SheetFile(sheetPath)
-    rootInstance = RootInstance(sheetFile)
+def RunActual(cfg, wx_frame: wx.Window):
 
-    sheetFileManager.load_file_data(cfg)
-    rootInstance.load(cfg)
+    boardPath = Path(pcbnew.GetBoard().GetFileName())
 
-    if DlgHPCBRun(wx_frame, rootInstance).ShowModal() == wx.ID_OK:
+    # Sub-projects saved since the watch started are applied here, as part of the
+    # plugin run, so KiCad puts the changes on the undo stack
+    if editorWatch is not None and editorWatch.changed:
+        names = ", ".join(path.stem for path in editorWatch.changed)
+        answer = wx.MessageBox(
+            f"These sub-projects changed since they were applied:\n{names}\n\nApply only them now?",
+            "ProjectInstances", wx.YES_NO | wx.CANCEL | wx.ICON_QUESTION, wx_frame
+        )
+        if answer == wx.CANCEL:
+            return
+        if answer == wx.YES:
+            with profiler.span("apply"):
+                summary = reapply_changed(boardPath, editorWatch.takeChanged(), cfg, pcbnew.GetBoard())
+            logger.info(f"Applied {len(summary['applied'])} instances of changed sub-projects")
+            return
+
+    # The dialog reads the hierarchy and the saved selections itself, in the background
+    dlg = DlgHPCBRun(wx_frame, boardPath, cfg)
+    try:
+        with profiler.span("dialog"):
+            result = dlg.ShowModal()
+    finally:
+        # A scan still running after Cancel would keep adding sheet files, and writing
+        # the cache, while the sub-boards are released
+        dlg.stopScan()
+
+    if result == wx.ID_OK:
+        rootInstance = dlg.rootInstance
 
         rootInstance.save(cfg)
         sheetFileManager.save_file_data(cfg)
 
-        rootInstance.applyChildren()
+        # Unchanged instances are skipped unless asked otherwise
+        force = dlg.forceApply or cfg.get("settings", "force", default=False)
+        with profiler.span("apply"):
+            summary = rootInstance.applyChildren(cfg, force=force)
+        profiler.count("applied", len(summary["applied"]))
+        profiler.count("skipped", len(summary["skipped"]))
         logger.info("Saved.")
+
+        # Whatever the watch reported was applied along with everything else
+        if editorWatch is not None:
+            editorWatch.takeChanged()
+
+        update_watch(cfg, boardPath)
+
+
+class EditorWatch(wx.Timer):
+    """
+    Reports sub-projects saved while the root board stays open, see watch.py. The board
+    isn't changed from the timer, the changes are applied by the next plugin run.
+    """
+    def __init__(self, boardPath: Path, debounce: float):
+        super().__init__()
+        self.boardPath = boardPath
+        self.watcher = SheetWatcher(sheetFileManager, debounce=debounce)
+        # Sheet files that changed since they were last applied, in the order they were seen
+        self.changed: List[Path] = []
+
+    def Notify(self):
+        board = pcbnew.GetBoard()
+        if board is None or Path(board.GetFileName()) != self.boardPath:
+            logger.info("Another board was opened, no longer watching sub-projects")
+            self.Stop()
+            return
+
+        changed = [path for path in self.watcher.poll() if path not in self.changed]
+        if not changed:
+            return
+        self.changed += changed
+
+        message = (
+            f"ProjectInstances: {', '.join(path.stem for path in self.changed)} changed, "
+            "run the plugin to apply"
+        )
+        logger.info(message)
+        wx_frame = wx.FindWindowByName("PcbFrame")
+        if wx_frame is not None:
+            wx_frame.SetStatusText(message)
+
+    def takeChanged(self) -> List[Path]:
+        changed, self.changed = self.changed, []
+        return changed
+
+
+editorWatch = None
+
+
+def update_watch(cfg: ConfigMan, boardPath: Path):
+    """Start or stop watching the sub-projects, following the "watch" setting."""
+    global editorWatch
+    if editorWatch is not None:
+        editorWatch.Stop()
+        editorWatch = None
+
+    if not cfg.get("settings", "watch", default=False):
+        return
+
+    editorWatch = EditorWatch(boardPath, cfg.get("settings", "watchDebounce", default=DEFAULT_DEBOUNCE))
+    editorWatch.Start(int(cfg.get("settings", "watchInterval", default=DEFAULT_INTERVAL) * 1000))
+    logger.info(f"Watching {len(sheetFileManager.sheetDict)} sheets for changes")
@@ -0,0 +1,73 @@
+import hashlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Decides which copies of an incremental sync can stay, see placement.sync_volatile_items.
+# Only signatures and digests are compared, the board is read through `targetDigest`,
+# so this doesn't need pcbnew.
+
+
+def instance_pose(rigid, sourceAnchor: Tuple[int, int, float]) -> tuple:
+    """
+    What moves an instance's copies: the transform onto the board and the anchor's
+    (x, y, degrees) on the sub-board. Source signatures hash absolute sub-board
+    coordinates, so moving only the source anchor has to change the pose as well.
+    """
+    return (rigid.rotation, rigid.offsetX, rigid.offsetY, *sourceAnchor)
+
+
+def item_signature_with(sourceSignature: str, pose: tuple, netName: Optional[str]) -> str:
+    """Combine a source item signature with what the instance adds to it."""
+    return hashlib.sha1(repr((sourceSignature, pose, netName)).encode()).hexdigest()
+
+
+def box_digest(signature: str, box: list) -> str:
+    """
+    What the incremental mapping keeps per copy: the signature it was made from and its
+    box on the board, which changes if it was edited by hand. Shortened, it's only ever
+    compared against the same copy's digest from the last run.
+    """
+    return hashlib.sha1(repr((signature, box)).encode()).hexdigest()[:16]
+
+
+class CopyMatcher:
+    """
+    Matches source items against the mapping from the last run. `previous` maps source
+    KIIDs to [target KIID, box_digest], `targetDigest(targetKiid, signature)` is the
+    box_digest of that copy as it is now, or None if it's gone.
+    """
+    def __init__(
+        self,
+        pose: tuple,
+        netNames: Dict[int, str],
+        previous: dict,
+        targetDigest: Callable[[str, str], Optional[str]]
+    ):
+        self.pose = pose
+        self.netNames = netNames
+        self.previous = previous
+        self.targetDigest = targetDigest
+        # Target KIIDs to keep, and the mapping entries of those
+        self.kept = set()
+        self.mapping = {}
+
+    def reuse(self, sourceKiid: str, sourceSignature: str, netCode: Optional[int]) -> Optional[str]:
+        """Keep the existing copy if it is still correct, otherwise return the new signature."""
+        signature = item_signature_with(sourceSignature, self.pose, self.netNames.get(netCode))
+        entry = self.previous.get(sourceKiid)
+        if entry and len(entry) == 2 and self.targetDigest(entry[0], signature) == entry[1]:
+            self.kept.add(entry[0])
+            self.mapping[sourceKiid] = entry
+            return None
+        return signature
+
+    def stale(
+        self,
+        keys: Sequence[Tuple[str, str]],
+        netCodes: Sequence[Optional[int]]
+    ) -> List[Tuple[int, str]]:
+        """(index, new signature) of every (source KIID, signature) in `keys` to recreate."""
+        return [
+            (index, signature)
+            for index, ((sourceKiid, sourceSignature), netCode) in enumerate(zip(keys, netCodes))
+            if (signature := self.reuse(sourceKiid, sourceSignature, netCode)) is not None
+        ]
@@ -1,10 +1,13 @@
 import logging
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import wx
 
-from ..hdata import SheetInstance,RootInstance
+from ..cfgman import ConfigMan
+from ..hdata import SheetInstance,RootInstance,HierarchyScan,sheetFileManager
+from ..plan import describe_plan, write_plan
+from ..template import REGIONS
 from .DlgHPCBRun_Base import DlgHPCBRun_Base
 
 logger = logging.getLogger("hierpcb")
@@ -15,51 +18,207 @@ def wxStateFromBool(inVal):
             return wx.CHK_UNCHECKED
         case True:
             return wx.CHK_CHECKED
+        case None:
+            return wx.CHK_UNDETERMINED
+
+# Child of a branch that hasn't been expanded yet
+LAZY_CHILD_TEXT = "..."
+
+# Matches shown at most while searching
+SEARCH_LIMIT = 500
+
+# The region choice entry for a rectangle typed into regionRect
+RECTANGLE = "rectangle"
+RECTANGLE_LABEL = "Inside a rectangle (mm)"
+
+# Added around the footprints for the rectangle a sheet starts with
+RECTANGLE_MARGIN_MM = 5
+
+def parseRectangle(text: str) -> Optional[list]:
+    """[left, top, right, bottom] from four numbers separated by commas or spaces, None if it isn't that."""
+    try:
+        values = [float(value) for value in text.replace(",", " ").split()]
+    except ValueError:
+        return None
+    return values if len(values) == 4 else None
+
+def formatRectangle(rectangle: list) -> str:
+    return ", ".join(f"{value:g}" for value in rectangle)
+
+def footprintRectangle(sheetFile) -> list:
+    """The in-bounds footprint positions of a sheet file with a margin, in mm."""
+    placed = [fp for fp in sheetFile.footprints if fp.x >= 0 and fp.y >= 0] or sheetFile.footprints
+    xs = [fp.x / 1e6 for fp in placed]
+    ys = [fp.y / 1e6 for fp in placed]
+    return [
+        round(min(xs) - RECTANGLE_MARGIN_MM, 3), round(min(ys) - RECTANGLE_MARGIN_MM, 3),
+        round(max(xs) + RECTANGLE_MARGIN_MM, 3), round(max(ys) + RECTANGLE_MARGIN_MM, 3),
+    ]
 
 class DlgHPCBRun(DlgHPCBRun_Base):
-    def __init__(self, parent: wx.Window, rootInstance: RootInstance):
+    def __init__(self, parent: wx.Window, boardPath: Path, cfg: ConfigMan):
         # Set up the user interface from the designer.
         super().__init__(parent)
+        self._rootInstance: Optional[RootInstance] = None
+        self._cfg = cfg
+        # Sheet files whose saved anchor was already read, so a later instance doesn't undo a change
+        self._loadedSheetFiles = set()
+        # What the region choice lists for the selected sheet file
+        self._regions = []
+
+        # The root's instances, as the scan reports them
+        self._topInstances: List[SheetInstance] = []
+        # The tree items that were created, by instance uuid path. Check states live in the
+        # instances, these are only updated to match
+        self._items: Dict[str, List[wx.TreeListItem]] = {}
+        self._placeholder: Optional[wx.TreeListItem] = None
+        self._scanText = "Reading schematics..."
+
+        # The hierarchy is read in the background, instances show up as they're read.
+        # Nothing can be applied until all of it is there
+        self._showPlaceholder()
+        self.m_sdbSizer1Apply.Disable()
+        self.buttonPreview.Disable()
+
+        self._scan = HierarchyScan(boardPath, self._onScanInstance, self._onScanDone)
+        self._scan.start()
+
+    @property
+    def rootInstance(self) -> Optional[RootInstance]:
+        return self._rootInstance
+
+    def stopScan(self):
+        """Cancel the scan if it's still running and wait for it. Call once the dialog is closed."""
+        self._scan.cancel()
+
+    # Called from the scan thread
+    def _onScanInstance(self, instance: SheetInstance, done: int, total: int):
+        wx.CallAfter(self._addInstance, instance, done, total)
+
+    def _onScanDone(self, rootInstance: Optional[RootInstance], error: Optional[Exception]):
+        wx.CallAfter(self._finishScan, rootInstance, error)
+
+    def _addInstance(self, instance: SheetInstance, done: int, total: int):
+        # The dialog may have been closed while the scan was running
+        if not self or self._scan.cancelled:
+            return
+
+        for leaf in instance.leaves():
+            if leaf.sheetFile not in self._loadedSheetFiles:
+                self._loadedSheetFiles.add(leaf.sheetFile)
+                leaf.sheetFile.load(self._cfg)
+        instance.load(self._cfg)
+
+        self._topInstances.append(instance)
+        # Search results are redone on the next keystroke
+        if not self._searchQuery() and instance.ancestorHasValidBoard():
+            self._addItem(self.treeApplyTo.GetRootItem(), instance)
+
+        self.gaugeProgress.SetRange(total)
+        self.gaugeProgress.SetValue(done)
+        self._scanText = f"Reading schematics ({done}/{total})..."
+        if self._placeholder is not None:
+            self.treeApplyTo.SetItemText(self._placeholder, self._scanText)
+
+    def _finishScan(self, rootInstance: Optional[RootInstance], error: Optional[Exception]):
+        if not self or self._scan.cancelled:
+            return
+
+        if error is not None:
+            self._scanText = f"Couldn't read the schematics: {error}"
+            if self._placeholder is not None:
+                self.treeApplyTo.SetItemText(self._placeholder, self._scanText)
+            return
+
+        self._scanText = None
+        if self._placeholder is not None:
+            self.treeApplyTo.DeleteItem(self._placeholder)
+            self._placeholder = None
+        self.gaugeProgress.Hide()
+        self.Layout()
+
+        self._rootInstance = rootInstance
+        self.m_sdbSizer1Apply.Enable()
+        self.buttonPreview.Enable()
+
+        # Sub-boards are loaded on demand, optionally warm them while the dialog is open
+        if self._cfg.get("settings", "prefetchBoards", default=False):
+            sheetFileManager.prefetch_boards()
+
+    def _showPlaceholder(self):
+        if self._scanText is not None:
+            self._placeholder = self.treeApplyTo.AppendItem(self.treeApplyTo.GetRootItem(), self._scanText)
+
+    def _addItem(self, parentItem: wx.TreeListItem, instance: SheetInstance, text: Optional[str] = None):
+        item = self.treeApplyTo.AppendItem(parentItem, text or str(instance.name), data=instance)
+        self._items.setdefault(instance._uuidPath, []).append(item)
+        self.treeApplyTo.CheckItem(item, wxStateFromBool(instance.checkState()))
+
+        if not instance.sheetFile.hasBoard:
+            # Children are only created once the branch is expanded
+            self.treeApplyTo.AppendItem(item, LAZY_CHILD_TEXT)
+        return item
+
+    def handleTreeExpanding(self, event):
+        item = event.GetItem()
+        instance = self.treeApplyTo.GetItemData(item)
+        firstChild = self.treeApplyTo.GetFirstChild(item)
+        if not isinstance(instance, SheetInstance) or not firstChild.IsOk():
+            return
+
+        # Already filled in
+        if self.treeApplyTo.GetItemData(firstChild) is not None:
+            return
+
+        self.treeApplyTo.DeleteItem(firstChild)
+        for subSheet in instance._subSheets:
+            if subSheet.ancestorHasValidBoard():
+                self._addItem(item, subSheet)
 
+    def _rebuildTree(self):
+        """Show the top level instances, or what matches the search box."""
+        self.treeApplyTo.DeleteAllItems()
+        self._items = {}
+        self._placeholder = None
         rootItem = self.treeApplyTo.GetRootItem()
-        logger.info(f"Root item: {rootItem}")
-        self._buildTreeFromSubSheet(rootInstance, rootItem)
-
-    def _buildTreeFromSubSheet(self, sheetInstance , parentItem):
-        if not sheetInstance.ancestorHasValidBoard():
-            # Not a branch ending in a leaf, end recursion
-            # TODO: Add node anyways to help users know why it might not be working?
-            logger.info(f"Instance is a dead branch: {sheetInstance._uuidPath}")
+
+        query = self._searchQuery()
+        if not query:
+            for instance in self._topInstances:
+                if instance.ancestorHasValidBoard():
+                    self._addItem(rootItem, instance)
+            self._showPlaceholder()
             return
 
-        if sheetInstance._sheet.board:
-            # This subsheet is a leaf
-            logger.info(f"Instance is a leaf: {sheetInstance._uuidPath}")
+        for count, (instance, names) in enumerate(self._search(query)):
+            if count == SEARCH_LIMIT:
+                self.treeApplyTo.AppendItem(rootItem, f"More than {SEARCH_LIMIT} matches, refine the search")
+                break
+            self._addItem(rootItem, instance, " / ".join(names))
+        self._showPlaceholder()
 
-            #Add leaf 
-            instanceLeaf: wx.TreeListItem = self.treeApplyTo.PrependItem(
-                parent=parentItem, text=str(sheetInstance._name), data=sheetInstance
-            )
-            self.treeApplyTo.Expand(instanceLeaf)
-            checkState = wxStateFromBool(sheetInstance.enabled)
-            self.treeApplyTo.CheckItem(instanceLeaf, checkState)
-            self.treeApplyTo.UpdateItemParentStateRecursively(instanceLeaf)
+    def _searchQuery(self) -> str:
+        return self.searchInstances.GetValue().strip().lower()
+
+    def _search(self, query: str):
+        """Instances whose name or uuid path contains `query`, with the names leading to them."""
+        if not self._topInstances:
             return
 
-        # This subsheet is a branch
-        logger.info(f"Instance is a branch: {sheetInstance._name}")
-        # Add Branch
-        instanceBranch: wx.TreeListItem = self.treeApplyTo.PrependItem(
-            parent=parentItem, text=str(sheetInstance._name), data=sheetInstance
-        )
-        self.treeApplyTo.Expand(instanceBranch)
-        # Impliment branch checkbox later
-        #checkState = wxStateFromTri(subPcb.getStateFromInstances())
-        #self.treeApplyTo.CheckItem(subSheetBranch, checkState)
+        # The index lists instances in schematic order, parents before children
+        index = self._topInstances[0].index
+        for uuidPath, instance in list(index.nodes.items()):
+            if not uuidPath or not index.hasValidBoard.get(uuidPath):
+                continue
+
+            if query in instance.name.lower() or query in uuidPath.lower():
+                yield instance, index.names(uuidPath)
 
-        # Populate with leaves/branches
-        for sheetInstanceIt in sheetInstance._subSheets:
-            self._buildTreeFromSubSheet(sheetInstanceIt, instanceBranch)
+    def handleSearch(self, event):
+        self._rebuildTree()
+
+    def handleSearchCancel(self, event):
+        self.searchInstances.SetValue("")
 
     def getSelectedInstance(self) -> Optional[SheetInstance]:
         selItem = self.treeApplyTo.GetSelection()
@@ -77,40 +236,31 @@ class DlgHPCBRun(DlgHPCBRun_Base):
         if not isinstance(objData, SheetInstance):
             return
 
-        if objData._sheet.board:
-            # We are a leaf
-            state = self.treeApplyTo.GetCheckedState(eventItem)
-            boolState = (state == wx.CHK_CHECKED)
-            objData.enabled = boolState
+        # The instances hold the state, leaves and branches alike
+        state = self.treeApplyTo.GetCheckedState(eventItem)
+        objData.setEnabledRecursively(state == wx.CHK_CHECKED)
+        self._updateCheckStates(objData._uuidPath)
 
-        else:
-            # A branch has changed, recursively apply to leaves
-            state = self.treeApplyTo.GetCheckedState(eventItem)
-            # This doesn't trigger a leaf change..
-            self.treeApplyTo.CheckItemRecursively(eventItem, state)
-
-            # Force sync the tree to instace data
-            self.syncTreeDataToInstances()
-
-        self.treeApplyTo.UpdateItemParentStateRecursively(eventItem)
-
-    def syncTreeDataToInstances(self):
-        item = self.treeApplyTo.GetFirstItem()
-        while item.IsOk():
-            itemData =self.treeApplyTo.GetItemData(item) 
-            if not isinstance(itemData, SheetInstance):
-                item = self.treeApplyTo.GetNextItem(item)
-                continue
-            if not itemData._sheet.board:
-                item = self.treeApplyTo.GetNextItem(item)
+    def _updateCheckStates(self, changedPath: str):
+        """Update the items of the instances above and below the one that changed."""
+        for uuidPath, items in self._items.items():
+            related = (
+                uuidPath == changedPath
+                or uuidPath.startswith(changedPath + "/")
+                or changedPath.startswith(uuidPath + "/")
+            )
+            if not related:
                 continue
 
-            state = self.treeApplyTo.GetCheckedState(item) == wx.CHK_CHECKED
-            itemData.enabled = state
-            item = self.treeApplyTo.GetNextItem(item)
+            state = wxStateFromBool(self.treeApplyTo.GetItemData(items[0]).checkState())
+            for item in items:
+                self.treeApplyTo.CheckItem(item, state)
 
     def handleSelectionChange( self, event ):
         self.anchorChoice.Clear()
+        self.regionChoice.Clear()
+        self.regionRect.ChangeValue("")
+        self.regionRect.Disable()
 
         selInstance: SheetInstance = self.getSelectedInstance()
         if selInstance is None:
@@ -118,13 +268,22 @@ class DlgHPCBRun(DlgHPCBRun_Base):
             return
 
         selSheetFile = selInstance.sheetFile
-        if not selSheetFile.board:
+        if not selSheetFile.hasBoard:
             return 
 
         logger.info(f"subPcb selected {selInstance._name} with {len(selSheetFile.fpByRef)} anchors")
         self.anchorChoice.AppendItems(selSheetFile.fpByRef)
         self.anchorChoice.SetSelection(selSheetFile.fpByRef.index(selSheetFile.anchorRef))
 
+        self._regions = list(REGIONS) + [RECTANGLE]
+        self.regionChoice.AppendItems([REGIONS[region] for region in REGIONS] + [RECTANGLE_LABEL])
+        if isinstance(selSheetFile.region, list):
+            self.regionChoice.SetSelection(self._regions.index(RECTANGLE))
+            self.regionRect.ChangeValue(formatRectangle(selSheetFile.region))
+            self.regionRect.Enable()
+        else:
+            self.regionChoice.SetSelection(self._regions.index(selSheetFile.region))
+
     def handleAnchorChange( self, event ):
         # Set the anchor:
         selInstance: SheetInstance = self.getSelectedInstance()
@@ -144,6 +303,59 @@ class DlgHPCBRun(DlgHPCBRun_Base):
         logger.info(f"Anchor changed to {selAnchor} on {selSheetFile._sheetPath}")
         selSheetFile.anchorRef = selAnchor
 
+    def handleRegionChange( self, event ):
+        selInstance: SheetInstance = self.getSelectedInstance()
+        sel = self.regionChoice.GetSelection()
+        if selInstance is None or sel == wx.NOT_FOUND:
+            return
+
+        selSheetFile = selInstance.sheetFile
+        region = self._regions[sel]
+        self.regionRect.Enable(region == RECTANGLE)
+        if region == RECTANGLE:
+            # Start from what's typed in, or a box around the footprints
+            region = parseRectangle(self.regionRect.GetValue()) or footprintRectangle(selSheetFile)
+            self.regionRect.ChangeValue(formatRectangle(region))
+
+        selSheetFile.region = region
+        logger.info(f"Region changed to {selSheetFile.region} on {selSheetFile._sheetPath}")
+
+    def handleRegionRectChange( self, event ):
+        selInstance: SheetInstance = self.getSelectedInstance()
+        if selInstance is None:
+            return
+
+        # Only taken once it's four numbers, while typing it usually isn't
+        rectangle = parseRectangle(self.regionRect.GetValue())
+        if rectangle is None:
+            return
+        selInstance.sheetFile.region = rectangle
+        logger.info(f"Region changed to {rectangle} on {selInstance.sheetFile._sheetPath}")
+
+    @property
+    def forceApply(self) -> bool:
+        """Re-apply instances even if nothing they depend on changed."""
+        return self.checkForce.GetValue()
+
+    def handlePreview(self, event):
+        """Show what applying the checked instances would change, optionally saving it as JSON."""
+        with wx.BusyCursor():
+            summary = self._rootInstance.applyChildren(self._cfg, force=self.forceApply, dryRun=True)
+
+        msg = wx.MessageDialog(
+            self, describe_plan(summary), "Preview changes", wx.YES_NO | wx.ICON_INFORMATION
+        )
+        msg.SetYesNoLabels("Export JSON...", "Close")
+        if msg.ShowModal() != wx.ID_YES:
+            return
+
+        with wx.FileDialog(
+            self, "Export plan", wildcard="JSON files (*.json)|*.json",
+            defaultFile="projinst.plan.json", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT
+        ) as fileDialog:
+            if fileDialog.ShowModal() == wx.ID_OK:
+                write_plan(summary, Path(fileDialog.GetPath()))
+
     def handleApply(self, event):
         """Submit the form."""
         # Mutate the tree structure and
@@ -25,11 +25,22 @@ class DlgHPCBRun_Base ( wx.Dialog ):
 
 		bSizerMain = wx.BoxSizer( wx.VERTICAL )
 
+		self.searchInstances = wx.SearchCtrl( self, wx.ID_ANY, wx.EmptyString, wx.DefaultPosition, wx.DefaultSize, wx.TE_PROCESS_ENTER )
+		self.searchInstances.ShowSearchButton( True )
+		self.searchInstances.ShowCancelButton( True )
+		self.searchInstances.SetToolTip( u"Filter by sheet name or uuid path" )
+
+		bSizerMain.Add( self.searchInstances, 0, wx.ALL|wx.EXPAND, 5 )
+
 		self.treeApplyTo = wx.dataview.TreeListCtrl( self, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize, wx.dataview.TL_3STATE|wx.dataview.TL_CHECKBOX )
 		self.treeApplyTo.AppendColumn( u"Choose which project instances to import:", wx.COL_WIDTH_DEFAULT, wx.ALIGN_LEFT, 0 )
 
 		bSizerMain.Add( self.treeApplyTo, 1, wx.ALL|wx.EXPAND, 5 )
 
+		self.gaugeProgress = wx.Gauge( self, wx.ID_ANY, 100, wx.DefaultPosition, wx.DefaultSize, wx.GA_HORIZONTAL )
+		self.gaugeProgress.SetValue( 0 )
+		bSizerMain.Add( self.gaugeProgress, 0, wx.ALL|wx.EXPAND, 5 )
+
 		self.m_staticText3 = wx.StaticText( self, wx.ID_ANY, u"Select Anchor:", wx.DefaultPosition, wx.DefaultSize, 0 )
 		self.m_staticText3.Wrap( -1 )
 
@@ -42,11 +53,33 @@ class DlgHPCBRun_Base ( wx.Dialog ):
 
 		bSizerMain.Add( self.anchorChoice, 0, wx.ALL, 5 )
 
+		self.m_staticTextRegion = wx.StaticText( self, wx.ID_ANY, u"Copy tracks, drawings and zones from:", wx.DefaultPosition, wx.DefaultSize, 0 )
+		self.m_staticTextRegion.Wrap( -1 )
+
+		bSizerMain.Add( self.m_staticTextRegion, 0, wx.ALL|wx.EXPAND|wx.RIGHT, 5 )
+
+		regionChoiceChoices = []
+		self.regionChoice = wx.Choice( self, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize, regionChoiceChoices, 0 )
+		self.regionChoice.SetSelection( 0 )
+		bSizerMain.Add( self.regionChoice, 0, wx.ALL|wx.EXPAND, 5 )
+
+		self.regionRect = wx.TextCtrl( self, wx.ID_ANY, wx.EmptyString, wx.DefaultPosition, wx.DefaultSize, 0 )
+		self.regionRect.Enable( False )
+		self.regionRect.SetToolTip( u"Left, top, right, bottom of the rectangle in mm" )
+
+		bSizerMain.Add( self.regionRect, 0, wx.ALL|wx.EXPAND, 5 )
+
+		self.checkForce = wx.CheckBox( self, wx.ID_ANY, u"Re-apply instances that haven't changed", wx.DefaultPosition, wx.DefaultSize, 0 )
+		bSizerMain.Add( self.checkForce, 0, wx.ALL, 5 )
+
 		bSizer2 = wx.BoxSizer( wx.HORIZONTAL )
 
 		self.m_hyperlink1 = wx.adv.HyperlinkCtrl( self, wx.ID_ANY, u"Help", u"https://github.com/OfficialDyray/ProjectInstances/blob/master/README.md", wx.DefaultPosition, wx.DefaultSize, wx.adv.HL_DEFAULT_STYLE )
 		bSizer2.Add( self.m_hyperlink1, 1, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5 )
 
+		self.buttonPreview = wx.Button( self, wx.ID_ANY, u"Preview changes", wx.DefaultPosition, wx.DefaultSize, 0 )
+		bSizer2.Add( self.buttonPreview, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5 )
+
 		m_sdbSizer1 = wx.StdDialogButtonSizer()
 		self.m_sdbSizer1Apply = wx.Button( self, wx.ID_APPLY )
 		m_sdbSizer1.AddButton( self.m_sdbSizer1Apply )
@@ -67,9 +100,15 @@ class DlgHPCBRun_Base ( wx.Dialog ):
 		self.Centre( wx.BOTH )
 
 		# Connect Events
+		self.searchInstances.Bind( wx.EVT_SEARCHCTRL_CANCEL_BTN, self.handleSearchCancel )
+		self.searchInstances.Bind( wx.EVT_TEXT, self.handleSearch )
 		self.treeApplyTo.Bind( wx.dataview.EVT_TREELIST_ITEM_CHECKED, self.handleTreeCheck )
+		self.treeApplyTo.Bind( wx.dataview.EVT_TREELIST_ITEM_EXPANDING, self.handleTreeExpanding )
 		self.treeApplyTo.Bind( wx.dataview.EVT_TREELIST_SELECTION_CHANGED, self.handleSelectionChange )
 		self.anchorChoice.Bind( wx.EVT_CHOICE, self.handleAnchorChange )
+		self.regionChoice.Bind( wx.EVT_CHOICE, self.handleRegionChange )
+		self.regionRect.Bind( wx.EVT_TEXT, self.handleRegionRectChange )
+		self.buttonPreview.Bind( wx.EVT_BUTTON, self.handlePreview )
 		self.m_sdbSizer1Apply.Bind( wx.EVT_BUTTON, self.handleApply )
 
 	def __del__( self ):
@@ -77,14 +116,32 @@ class DlgHPCBRun_Base ( wx.Dialog ):
 
 
 	# Virtual event handlers, override them in your derived class
+	def handleSearchCancel( self, event ):
+		event.Skip()
+
+	def handleSearch( self, event ):
+		event.Skip()
+
 	def handleTreeCheck( self, event ):
 		event.Skip()
 
+	def handleTreeExpanding( self, event ):
+		event.Skip()
+
 	def handleSelectionChange( self, event ):
 		event.Skip()
 
 	def handleAnchorChange( self, event ):
 		event.Skip()
 
+	def handleRegionChange( self, event ):
+		event.Skip()
+
+	def handleRegionRectChange( self, event ):
+		event.Skip()
+
+	def handlePreview( self, event ):
+		event.Skip()
+
 	def handleApply( self, event ):
 		event.Skip()
\ No newline at end of file
@@ -1,12 +1,19 @@
+import hashlib
 import logging
-import math
-from itertools import zip_longest
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pcbnew
 
+from .incremental import CopyMatcher, box_digest, instance_pose
+from .profiling import profiler
+from .transform import RigidTransform
+from .zonefill import keep_zone_fill, refill_stale_zones
+
 logger = logging.getLogger("hierpcb")
 
+# Where BOARD.Add puts new items, the enum moved around between KiCad versions
+ADD_MODE_INSERT = getattr(pcbnew, "ADD_MODE_INSERT", 0)
+
 
 class ErrorLevel:
     INFO = 0
@@ -44,93 +51,257 @@ class ReportedError:
 
 
 class PositionTransform:
-    def __init__(self, template: pcbnew.FOOTPRINT, mutate: pcbnew.FOOTPRINT) -> None:
+    def __init__(self, template: pcbnew.FOOTPRINT, mutate: pcbnew.FOOTPRINT, placed=None) -> None:
         # These are stored such that adding these to the position and rotation of the `template`
         # will yield the position and rotation of the `mutate`.
         self.anchor_template = template
         self.anchor_mutate = mutate
+        # Positions worked out ahead by geometry.place_many, see translate_placed
+        self.placed = placed
+
+        # The anchors don't move while replicating, so read them through SWIG once
+        templatePos = template.GetPosition()
+        mutatePos = mutate.GetPosition()
+        self._templateX: int = templatePos.x
+        self._templateY: int = templatePos.y
+        self._templateAngle: pcbnew.EDA_ANGLE = template.GetOrientation()
+        self._mutateAngle: pcbnew.EDA_ANGLE = mutate.GetOrientation()
+        self._mutateDegrees: float = mutate.GetOrientationDegrees()
+
+        self.rigid = RigidTransform(
+            self._mutateDegrees - template.GetOrientationDegrees(),
+            mutatePos.x,
+            mutatePos.y,
+        )
 
     def translate(self, pos_template: pcbnew.VECTOR2I) -> pcbnew.VECTOR2I:
         # Find the position of fp_template relative to the anchor_template:
-        delta_x: int = pos_template.x - self.anchor_template.GetPosition().x
-        delta_y: int = pos_template.y - self.anchor_template.GetPosition().y
-        rotation = math.radians(
-            self.anchor_mutate.GetOrientationDegrees()
-            - self.anchor_template.GetOrientationDegrees()
-        )
-
-        # With this information, we can compute the net position after any rotation:
-        new_x = (
-            delta_y * math.sin(rotation)
-            + delta_x * math.cos(rotation)
-            + self.anchor_mutate.GetPosition().x
-        )
-        new_y = (
-            delta_y * math.cos(rotation)
-            - delta_x * math.sin(rotation)
-            + self.anchor_mutate.GetPosition().y
-        )
-        return pcbnew.VECTOR2I(int(new_x), int(new_y))
+        delta_x: int = pos_template.x - self._templateX
+        delta_y: int = pos_template.y - self._templateY
+        return self.translate_delta(delta_x, delta_y)
+
+    def translate_delta(self, delta_x: int, delta_y: int) -> pcbnew.VECTOR2I:
+        """Translate a position given relative to the anchor_template."""
+        return pcbnew.VECTOR2I(*self.rigid.point(delta_x, delta_y))
+
+    def translate_many(self, delta_xs, delta_ys) -> List[pcbnew.VECTOR2I]:
+        """Translate columns of positions relative to the anchor_template, see point_columns."""
+        new_xs, new_ys = self.rigid.points(delta_xs, delta_ys)
+        return [pcbnew.VECTOR2I(x, y) for x, y in zip(new_xs, new_ys)]
+
+    def translate_placed(self, category: str, columns) -> List[pcbnew.VECTOR2I]:
+        """translate_many, or the positions of `category` in the InstanceGeometry if there is one."""
+        if self.placed is None:
+            return self.translate_many(*columns)
+        new_xs, new_ys = getattr(self.placed, category)
+        return [pcbnew.VECTOR2I(x, y) for x, y in zip(new_xs, new_ys)]
 
     def orient(self, rot_template: float):
         return (
             rot_template
-            - self.anchor_template.GetOrientation()
-            + self.anchor_mutate.GetOrientation()
+            - self._templateAngle
+            + self._mutateAngle
         )
 
-class GroupManager:
-    def __init__(self, board: pcbnew.BOARD, groupName: str) -> None:
+    def orient_delta(self, degrees: float) -> pcbnew.EDA_ANGLE:
+        """Orient an angle given in degrees relative to the anchor_template."""
+        return pcbnew.EDA_ANGLE(degrees + self._mutateDegrees, pcbnew.DEGREES_T)
+
+class GroupRegistry:
+    """The target board's groups by name and their members, built once per run."""
+    def __init__(self, board: pcbnew.BOARD) -> None:
         self.board: pcbnew.BOARD = board
-        self.group = self._create_or_get(groupName)
+        self._byName: Dict[str, pcbnew.PCB_GROUP] = {}
+        # Group KIID -> {item KIID: item}, filled in the first time a group is used
+        self._members: Dict[str, Dict[str, pcbnew.BOARD_ITEM]] = {}
+
+        for group in board.Groups():
+            # If names clash the last group wins, as it always has
+            self._byName[group.GetName()] = group
 
-    def _create_or_get(self, group_name: str) -> pcbnew.PCB_GROUP:
+    def find(self, group_name: str) -> Optional[pcbnew.PCB_GROUP]:
+        """Get a group by name without creating it."""
+        return self._byName.get(group_name)
+
+    def create_or_get(self, group_name: str) -> pcbnew.PCB_GROUP:
         """Get a group by name, creating it if it doesn't exist."""
-        retGroup = None
-        for group in self.board.Groups():
-            if group.GetName() == group_name:
-                retGroup = group
+        retGroup = self._byName.get(group_name)
         if retGroup is None:
             retGroup = pcbnew.PCB_GROUP(self.board)
             retGroup.SetName(group_name)
             self.board.Add(retGroup)
+            self._byName[group_name] = retGroup
+            self._members[retGroup.m_Uuid.AsString()] = {}
         return retGroup
 
+    def members(self, group: pcbnew.PCB_GROUP) -> Dict[str, pcbnew.BOARD_ITEM]:
+        """The live member map of a group, keep it up to date when changing the group."""
+        key = group.m_Uuid.AsString()
+        members = self._members.get(key)
+        if members is None:
+            members = {item.m_Uuid.AsString(): item for item in group.GetItems()}
+            self._members[key] = members
+        return members
+
+    def forget(self, group: pcbnew.PCB_GROUP, itemKiid: str):
+        members = self._members.get(group.m_Uuid.AsString())
+        if members is not None:
+            members.pop(itemKiid, None)
+
+class GroupManager:
+    def __init__(self, boardIndex: "BoardIndex", groupName: str) -> None:
+        self.board: pcbnew.BOARD = boardIndex.board
+        self.boardIndex = boardIndex
+        self.groups = boardIndex.groups
+        self.group = self.groups.create_or_get(groupName)
+        self._members = self.groups.members(self.group)
+
     def move(self, item: pcbnew.BOARD_ITEM) -> bool:
         """Force an item to be in our group"""
         # First, check if the footprint is already in the group:
+        itemKiid = item.m_Uuid.AsString()
+        if itemKiid in self._members:
+            return
+
         parent_group = item.GetParentGroup()
         # If the footprint is not already in the group, remove it from the current group:
         if parent_group:
             parent_group.RemoveItem(item)
+            self.groups.forget(parent_group, itemKiid)
 
         self.group.AddItem(item)
         item.SetParentGroup(self.group)
+        self._members[itemKiid] = item
+
+    @property
+    def members(self) -> Dict[str, pcbnew.BOARD_ITEM]:
+        """Everything in our group by KIID, kept up to date as items are moved in and removed."""
+        return self._members
+
+    def volatile_members(self) -> Dict[str, pcbnew.BOARD_ITEM]:
+        """Tracks, drawings and zones in our group by KIID."""
+        return {kiid: item for kiid, item in self._members.items() if is_volatile(item)}
+
+    def remove(self, itemKiid: str):
+        """Delete one of our items from the board."""
+        item = self._members.pop(itemKiid)
+        self.boardIndex.remove(item)
+
+class BoardIndex:
+    """
+    Lookups on the target board, built once per run and shared by every instance.
+    Items are added and removed through it so connectivity is rebuilt once, by commit().
+    """
+    # Cleared if this pcbnew's BOARD.AddNative has no skip connectivity argument
+    _addSkipsConnectivity = True
+
+    def __init__(self, board: pcbnew.BOARD) -> None:
+        self.board: pcbnew.BOARD = board
+        self.groups = GroupRegistry(board)
+        self.changed = False
+
+        # Copied zones keep the source fill instead of being left to be refilled, see zonefill.py
+        self.reuseZoneFills = False
+        # (zone, members of its group) to check for foreign copper once everything is applied
+        self.pendingZones: List[Tuple[pcbnew.ZONE, Dict[str, pcbnew.BOARD_ITEM]]] = []
+        # Net code -> NETINFO_ITEM, read the first time a net is needed
+        self._netsByCode: Optional[Dict[int, pcbnew.NETINFO_ITEM]] = None
+
+        # Footprints by their full KIID path, and by every uuid path prefix
+        # so an instance gets all of its footprints in one lookup:
+        # "/a/b/c" is found under "/a/b" as "/c" and under "/a" as "/b/c"
+        self._footprintsByPath: Dict[str, pcbnew.FOOTPRINT] = {}
+        self._footprintsByInstance: Dict[str, Dict[str, pcbnew.FOOTPRINT]] = {}
+
+        for footprint in board.GetFootprints():
+            path = footprint.GetPath().AsString()
+            self._footprintsByPath[path] = footprint
+
+            split = path.find("/", 1)
+            while split != -1:
+                self._footprintsByInstance.setdefault(path[:split], {})[path[split:]] = footprint
+                split = path.find("/", split + 1)
+
+    def netByCode(self, netCode: int) -> pcbnew.NETINFO_ITEM:
+        if self._netsByCode is None:
+            self._netsByCode = dict(self.board.GetNetsByNetcode().items())
+
+        net = self._netsByCode.get(netCode)
+        if net is None:
+            net = self.board.FindNet(netCode)
+            self._netsByCode[netCode] = net
+        return net
+
+    def add(self, item: pcbnew.BOARD_ITEM):
+        # What BOARD.Add does, but it doesn't pass on the skip connectivity argument
+        item.thisown = 0
+        if BoardIndex._addSkipsConnectivity:
+            try:
+                self.board.AddNative(item, ADD_MODE_INSERT, True)
+            except TypeError:
+                BoardIndex._addSkipsConnectivity = False
+                self.board.AddNative(item)
+        else:
+            self.board.AddNative(item)
+        self.changed = True
+
+    def remove(self, item: pcbnew.BOARD_ITEM):
+        self.board.RemoveNative(item)
+        self.changed = True
+
+    def commit(self) -> bool:
+        """Rebuild connectivity and the ratsnest after a batch of changes. Returns true if anything changed."""
+        if not self.changed:
+            return False
+
+        with profiler.span("connectivity"):
+            self.board.BuildConnectivity()
+        self.changed = False
+
+        # Refilling needs up to date connectivity, and changes it
+        if self.pendingZones:
+            pendingZones, self.pendingZones = self.pendingZones, []
+            if refill_stale_zones(self.board, pendingZones):
+                with profiler.span("connectivity"):
+                    self.board.BuildConnectivity()
+        return True
+
+    def footprintByPath(self, path: str) -> Optional[pcbnew.FOOTPRINT]:
+        return self._footprintsByPath.get(path)
+
+    def footprintsOfInstance(self, uuidPath: str) -> Dict[str, pcbnew.FOOTPRINT]:
+        """Footprints below an instance, keyed by their path within the instance."""
+        return self._footprintsByInstance.get(uuidPath, {})
 
 class FootprintTranslator:
-    def __init__(self, searchBoard, searchPrefix):
-        self._searchBoard = searchBoard
+    def __init__(self, boardIndex: BoardIndex, searchPrefix):
         self._searchPrefix = searchPrefix
+        self._targets = boardIndex.footprintsOfInstance(searchPrefix)
 
     def getTarget(self, subPcbFootprint: pcbnew.FOOTPRINT):
-        newPath = pcbnew.KIID_PATH(self._searchPrefix + subPcbFootprint.GetPath().AsString())
-        mainFootprint = self._searchBoard.FindFootprintByPath(newPath)
-        return mainFootprint
+        return self.getTargetByPath(subPcbFootprint.GetPath().AsString())
+
+    def getTargetByPath(self, subPcbPath: str):
+        return self._targets.get(subPcbPath)
 
 class ReplicateContext(PositionTransform, GroupManager):
     def __init__(
         self,
         sourceAnchorFootprint: pcbnew.FOOTPRINT, 
         targetAnchorFootprint: pcbnew.FOOTPRINT,
-        groupName
+        groupName,
+        boardIndex: BoardIndex,
+        placed=None
         ):
 
+        # The target board is the one indexed, not necessarily the one open in the editor
         self._sourceBoard = sourceAnchorFootprint.GetBoard()
-        self._targetBoard = pcbnew.GetBoard()
+        self._targetBoard = boardIndex.board
+        self.boardIndex = boardIndex
 
-        PositionTransform.__init__(self, sourceAnchorFootprint, targetAnchorFootprint)
+        PositionTransform.__init__(self, sourceAnchorFootprint, targetAnchorFootprint, placed)
 
-        GroupManager.__init__(self, self._targetBoard, groupName)
+        GroupManager.__init__(self, self.boardIndex, groupName)
 
     @property
     def sourceBoard(self):
@@ -148,29 +319,120 @@ def footprintInBounds(footprint: pcbnew.FOOTPRINT):
         return False
     return True
 
-def clear_volatile_items(group: pcbnew.PCB_GROUP):
+# Items that are recreated from the sub-board on every apply
+VOLATILE_ITEM_TYPES = (
+    # Traces
+    pcbnew.PCB_TRACK,
+    # Drawings
+    pcbnew.PCB_SHAPE, pcbnew.PCB_TEXT,
+    # Zones
+    pcbnew.ZONE
+)
+
+def is_volatile(item: pcbnew.BOARD_ITEM) -> bool:
+    return isinstance(item.Cast(), VOLATILE_ITEM_TYPES)
+
+def volatile_category(item: pcbnew.BOARD_ITEM) -> str:
+    """"tracks", "zones" or "drawings", the same split as the template."""
+    item = item.Cast()
+    if isinstance(item, pcbnew.ZONE):
+        return "zones"
+    if isinstance(item, pcbnew.PCB_TRACK):
+        return "tracks"
+    return "drawings"
+
+def clear_volatile_items(context: ReplicateContext):
     """Remove all Traces, Drawings, Zones in a group."""
-    board = group.GetBoard()
-
-    itemTypesToRemove = (
-        # Traces
-        pcbnew.PCB_TRACK, pcbnew.ZONE,
-        # Drawings
-        pcbnew.PCB_SHAPE, pcbnew.PCB_TEXT,
-        # Zones
-        pcbnew.ZONE
-    )
-
-    for item in group.GetItems():
-
-        # Gets all drawings in a group
-        if isinstance(item.Cast(), itemTypesToRemove):
-            # Remove every drawing
-            board.RemoveNative(item)
-
+    # Gets all drawings in a group
+    volatileMembers = context.volatile_members()
+    for itemKiid in volatileMembers:
+        # Remove every drawing
+        context.remove(itemKiid)
+    profiler.count("removed", len(volatileMembers))
+
+def bbox_key(item: pcbnew.BOARD_ITEM) -> list:
+    bbox = item.GetBoundingBox()
+    return [bbox.GetX(), bbox.GetY(), bbox.GetWidth(), bbox.GetHeight()]
+
+# Getters that describe an item beyond its bounding box, when the item has them
+SIGNATURE_GETTERS = (
+    "GetShape", "GetWidth", "GetStart", "GetEnd", "GetMid", "GetBezierC1", "GetBezierC2",
+    "GetDrillValue", "GetText", "GetNumCorners", "GetAssignedPriority",
+    # Zone settings
+    "GetLocalClearance", "GetMinThickness", "GetPadConnection", "GetThermalReliefGap",
+    "GetThermalReliefSpokeWidth", "GetFillMode", "GetHatchThickness", "GetHatchGap",
+    "GetHatchOrientation", "GetIslandRemovalMode", "GetMinIslandArea",
+    "GetCornerSmoothingType", "GetCornerRadius", "GetZoneName",
+    # Rule areas
+    "GetIsRuleArea", "GetDoNotAllowCopperPour", "GetDoNotAllowVias", "GetDoNotAllowTracks",
+    "GetDoNotAllowPads", "GetDoNotAllowFootprints",
+)
+
+def signature_value(value):
+    """A getter's result as something with a stable repr."""
+    if isinstance(value, pcbnew.VECTOR2I):
+        return (value.x, value.y)
+    if hasattr(value, "AsDegrees"):
+        return value.AsDegrees()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    # Other SWIG objects would repr as their address
+    return type(value).__name__
+
+def outline_points(item: pcbnew.BOARD_ITEM) -> tuple:
+    """Every corner of a zone's or polygon's outline, holes included. Empty for anything else."""
+    if isinstance(item, pcbnew.ZONE):
+        polygons = item.Outline()
+    elif isinstance(item, pcbnew.PCB_SHAPE) and item.GetShape() == pcbnew.SHAPE_T_POLY:
+        polygons = item.GetPolyShape()
+    else:
+        return ()
+
+    points = [polygons.OutlineCount()]
+    for index in range(polygons.TotalVertices()):
+        vertex = polygons.CVertex(index)
+        points.append((vertex.x, vertex.y))
+    return tuple(points)
+
+def item_signature(item: pcbnew.BOARD_ITEM) -> str:
+    """A stable digest of a source item's geometry and settings."""
+    item = item.Cast()
+    values = [item.GetClass(), item.GetLayerSet().FmtHex()] + bbox_key(item)
+    for getterName in SIGNATURE_GETTERS:
+        getter = getattr(item, getterName, None)
+        if getter is None:
+            continue
+        try:
+            value = getter()
+        except TypeError:
+            # Some of these take arguments on some classes or KiCad versions
+            continue
+        values.append(signature_value(value))
+    values.append(outline_points(item))
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+def copy_digest(signature: str, targetItem: pcbnew.BOARD_ITEM) -> str:
+    return box_digest(signature, bbox_key(targetItem))
+
+def target_fingerprint(boardIndex: BoardIndex, groupName: str, uuidPath: str) -> str:
+    """
+    A digest of what an apply left on the target board for one instance: the items of its
+    group and where they are, and the nets of its footprints' pads, which the copied
+    tracks and zones are mapped onto. Changes after an undo or when the netlist changes.
+    """
+    values = []
+    group = boardIndex.groups.find(groupName)
+    if group is not None:
+        for itemKiid, item in sorted(boardIndex.groups.members(group).items()):
+            position = item.GetPosition()
+            values.append((itemKiid, position.x, position.y, *bbox_key(item)))
+
+    for path, footprint in sorted(boardIndex.footprintsOfInstance(uuidPath).items()):
+        values.append((path, [(pad.GetNumber(), pad.GetNetname()) for pad in footprint.Pads()]))
+    return hashlib.sha1(repr(values).encode()).hexdigest()
 
 def copy_footprint_fields(
-    sourceFootprint: pcbnew.FOOTPRINT,
+    sourceFootprint,
     targetFootprint: pcbnew.FOOTPRINT,
     transform
 ):
@@ -180,150 +442,284 @@ def copy_footprint_fields(
 
     # Do any other field values need preserved?
 
-    if len(sourceFootprint.GetFields()) != len(targetFootprint.GetFields()):
+    if len(sourceFootprint.fields) != len(targetFootprint.GetFields()):
         logger.info("Number of footprint fields dont match")
         return
 
     originalReference = targetFootprint.GetReference()
+    sourceFields = {field.name: field for field in sourceFootprint.fields}
 
     # Remove Existing footprint fields
     for targetField in targetFootprint.GetFields():
-        sourceField = sourceFootprint.GetFieldByName(
-            targetField.GetName()
-        )
+        sourceField = sourceFields.get(targetField.GetName())
         if not sourceField:
             logger.info("Field not found by name")
             continue
 
-        targetField.SetPosition(transform.translate(sourceField.GetPosition()))
-        targetField.SetTextAngle(
-            transform.orient(sourceField.GetTextAngle())
-        )
+        targetField.SetPosition(transform.translate_delta(sourceField.dx, sourceField.dy))
+        targetField.SetTextAngle(transform.orient_delta(sourceField.angle))
 
     targetFootprint.SetReference(originalReference)
 
 
 def copy_footprint_data(
-    sourceFootprint: pcbnew.FOOTPRINT,
+    sourceFootprint,
     targetFootprint: pcbnew.FOOTPRINT,
-    transform
+    transform,
+    position: Optional[pcbnew.VECTOR2I] = None
 ):
     # Replace with Footprint Cloning?
-    if sourceFootprint.IsFlipped() != targetFootprint.IsFlipped():
+    if sourceFootprint.flipped != targetFootprint.IsFlipped():
         targetFootprint.Flip(targetFootprint.GetPosition(), False)
 
-    # The list of properties is from the ReplicateLayout plugin. Thanks @MitjaNemec!
-    targetFootprint.SetLocalClearance(sourceFootprint.GetLocalClearance())
-    targetFootprint.SetLocalSolderMaskMargin(sourceFootprint.GetLocalSolderMaskMargin())
-    targetFootprint.SetLocalSolderPasteMargin(sourceFootprint.GetLocalSolderPasteMargin())
-    targetFootprint.SetLocalSolderPasteMarginRatio(
-        sourceFootprint.GetLocalSolderPasteMarginRatio()
-    )
-    targetFootprint.SetLocalZoneConnection(sourceFootprint.GetLocalZoneConnection())
+    (
+        clearance,
+        solderMaskMargin,
+        solderPasteMargin,
+        solderPasteMarginRatio,
+        zoneConnection,
+    ) = sourceFootprint.localSettings
+    targetFootprint.SetLocalClearance(clearance)
+    targetFootprint.SetLocalSolderMaskMargin(solderMaskMargin)
+    targetFootprint.SetLocalSolderPasteMargin(solderPasteMargin)
+    targetFootprint.SetLocalSolderPasteMarginRatio(solderPasteMarginRatio)
+    targetFootprint.SetLocalZoneConnection(zoneConnection)
 
     # Move the footprint:
-    targetFootprint.SetPosition(transform.translate(sourceFootprint.GetPosition()))
-    targetFootprint.SetOrientation(transform.orient(sourceFootprint.GetOrientation()))
+    if position is None:
+        position = transform.translate_delta(sourceFootprint.dx, sourceFootprint.dy)
+    targetFootprint.SetPosition(position)
+    targetFootprint.SetOrientation(transform.orient_delta(sourceFootprint.orientation))
 
     # Fields must be moved after the footprint
     copy_footprint_fields(sourceFootprint, targetFootprint, transform)
 
-def copy_drawings(context: ReplicateContext):
-    for sourceDrawing in context.sourceBoard.GetDrawings(): 
-        
-        newDrawing = sourceDrawing.Duplicate()
-        context.targetBoard.Add(newDrawing)
+def copy_drawing(context: ReplicateContext, sourceDrawing, newPosition: pcbnew.VECTOR2I):
+    newDrawing = sourceDrawing.item.Duplicate()
+    context.boardIndex.add(newDrawing)
 
-        # Set New Position
-        newDrawing.SetPosition(context.translate(sourceDrawing.GetPosition()))
+    # Set New Position
+    newDrawing.SetPosition(newPosition)
 
-        # Drawings dont have .SetOrientation()
-        # instead do a relative rotation
-        newDrawing.Rotate(newDrawing.GetPosition(), context.orient(pcbnew.ANGLE_0))
+    # Drawings dont have .SetOrientation()
+    # instead do a relative rotation
+    newDrawing.Rotate(newDrawing.GetPosition(), context.orient(pcbnew.ANGLE_0))
 
-        context.move(newDrawing)
+    context.move(newDrawing)
+    return newDrawing
 
-def copy_traces(context: ReplicateContext, netMapping: dict):
-    for sourceTrack in context.sourceBoard.Tracks():
-        # Copy track to trk:
-        # logger.info(f"{track} {type(track)} {track.GetStart()} -> {track.GetEnd()}")
-        
-        newTrack = sourceTrack.Duplicate()
-        context.targetBoard.Add(newTrack)
+def copy_drawings(context: ReplicateContext, template):
+    newPositions = context.translate_placed("drawings", template.drawingPoints)
 
-        sourceNetCode = sourceTrack.GetNetCode()
-        newNetCode = netMapping.get(sourceNetCode, 0)
-        newTrack.SetNet(context.targetBoard.FindNet(newNetCode))
+    for sourceDrawing, newPosition in zip(template.drawings, newPositions): 
+        copy_drawing(context, sourceDrawing, newPosition)
+
+def copy_trace(
+    context: ReplicateContext,
+    sourceTrack,
+    newStart: pcbnew.VECTOR2I,
+    newEnd: pcbnew.VECTOR2I,
+    netMapping: dict
+):
+    # Copy track to trk:
+    newTrack = sourceTrack.item.Duplicate()
+    context.boardIndex.add(newTrack)
 
-        # Sets Track start and end point
-        # Via's ignore the end point, just copying anyways
-        newTrack.SetStart(context.translate(sourceTrack.GetStart()))
-        newTrack.SetEnd  (context.translate(sourceTrack.GetEnd()  ))
+    newNetCode = netMapping.get(sourceTrack.netCode, 0)
+    newTrack.SetNet(context.boardIndex.netByCode(newNetCode))
 
-        if type(newTrack) == pcbnew.PCB_VIA:
-            newTrack.SetIsFree(False)
+    # Sets Track start and end point
+    # Via's ignore the end point, just copying anyways
+    newTrack.SetStart(newStart)
+    newTrack.SetEnd  (newEnd  )
 
-        context.move(newTrack)
+    if sourceTrack.isVia:
+        newTrack.SetIsFree(False)
 
-def copy_zones(context: ReplicateContext, netMapping: dict):
+    context.move(newTrack)
+    return newTrack
 
-    for sourceZone in context.sourceBoard.Zones():
-        
-        newZone = sourceZone.Duplicate()
+def copy_traces(context: ReplicateContext, template, netMapping: dict):
+    newStarts = context.translate_placed("trackStarts", template.trackStarts)
+    newEnds = context.translate_placed("trackEnds", template.trackEnds)
 
-        sourceNetCode = sourceZone.GetNetCode()
-        newNetCode = netMapping.get(sourceNetCode, 0)
-        newZone.SetNet(context.targetBoard.FindNet(newNetCode))
+    for sourceTrack, newStart, newEnd in zip(template.tracks, newStarts, newEnds):
+        copy_trace(context, sourceTrack, newStart, newEnd, netMapping)
 
-        context.targetBoard.Add(newZone)
+def copy_zone(context: ReplicateContext, sourceZone, newPosition: pcbnew.VECTOR2I, netMapping: dict):
+    newZone = sourceZone.item.Duplicate()
 
-        # Set New Position
-        # newZone.SetPosition(transform.translate(zone.GetPosition()))
+    newNetCode = netMapping.get(sourceZone.netCode, 0)
+    newZone.SetNet(context.boardIndex.netByCode(newNetCode))
 
-        # Temporary Workaround:
-        # Move zone to 0,0 by moving relative
-        newZone.Move(-newZone.GetPosition())
-        # Move zone to correct location
-        newZone.Move(context.translate(sourceZone.GetPosition()))
+    context.boardIndex.add(newZone)
 
-        # Drawings dont have .SetOrientation()
-        # instead do a relative rotation
-        newZone.Rotate(newZone.GetPosition(), context.orient(pcbnew.ANGLE_0))
+    # Set New Position
+    # newZone.SetPosition(transform.translate(zone.GetPosition()))
 
-        context.move(newZone)
+    # Temporary Workaround:
+    # Move zone to 0,0 by moving relative
+    newZone.Move(-newZone.GetPosition())
+    # Move zone to correct location
+    newZone.Move(newPosition)
 
+    # Drawings dont have .SetOrientation()
+    # instead do a relative rotation
+    newZone.Rotate(newZone.GetPosition(), context.orient(pcbnew.ANGLE_0))
+
+    context.move(newZone)
+
+    # The fill was moved and rotated with the outline
+    if context.boardIndex.reuseZoneFills and keep_zone_fill(newZone):
+        context.boardIndex.pendingZones.append((newZone, context.members))
+    return newZone
+
+def copy_zones(context: ReplicateContext, template, netMapping: dict):
+    newPositions = context.translate_placed("zones", template.zonePoints)
+
+    for sourceZone, newPosition in zip(template.zones, newPositions):
+        copy_zone(context, sourceZone, newPosition, netMapping)
+
+
+def match_previous(
+    boardIndex: BoardIndex,
+    rigid: RigidTransform,
+    template,
+    netMapping: dict,
+    previous: dict,
+    existing: Dict[str, pcbnew.BOARD_ITEM]
+):
+    """
+    Compare an instance's existing copies against the mapping from the last run.
+    Returns the target KIIDs to keep, the mapping entries of those, and for drawings,
+    tracks and zones the (template index, new signature) of every item to recreate.
+    Doesn't change the board.
+    """
+    # Net codes get renumbered between sessions, compare by name
+    netNames = {
+        sourceCode: boardIndex.netByCode(targetCode).GetNetname()
+        for sourceCode, targetCode in netMapping.items()
+    }
+    pose = instance_pose(rigid, template.sourceAnchor)
+
+    def targetDigest(targetKiid: str, signature: str) -> Optional[str]:
+        targetItem = existing.get(targetKiid)
+        return None if targetItem is None else copy_digest(signature, targetItem)
+
+    matcher = CopyMatcher(pose, netNames, previous, targetDigest)
+
+    trackKeys, drawingKeys, zoneKeys = template.itemKeys
+    staleDrawings = matcher.stale(drawingKeys, [None] * len(drawingKeys))
+    staleTracks = matcher.stale(trackKeys, [t.netCode for t in template.tracks])
+    staleZones = matcher.stale(zoneKeys, [z.netCode for z in template.zones])
+    return matcher.kept, matcher.mapping, staleDrawings, staleTracks, staleZones
+
+
+def sync_volatile_items(
+    context: ReplicateContext,
+    template,
+    netMapping: dict,
+    previous: dict
+) -> dict:
+    """
+    Incremental alternative to clear_volatile_items + copy_*.
+
+    `previous` maps the KIID of each source item to [target KIID, box_digest] as
+    returned by the last run. Target items whose source, anchor poses and net are
+    unchanged (and that weren't edited by hand) are left alone, everything else in the
+    group is removed or recreated. Returns the mapping to pass to the next run.
+    """
+    existing = context.volatile_members()
+    kept, mapping, staleDrawings, staleTracks, staleZones = match_previous(
+        context.boardIndex, context.rigid, template, netMapping, previous, existing
+    )
+    trackKeys, drawingKeys, zoneKeys = template.itemKeys
+
+    def record(sourceKiid: str, signature: str, newItem: pcbnew.BOARD_ITEM):
+        mapping[sourceKiid] = [newItem.m_Uuid.AsString(), copy_digest(signature, newItem)]
+
+    # Remove the stale copies first
+    removed = 0
+    for kiid in existing:
+        if kiid not in kept:
+            context.remove(kiid)
+            removed += 1
+
+    if staleDrawings:
+        newPositions = context.translate_placed("drawings", template.drawingPoints)
+        for index, signature in staleDrawings:
+            newItem = copy_drawing(context, template.drawings[index], newPositions[index])
+            record(drawingKeys[index][0], signature, newItem)
+
+    if staleTracks:
+        newStarts = context.translate_placed("trackStarts", template.trackStarts)
+        newEnds = context.translate_placed("trackEnds", template.trackEnds)
+        for index, signature in staleTracks:
+            newItem = copy_trace(
+                context, template.tracks[index], newStarts[index], newEnds[index], netMapping
+            )
+            record(trackKeys[index][0], signature, newItem)
+
+    if staleZones:
+        newPositions = context.translate_placed("zones", template.zonePoints)
+        for index, signature in staleZones:
+            newItem = copy_zone(context, template.zones[index], newPositions[index], netMapping)
+            record(zoneKeys[index][0], signature, newItem)
+
+    logger.info(
+        f"Incremental sync kept {len(kept)} items, removed {removed}, "
+        f"added {len(staleDrawings) + len(staleTracks) + len(staleZones)}"
+    )
+    profiler.count("kept", len(kept))
+    profiler.count("removed", removed)
+    profiler.count("added", len(staleDrawings) + len(staleTracks) + len(staleZones))
+    return mapping
+
+
+def pad_table(footprint: pcbnew.FOOTPRINT) -> Dict[str, List[int]]:
+    """Net codes of a footprint's pads by pad number, in pad order."""
+    table = {}
+    for pad in footprint.Pads():
+        table.setdefault(pad.GetNumber(), []).append(pad.GetNetCode())
+    return table
+
+def map_pad_nets(sourceFootprint, targetFootprint: pcbnew.FOOTPRINT, netMapping: dict):
+    """Add the sub-board net code -> board net code pairs of one footprint to `netMapping`."""
+    # Pads are paired by number, pads sharing a number are paired in order
+    targetPads = pad_table(targetFootprint)
+    for padNumber, sourceCodes in sourceFootprint.padNets:
+        targetCodes = targetPads.get(padNumber, ())
+
+        for sourceCode, targetCode in zip(sourceCodes, targetCodes):
+            netMapping[sourceCode] = targetCode
 
 def enforce_position_footprints(
     context: ReplicateContext,
-    fpTranslator: FootprintTranslator
+    fpTranslator: FootprintTranslator,
+    template
 ) -> dict:
     # The keys are the sub-pcb net codes
     # The values are the new net codes
     footprintNetMapping = {}
 
-    # For each footprint in the sub-PCB, find the corresponding footprint on the board:
-    for sourceFootprint in context.sourceBoard.GetFootprints():
-        if not footprintInBounds(sourceFootprint):
-            continue
+    newPositions = context.translate_placed("footprints", template.footprintPoints)
+
+    # For each footprint in the sub-PCB, find the corresponding footprint on the board.
+    # Footprints out of bounds were already left out of the template.
+    for sourceFootprint, newPosition in zip(template.footprints, newPositions):
 
         # Find the corresponding footprint on the board:
-        targetFootprint = fpTranslator.getTarget(sourceFootprint)
+        targetFootprint = fpTranslator.getTargetByPath(sourceFootprint.path)
 
         if not targetFootprint:
             continue
 
         # Copy the properties and move the template to the target:
-        copy_footprint_data(sourceFootprint, targetFootprint, context)
-
-        # Assumes pads are ordered by the pad number
-        for sourcePadNum, sourcePad in enumerate(sourceFootprint.Pads()):
-            targetPad = targetFootprint.Pads()[sourcePadNum]
+        copy_footprint_data(sourceFootprint, targetFootprint, context, newPosition)
 
-            sourceCode = sourcePad.GetNetCode()
-            targetCode = targetPad.GetNetCode()
-            footprintNetMapping[sourceCode] = targetCode
+        map_pad_nets(sourceFootprint, targetFootprint, footprintNetMapping)
 
         # Move the footprint into the group if one is provided:
         context.move(targetFootprint)
     
-    return footprintNetMapping
\ No newline at end of file
+    return footprintNetMapping
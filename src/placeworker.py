@@ -0,0 +1,41 @@
+from typing import NamedTuple, Optional
+
+from .transform import RigidTransform
+
+# The part of geometry.py that runs in worker processes. It's kept apart so a worker
+# only ever imports this and transform.py, never pcbnew or wx, see geometry.place_many.
+
+
+class TemplateGeometry(NamedTuple):
+    """Point columns relative to the source anchor, see point_columns."""
+    footprints: tuple
+    trackStarts: tuple
+    trackEnds: tuple
+    drawings: tuple
+    zones: tuple
+
+
+class InstanceGeometry(NamedTuple):
+    """The same points placed for one instance, as (xs, ys) lists of board coordinates."""
+    footprints: tuple
+    trackStarts: tuple
+    trackEnds: tuple
+    drawings: tuple
+    zones: tuple
+
+
+def place(geometry: TemplateGeometry, rigid: RigidTransform) -> InstanceGeometry:
+    return InstanceGeometry(*(rigid.points(*columns) for columns in geometry))
+
+
+# The template of the pool's current job, sent to each worker once instead of with every instance
+_workerGeometry: Optional[TemplateGeometry] = None
+
+
+def init_worker(geometry: TemplateGeometry):
+    global _workerGeometry
+    _workerGeometry = geometry
+
+
+def place_in_worker(rigid: RigidTransform) -> InstanceGeometry:
+    return place(_workerGeometry, rigid)
@@ -0,0 +1,217 @@
+import json
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pcbnew
+
+from .placement import (
+    BoardIndex, FootprintTranslator, PositionTransform,
+    bbox_key, is_volatile, map_pad_nets, match_previous, volatile_category,
+)
+from .template import ReplicationTemplate
+
+logger = logging.getLogger("hierpcb")
+
+# A plan is what applying an instance would do, worked out without changing the board.
+# Positions and boxes are in internal units (nm), boxes are [x, y, width, height]
+# like bbox_key, poses are [x, y, degrees, flipped].
+
+CATEGORIES = ("tracks", "drawings", "zones")
+
+
+def normalize_degrees(degrees: float) -> float:
+    degrees %= 360
+    return 0.0 if abs(degrees - 360) < 1e-6 else degrees
+
+
+def box_union(boxes: Iterable[list]) -> Optional[list]:
+    left = top = right = bottom = None
+    for x, y, width, height in boxes:
+        left = x if left is None else min(left, x)
+        top = y if top is None else min(top, y)
+        right = x + width if right is None else max(right, x + width)
+        bottom = y + height if bottom is None else max(bottom, y + height)
+
+    if left is None:
+        return None
+    return [left, top, right - left, bottom - top]
+
+
+def item_changes(boxes: List[list]) -> dict:
+    return {"count": len(boxes), "bbox": box_union(boxes), "boxes": boxes}
+
+
+def transformed_boxes(transform: PositionTransform, relativeBoxes, indices) -> List[list]:
+    """Where the template boxes at `indices` end up, as axis aligned boxes."""
+    xs, ys = [], []
+    for index in indices:
+        left, top, right, bottom = relativeBoxes[index]
+        xs += [left, right, right, left]
+        ys += [top, top, bottom, bottom]
+    newXs, newYs = transform.rigid.points(xs, ys)
+
+    boxes = []
+    for corner in range(0, len(newXs), 4):
+        cornerXs = newXs[corner:corner + 4]
+        cornerYs = newYs[corner:corner + 4]
+        boxes.append([
+            min(cornerXs), min(cornerYs),
+            max(cornerXs) - min(cornerXs), max(cornerYs) - min(cornerYs),
+        ])
+    return boxes
+
+
+def plan_footprints(
+    transform: PositionTransform,
+    fpTranslator: FootprintTranslator,
+    template: ReplicationTemplate,
+    netMapping: dict
+) -> dict:
+    """The footprints that would move, and fill in the net mapping on the way."""
+    moves = []
+    missing = []
+    unchanged = 0
+    targetDegrees = transform.anchor_mutate.GetOrientationDegrees()
+
+    newXs, newYs = transform.rigid.points(
+        [fp.dx for fp in template.footprints], [fp.dy for fp in template.footprints]
+    )
+
+    for sourceFootprint, newX, newY in zip(template.footprints, newXs, newYs):
+        targetFootprint = fpTranslator.getTargetByPath(sourceFootprint.path)
+        if not targetFootprint:
+            missing.append(sourceFootprint.path)
+            continue
+
+        map_pad_nets(sourceFootprint, targetFootprint, netMapping)
+
+        position = targetFootprint.GetPosition()
+        old = [
+            position.x, position.y,
+            normalize_degrees(targetFootprint.GetOrientationDegrees()),
+            targetFootprint.IsFlipped(),
+        ]
+        new = [
+            newX, newY,
+            normalize_degrees(sourceFootprint.orientation + targetDegrees),
+            sourceFootprint.flipped,
+        ]
+
+        if old[:2] == new[:2] and abs(old[2] - new[2]) < 1e-6 and old[3] == new[3]:
+            unchanged += 1
+            continue
+
+        moves.append({
+            "reference": targetFootprint.GetReferenceAsString(),
+            "path": sourceFootprint.path,
+            "from": old,
+            "to": new,
+        })
+
+    return {"move": moves, "unchanged": unchanged, "missing": missing}
+
+
+def plan_instance(
+    boardIndex: BoardIndex,
+    template: ReplicationTemplate,
+    fpTranslator: FootprintTranslator,
+    targetAnchor: pcbnew.FOOTPRINT,
+    groupName: str,
+    previous: Optional[dict] = None
+) -> dict:
+    """
+    What applyBoard would do to one instance. `previous` is the mapping from the last
+    incremental run, None plans a full replace.
+    """
+    transform = PositionTransform(template.anchorFootprint, targetAnchor)
+
+    netMapping = {}
+    footprints = plan_footprints(transform, fpTranslator, template, netMapping)
+
+    # What the instance has now, the group might not exist yet
+    group = boardIndex.groups.find(groupName)
+    existing = {}
+    if group is not None:
+        existing = {
+            kiid: item for kiid, item in boardIndex.groups.members(group).items() if is_volatile(item)
+        }
+
+    if previous is None:
+        kept = set()
+        toAdd = [range(len(template.tracks)), range(len(template.drawings)), range(len(template.zones))]
+    else:
+        kept, _, staleDrawings, staleTracks, staleZones = match_previous(
+            boardIndex, transform.rigid, template, netMapping, previous, existing
+        )
+        toAdd = [
+            [index for index, _ in staleTracks],
+            [index for index, _ in staleDrawings],
+            [index for index, _ in staleZones],
+        ]
+
+    removed = {category: [] for category in CATEGORIES}
+    for kiid, item in existing.items():
+        if kiid not in kept:
+            removed[volatile_category(item)].append(bbox_key(item))
+
+    added = {
+        category: item_changes(transformed_boxes(transform, relativeBoxes, indices))
+        for category, relativeBoxes, indices in zip(CATEGORIES, template.itemBoxes, toAdd)
+    }
+
+    return {
+        "footprints": footprints,
+        "add": added,
+        "remove": {category: item_changes(boxes) for category, boxes in removed.items()},
+        "keep": len(kept),
+    }
+
+
+def plan_totals(plans: List[dict]) -> dict:
+    totals = {"move": 0, "add": {}, "remove": {}, "keep": 0}
+    for plan in plans:
+        totals["move"] += len(plan["footprints"]["move"])
+        totals["keep"] += plan["keep"]
+        for change in ("add", "remove"):
+            for category in CATEGORIES:
+                totals[change][category] = totals[change].get(category, 0) + plan[change][category]["count"]
+    return totals
+
+
+def describe_plan(summary: dict) -> str:
+    """A few lines per instance for showing a plan to the user."""
+    def counts(changes: dict) -> str:
+        parts = [f"{changes[c]['count']} {c}" for c in CATEGORIES if changes[c]["count"]]
+        return ", ".join(parts) or "nothing"
+
+    lines = []
+    for plan in summary["plan"]:
+        lines.append(f"{plan['name']}:")
+        lines.append(f"  move {len(plan['footprints']['move'])} footprints")
+        if plan["footprints"]["missing"]:
+            lines.append(f"  {len(plan['footprints']['missing'])} footprints not on the board")
+        lines.append(f"  remove {counts(plan['remove'])}")
+        lines.append(f"  add {counts(plan['add'])}")
+        if plan["keep"]:
+            lines.append(f"  keep {plan['keep']} unchanged items")
+
+    if summary["skipped"]:
+        lines.append(f"{len(summary['skipped'])} instances are up to date and would be skipped")
+    if summary["failed"]:
+        lines.append(f"{len(summary['failed'])} instances can't be applied")
+    if not lines:
+        lines.append("No instances are selected")
+    return "\n".join(lines)
+
+
+def write_plan(summary: dict, path: Path):
+    plan = {
+        "instances": summary["plan"],
+        "totals": plan_totals(summary["plan"]),
+        "skipped": summary["skipped"],
+        "failed": summary["failed"],
+    }
+    with path.open("w") as fp:
+        json.dump(plan, fp, indent=2)
+    logger.info(f"Wrote plan to {path}")
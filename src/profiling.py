@@ -0,0 +1,178 @@
+import contextlib
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("hierpcb")
+
+# Timing spans for a plugin run. Spans nest, carry attributes and item counts, and
+# are written out as a JSON trace. Everything is a no-op until start() is called,
+# so the calls can stay in the code paths:
+#
+#   with profiler.span("copyTraces", instance=uuidPath):
+#       ...
+#       profiler.count("tracks", len(template.tracks))
+
+TRACE_VERSION = 1
+
+# Returned by span() while disabled, nullcontext can be entered any number of times
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "counts", "children", "swigCalls")
+
+    def __init__(self, name: str, attrs: dict, start: float):
+        self.name = name
+        self.attrs = attrs
+        self.start = start
+        self.duration = 0.0
+        self.counts = {}
+        self.children = []
+        self.swigCalls = 0
+
+    def asdict(self, origin: float) -> dict:
+        entry = {
+            "name": self.name,
+            "start": self.start - origin,
+            "duration": self.duration,
+        }
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.counts:
+            entry["counts"] = self.counts
+        if self.swigCalls:
+            entry["swigCalls"] = self.swigCalls
+        if self.children:
+            entry["children"] = [child.asdict(origin) for child in self.children]
+        return entry
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._root: Optional[Span] = None
+        # Each thread nests its own spans, the prefetcher loads boards off the main thread
+        self._local = threading.local()
+        self._swigCalls = None
+
+    def start(self, countSwigCalls: bool = False):
+        """Start recording, optionally counting every call into the pcbnew module."""
+        self._root = Span("run", {}, time.perf_counter())
+        self._local = threading.local()
+        self.enabled = True
+
+        if countSwigCalls:
+            self._swigCalls = {}
+            sys.setprofile(self._profileCall)
+
+    def stop(self) -> Optional[dict]:
+        """Stop recording and return the trace."""
+        if not self.enabled:
+            return None
+
+        if self._swigCalls is not None:
+            sys.setprofile(None)
+
+        self.enabled = False
+        self._root.duration = time.perf_counter() - self._root.start
+        trace = {
+            "version": TRACE_VERSION,
+            "spans": self._root.asdict(self._root.start),
+        }
+        if self._swigCalls is not None:
+            trace["swigCalls"] = dict(
+                sorted(self._swigCalls.items(), key=lambda entry: entry[1], reverse=True)
+            )
+            self._swigCalls = None
+        return trace
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = [self._root]
+        return stack
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, attrs)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, attrs: dict):
+        stack = self._stack()
+        span = Span(name, attrs, time.perf_counter())
+        if threading.current_thread() is not threading.main_thread():
+            span.attrs["thread"] = threading.current_thread().name
+        stack[-1].children.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            stack.pop()
+
+    def count(self, name: str, amount: int = 1):
+        """Add to an item count of the innermost span."""
+        if not self.enabled:
+            return
+        counts = self._stack()[-1].counts
+        counts[name] = counts.get(name, 0) + amount
+
+    def _profileCall(self, frame, event, arg):
+        # SWIG's proxy classes are python functions in pcbnew.py wrapping _pcbnew
+        if event != "call" or not frame.f_code.co_filename.endswith("pcbnew.py"):
+            return
+        code = frame.f_code
+        name = getattr(code, "co_qualname", code.co_name)
+        self._swigCalls[name] = self._swigCalls.get(name, 0) + 1
+        self._stack()[-1].swigCalls += 1
+
+
+def summarize(trace: dict, limit: int = 10) -> str:
+    """A short text summary of a trace: total time and counts per span name, slowest first."""
+    totals = {}
+
+    def visit(span: dict, prefix: str):
+        path = f"{prefix}/{span['name']}" if prefix else span["name"]
+        total = totals.setdefault(path, {"duration": 0.0, "calls": 0, "counts": {}, "swigCalls": 0})
+        total["duration"] += span["duration"]
+        total["calls"] += 1
+        total["swigCalls"] += span.get("swigCalls", 0)
+        for name, amount in span.get("counts", {}).items():
+            total["counts"][name] = total["counts"].get(name, 0) + amount
+        for child in span.get("children", []):
+            visit(child, path)
+
+    visit(trace["spans"], "")
+
+    lines = [f"Run took {trace['spans']['duration']:.3f}s"]
+    for path, total in sorted(totals.items(), key=lambda entry: entry[1]["duration"], reverse=True):
+        if path == "run":
+            continue
+        line = f"  {path}: {total['duration']:.3f}s over {total['calls']} call(s)"
+        if total["counts"]:
+            line += ", " + ", ".join(f"{amount} {name}" for name, amount in total["counts"].items())
+        if total["swigCalls"]:
+            line += f", {total['swigCalls']} pcbnew calls"
+        lines.append(line)
+
+    if "swigCalls" in trace:
+        lines.append("Most called pcbnew functions:")
+        for name, calls in list(trace["swigCalls"].items())[:limit]:
+            lines.append(f"  {name}: {calls}")
+
+    return "\n".join(lines)
+
+
+def write_trace(trace: dict, path: Path):
+    with path.open("w") as fp:
+        json.dump(trace, fp, indent=2)
+    logger.info(f"Wrote trace to {path}")
+
+
+profiler = Profiler()
@@ -0,0 +1,22 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+# Runs cli.py without the package __init__, which loads wx and registers the action plugin:
+#   python <plugin folder>/projinst_cli.py path/to/root.kicad_pcb [options]
+# The plugin's modules are imported as PACKAGE instead, the same way benchmarks/bench.py does.
+
+PLUGIN_DIR = Path(__file__).resolve().parent
+PACKAGE = "projinst"
+
+# At import, worker processes started from here load this file again and need it too
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(PLUGIN_DIR)]
+    sys.modules[PACKAGE] = package
+
+
+if __name__ == "__main__":
+    cli = importlib.import_module(f"{PACKAGE}.cli")
+    sys.exit(cli.main())
@@ -0,0 +1,136 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from .simpleSchParser import sch_parse_text
+
+logger = logging.getLogger("hierpcb")
+
+# Bump this whenever the parser output changes, old caches are then thrown away
+CACHE_VERSION = 1
+
+# Files modified this close to the moment they were cached can't be trusted
+# by mtime alone (the filesystem timestamp may be too coarse), so they are hashed.
+RACY_WINDOW_NS = 2_000_000_000
+
+# When an entry was last used only matters for pruning, so it's only brought up to
+# date (and the cache written again) once it's this old
+USED_RESOLUTION_NS = 24 * 3600 * 1_000_000_000
+
+
+def _stat_key(stat: os.stat_result):
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _valid_entry(entry) -> bool:
+    """Whether an entry read from the cache file has every field, with the right types."""
+    if not isinstance(entry, dict):
+        return False
+    try:
+        return (
+            all(isinstance(entry[key], int) for key in ("mtime", "size", "cached", "used"))
+            and isinstance(entry["hash"], str)
+            and isinstance(entry["sheet"], dict)
+        )
+    except KeyError:
+        return False
+
+
+class SheetCache(contextlib.AbstractContextManager):
+    """Persistent cache of parsed schematics, keyed by file fingerprint."""
+
+    def __init__(self, path: Path, maxEntries: int = 512):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.entries = {}
+        self._dirty = False
+
+    def __enter__(self) -> "SheetCache":
+        try:
+            with self.path.open("r") as fp:
+                data = json.load(fp)
+            if data.get("version") != CACHE_VERSION:
+                logger.info(f"Cache {self.path} is from another version, ignoring it.")
+            else:
+                # Entries that aren't what parse() expects are dropped, the files are parsed again
+                self.entries = {
+                    key: entry for key, entry in data.get("entries", {}).items() if _valid_entry(entry)
+                }
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.warning(f"Cache {self.path} is corrupt, ignoring it: {e}")
+        return self
+
+    def __exit__(self, *args):
+        if self._dirty:
+            self.write()
+        return super().__exit__(*args)
+
+    def write(self):
+        self._prune()
+        tmpPath = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with tmpPath.open("w") as fp:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, fp)
+            os.replace(tmpPath, self.path)
+            self._dirty = False
+        except OSError as e:
+            # The cache is only an optimisation, never fail a run because of it
+            logger.warning(f"Unable to write cache {self.path}: {e}")
+
+    def _prune(self):
+        # Forget files that are gone, then the least recently used ones
+        for key in [k for k in self.entries if not Path(k).exists()]:
+            del self.entries[key]
+
+        if len(self.entries) > self.maxEntries:
+            byAge = sorted(self.entries, key=lambda k: self.entries[k]["used"])
+            for key in byAge[: len(self.entries) - self.maxEntries]:
+                del self.entries[key]
+
+    def parse(self, sheetPath: Path) -> dict:
+        """Return the parsed schematic, only parsing it if it changed since it was cached."""
+        key = str(sheetPath.resolve())
+        stat = sheetPath.stat()
+        entry = self.entries.get(key)
+        now = time.time_ns()
+
+        if entry and self._statMatches(entry, stat):
+            if now - entry["used"] >= USED_RESOLUTION_NS:
+                entry["used"] = now
+                self._dirty = True
+            return entry["sheet"]
+
+        content = sheetPath.read_bytes()
+        contentHash = hashlib.sha1(content).hexdigest()
+
+        if entry and entry["hash"] == contentHash:
+            logger.debug(f"Cache hit by content for {key}")
+            sheet = entry["sheet"]
+        else:
+            logger.debug(f"Cache miss for {key}")
+            sheet = sch_parse_text(content.decode("utf-8"))
+
+        self.entries[key] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": contentHash,
+            "cached": now,
+            "used": now,
+            "sheet": sheet,
+        }
+        self._dirty = True
+        return sheet
+
+    def _statMatches(self, entry: dict, stat: os.stat_result) -> bool:
+        if (entry["mtime"], entry["size"]) != _stat_key(stat):
+            return False
+        # Modified right around the time it was cached, make parse() check the content
+        if entry["cached"] - entry["mtime"] < RACY_WINDOW_NS:
+            return False
+        return True
@@ -0,0 +1,107 @@
+import re
+from typing import Iterator, Optional
+
+# A small, allocation-free scanner for KiCad's S-Expression files.
+# See: https://dev-docs.kicad.org/en/file-formats/sexpr-intro/
+#
+# Unlike a full parser this never builds the nested list for a file,
+# callers walk the tokens and skip() every subtree they don't care about.
+
+# Any single token: parens, a quoted string, or a bare atom
+_TOKEN_RE = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+', re.DOTALL)
+# Only the tokens that matter for depth tracking. Bare atoms are jumped over.
+_SKIP_RE = re.compile(r'[()]|"(?:[^"\\]|\\.)*"', re.DOTALL)
+_ESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+class SexpError(ValueError):
+    pass
+
+
+def atom_value(token: str) -> str:
+    """Strip the quotes and escapes from a string token, bare atoms are returned as is."""
+    if not token.startswith('"'):
+        return token
+    token = token[1:-1]
+    if "\\" not in token:
+        return token
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), token)
+
+
+class SexpScanner:
+    def __init__(self, text: str):
+        self._text = text
+        self._pos = 0
+
+    def next(self) -> Optional[str]:
+        """Return the next raw token, or None at the end of the text."""
+        match = _TOKEN_RE.search(self._text, self._pos)
+        if match is None:
+            return None
+        self._pos = match.end()
+        return match.group()
+
+    def atom(self) -> str:
+        """Read the next token, which must be an atom, and return its value."""
+        token = self.next()
+        if token is None or token in "()":
+            raise SexpError(f"Expected an atom at offset {self._pos}, got {token!r}")
+        return atom_value(token)
+
+    def open(self, keyword: Optional[str] = None) -> str:
+        """Consume '(' and the keyword that follows it."""
+        if self.next() != "(":
+            raise SexpError(f"Expected '(' at offset {self._pos}")
+        head = self.atom()
+        if keyword is not None and head != keyword:
+            raise SexpError(f"Expected ({keyword} ...), got ({head} ...)")
+        return head
+
+    def skip(self):
+        """Skip to the end of the list we are currently inside, including its ')'."""
+        depth = 1
+        text = self._text
+        pos = self._pos
+        search = _SKIP_RE.search
+        while depth:
+            match = search(text, pos)
+            if match is None:
+                raise SexpError("Unexpected end of file")
+            pos = match.end()
+            char = text[match.start()]
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+        self._pos = pos
+
+    def children(self) -> Iterator[str]:
+        """
+        Iterate over the child lists of the list we are currently inside,
+        yielding each child's keyword. The consumer must read the child up to
+        and including its ')' (usually through skip()) before asking for the next one.
+        Atoms directly inside the current list are ignored.
+        """
+        while True:
+            token = self.next()
+            if token is None:
+                raise SexpError("Unexpected end of file")
+            if token == ")":
+                return
+            if token == "(":
+                yield self.atom()
+
+    def values(self) -> list:
+        """Read the remaining atoms of the current list, skipping any child lists."""
+        found = []
+        while True:
+            token = self.next()
+            if token is None:
+                raise SexpError("Unexpected end of file")
+            if token == ")":
+                return found
+            if token == "(":
+                self.skip()
+                continue
+            found.append(atom_value(token))
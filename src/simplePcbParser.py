@@ -0,0 +1,108 @@
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from .sexpscan import SexpScanner
+
+# See: https://dev-docs.kicad.org/en/file-formats/sexpr-pcb/
+#
+# Reads what the dialog needs from a .kicad_pcb without going through pcbnew.LoadBoard.
+# Only the footprint headers are read, graphics, pads, tracks and zones are skipped.
+
+# "module" is what footprints were called before KiCad 6
+FOOTPRINT_KEYWORDS = ("footprint", "module")
+
+# The files are in mm, pcbnew works in nm
+IU_PER_MM = 1_000_000
+
+
+class PcbFootprint(NamedTuple):
+    reference: str
+    # KIID path as a string, the same as FOOTPRINT.GetPath().AsString()
+    path: str
+    # Position in internal units (nm)
+    x: int
+    y: int
+    orientation: float
+    # True if the footprint is on the back of the board
+    flipped: bool
+
+
+def mm_to_iu(value: str) -> int:
+    return int(round(float(value) * IU_PER_MM))
+
+
+def pcb_parse_footprint(scanner: SexpScanner) -> PcbFootprint:
+    reference = ""
+    path = ""
+    x = y = 0
+    orientation = 0.0
+    layer = "F.Cu"
+
+    for keyword in scanner.children():
+        match keyword:
+            case "layer":
+                layer = scanner.atom()
+                scanner.skip()
+
+            case "at":
+                values = scanner.values()
+                x = mm_to_iu(values[0])
+                y = mm_to_iu(values[1])
+                if len(values) > 2:
+                    orientation = float(values[2])
+
+            case "path":
+                path = scanner.atom()
+                scanner.skip()
+
+            # KiCad 8
+            case "property":
+                name = scanner.atom()
+                value = scanner.atom()
+                if name == "Reference":
+                    reference = value
+                scanner.skip()
+
+            # KiCad 7 and older
+            case "fp_text":
+                kind = scanner.atom()
+                value = scanner.atom()
+                if kind == "reference":
+                    reference = value
+                scanner.skip()
+
+            case _:
+                scanner.skip()
+
+    return PcbFootprint(reference, path, x, y, orientation, layer.startswith("B."))
+
+
+def pcb_parse_text(text: str, limit: Optional[int] = None) -> List[PcbFootprint]:
+    scanner = SexpScanner(text)
+    scanner.open("kicad_pcb")
+
+    footprints = []
+    for keyword in scanner.children():
+        if keyword not in FOOTPRINT_KEYWORDS:
+            scanner.skip()
+            continue
+
+        # The name of the footprint
+        scanner.atom()
+        footprints.append(pcb_parse_footprint(scanner))
+        if limit is not None and len(footprints) >= limit:
+            break
+
+    return footprints
+
+
+def pcb_read_footprints(boardFile: Path, limit: Optional[int] = None) -> List[PcbFootprint]:
+    """Return the footprints of a board in file order, stopping after `limit` of them."""
+
+    if not isinstance(boardFile, Path) :
+        raise ValueError("Path not given")
+    if not boardFile.exists():
+        raise FileNotFoundError("Path not found: " + str(boardFile))
+
+    with open(boardFile, encoding="utf-8") as file:
+        return pcb_parse_text(file.read(), limit)
@@ -1,36 +1,56 @@
-
 from pathlib import Path
-from .sexpdata import sexpdata
+
+from .sexpscan import SexpScanner
 
 # See: https://dev-docs.kicad.org/en/file-formats/sexpr-schematic/
-    
+#
+# Only the top level uuid and the sheet blocks are read. Everything else
+# (lib_symbols, symbols, wires, labels...) is skipped without being built.
 
-def sch_list_to_dict(propertyList):
 
-    buildingDict = {}
+def sch_parse_sheet(scanner: SexpScanner) -> dict:
+    sheetDict = {}
 
-    for x in propertyList:
+    for keyword in scanner.children():
+        match keyword:
+            case "property":
+                sheetDict.setdefault("property", {})
 
-        # the first item in each list is the keyword used for matching
-        match str(x.pop(0)):
-            case "sheet":
-                buildingDict.setdefault("sheet", [])
+                sheetPropertyName = scanner.atom()
+                sheetPropertyValue = scanner.atom()
+                # The rest is just placement/format data
+                scanner.skip()
+                sheetDict["property"][sheetPropertyName] = sheetPropertyValue
 
-                sheetDict = sch_list_to_dict(x)
-                buildingDict["sheet"].append(sheetDict)
+            case "uuid":
+                sheetDict["uuid"] = scanner.atom()
+                scanner.skip()
 
-            case "property":
-                buildingDict.setdefault("property", {})
+            # Add more types later
+            case _:
+                scanner.skip()
+
+    return sheetDict
+
+
+def sch_parse_text(text: str) -> dict:
+    scanner = SexpScanner(text)
+    scanner.open("kicad_sch")
+
+    buildingDict = {}
+
+    for keyword in scanner.children():
+        match keyword:
+            case "sheet":
+                buildingDict.setdefault("sheet", [])
+                buildingDict["sheet"].append(sch_parse_sheet(scanner))
 
-                sheetPropertyName = x.pop(0)
-                sheetPropertyValue = x.pop(0)
-                # otherData = sch_traverse(x) # Is just placement/format data
-                buildingDict["property"][sheetPropertyName] = sheetPropertyValue
-            
             case "uuid":
-                buildingDict["uuid"] = x[0]
-                
-            # Add more types later
+                buildingDict["uuid"] = scanner.atom()
+                scanner.skip()
+
+            case _:
+                scanner.skip()
 
     return buildingDict
 
@@ -42,7 +62,5 @@ def sch_parse_file(schematicFile: Path) -> dict:
     if not schematicFile.exists():
         raise FileNotFoundError("Path not found: " + str(schematicFile))
 
-    with open(schematicFile) as file:
-        parsedList = sexpdata.load(file)
-    parsedList.pop(0)
-    return sch_list_to_dict(parsedList)
\ No newline at end of file
+    with open(schematicFile, encoding="utf-8") as file:
+        return sch_parse_text(file.read())
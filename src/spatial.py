@@ -0,0 +1,73 @@
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Boxes are (left, top, right, bottom) in internal units
+Box = Tuple[int, int, int, int]
+
+# 5mm, around the size of a small footprint
+DEFAULT_CELL_SIZE = 5_000_000
+
+# Boxes covering more cells than this are kept aside and checked on every query,
+# a ground pour would otherwise be copied into thousands of cells
+MAX_CELLS_PER_BOX = 256
+
+
+def boxes_intersect(a: Box, b: Box) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GridIndex:
+    """Boxes bucketed on a uniform grid, to find the ones overlapping a box without checking them all."""
+
+    def __init__(self, cellSize: int = DEFAULT_CELL_SIZE):
+        self.cellSize = cellSize
+        self._boxes: List[Box] = []
+        self._values: List[Any] = []
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._oversized: List[int] = []
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def _cellRange(self, box: Box):
+        size = self.cellSize
+        return (
+            range(box[0] // size, box[2] // size + 1),
+            range(box[1] // size, box[3] // size + 1),
+        )
+
+    def insert(self, box: Box, value: Any):
+        entry = len(self._boxes)
+        self._boxes.append(box)
+        self._values.append(value)
+
+        columns, rows = self._cellRange(box)
+        if len(columns) * len(rows) > MAX_CELLS_PER_BOX:
+            self._oversized.append(entry)
+            return
+
+        for column in columns:
+            for row in rows:
+                self._cells.setdefault((column, row), []).append(entry)
+
+    def query(self, box: Box) -> Iterator[Any]:
+        """Every value whose box overlaps `box`, each once."""
+        seen = set()
+        columns, rows = self._cellRange(box)
+
+        candidates = []
+        if len(columns) * len(rows) > MAX_CELLS_PER_BOX:
+            # Cheaper to look at everything than at every cell
+            candidates = range(len(self._boxes))
+        else:
+            for column in columns:
+                for row in rows:
+                    candidates += self._cells.get((column, row), ())
+            candidates += self._oversized
+
+        boxes = self._boxes
+        for entry in candidates:
+            if entry in seen:
+                continue
+            seen.add(entry)
+            if boxes_intersect(boxes[entry], box):
+                yield self._values[entry]
@@ -0,0 +1,278 @@
+import logging
+from functools import cached_property
+from typing import NamedTuple, Optional, Tuple
+
+import pcbnew
+
+from .placeworker import TemplateGeometry
+from .placement import footprintInBounds, item_signature, pad_table
+from .spatial import Box, boxes_intersect
+from .transform import point_columns
+from .zonefill import item_box
+
+logger = logging.getLogger("hierpcb")
+
+# A ReplicationTemplate is everything applyBoard needs from a sub-board, read
+# through SWIG once per run and then shared by every instance of that sub-board.
+# All positions are relative to the source anchor footprint, all angles are in
+# degrees relative to the anchor's orientation.
+#
+# Tracks, drawings and zones can be limited to a region of the sub-board, so scratch
+# geometry parked away from the layout isn't copied into every instance. The region
+# is chosen per sheet file, see REGIONS and region_box.
+
+# Region name -> label in the dialog. A region can also be [left, top, right, bottom] in mm
+REGIONS = {
+    "all": "Whole board",
+    "outline": "Inside the board outline",
+    "footprints": "Around the footprints",
+}
+
+
+class TemplateField(NamedTuple):
+    name: str
+    dx: int
+    dy: int
+    angle: float
+
+
+class TemplateFootprint(NamedTuple):
+    # KIID path within the sub-project, the instance uuid path is prepended to find the target
+    path: str
+    dx: int
+    dy: int
+    orientation: float
+    flipped: bool
+    # Clearance, solder mask margin, solder paste margin, paste margin ratio, zone connection
+    localSettings: tuple
+    fields: Tuple[TemplateField, ...]
+    # (pad number, net codes of the pads with that number in pad order) for each pad number
+    padNets: Tuple[Tuple[str, Tuple[int, ...]], ...]
+
+
+# Tracks, drawings and zones are copied with Duplicate(), so their entries keep the source
+# item and can't outlive the sub-board (see SheetFile.releaseBoard). Everything else about
+# them is read once when the template is compiled: their KIID, signature and bounding box
+# relative to the anchor (left, top, right, bottom).
+
+
+class TemplateTrack(NamedTuple):
+    item: pcbnew.PCB_TRACK
+    startDx: int
+    startDy: int
+    endDx: int
+    endDy: int
+    netCode: int
+    isVia: bool
+    kiid: str
+    signature: str
+    box: Box
+
+
+class TemplateDrawing(NamedTuple):
+    item: pcbnew.BOARD_ITEM
+    dx: int
+    dy: int
+    kiid: str
+    signature: str
+    box: Box
+
+
+class TemplateZone(NamedTuple):
+    item: pcbnew.ZONE
+    dx: int
+    dy: int
+    netCode: int
+    kiid: str
+    signature: str
+    box: Box
+
+
+def region_box(board: pcbnew.BOARD, region) -> Optional[Box]:
+    """The box items have to overlap to be copied, None to copy everything."""
+    if region == "outline":
+        bbox = board.GetBoardEdgesBoundingBox()
+        if bbox.GetWidth() == 0 or bbox.GetHeight() == 0:
+            logger.warning("The sub-board has no outline, copying everything")
+            return None
+        left, top = bbox.GetX(), bbox.GetY()
+        return left, top, left + bbox.GetWidth(), top + bbox.GetHeight()
+
+    if region == "footprints":
+        boxes = [item_box(fp) for fp in board.GetFootprints() if footprintInBounds(fp)]
+        if not boxes:
+            return None
+        return (
+            min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes),
+        )
+
+    if isinstance(region, (list, tuple)) and len(region) == 4:
+        left, top, right, bottom = (pcbnew.FromMM(value) for value in region)
+        return min(left, right), min(top, bottom), max(left, right), max(top, bottom)
+
+    if region not in (None, "all"):
+        logger.warning(f"Unknown replication region {region!r}, copying everything")
+    return None
+
+
+class ReplicationTemplate:
+    def __init__(
+        self,
+        sourceBoard: pcbnew.BOARD,
+        anchorFootprint: pcbnew.FOOTPRINT,
+        region: Optional[Box] = None
+    ):
+        self.sourceBoard = sourceBoard
+        self.anchorFootprint = anchorFootprint
+        self.region = region
+        # Items left out for being outside the region
+        self.culled = 0
+
+        anchorPos = anchorFootprint.GetPosition()
+        self._anchorX: int = anchorPos.x
+        self._anchorY: int = anchorPos.y
+        self._anchorAngle: float = anchorFootprint.GetOrientationDegrees()
+
+        self.footprints: Tuple[TemplateFootprint, ...] = tuple(
+            self._compileFootprint(fp)
+            for fp in sourceBoard.GetFootprints()
+            if footprintInBounds(fp)
+        )
+        self.tracks: Tuple[TemplateTrack, ...] = tuple(
+            self._compileTrack(track) for track in self._inRegion(sourceBoard.Tracks())
+        )
+        self.drawings: Tuple[TemplateDrawing, ...] = tuple(
+            TemplateDrawing(drawing, *self._delta(drawing.GetPosition()), *self._itemData(drawing))
+            for drawing in self._inRegion(sourceBoard.GetDrawings())
+        )
+        self.zones: Tuple[TemplateZone, ...] = tuple(
+            TemplateZone(zone, *self._delta(zone.GetPosition()), zone.GetNetCode(), *self._itemData(zone))
+            for zone in self._inRegion(sourceBoard.Zones())
+        )
+
+        # Coordinate columns for PositionTransform.translate_many
+        self.footprintPoints = point_columns((fp.dx, fp.dy) for fp in self.footprints)
+        self.trackStarts = point_columns((t.startDx, t.startDy) for t in self.tracks)
+        self.trackEnds = point_columns((t.endDx, t.endDy) for t in self.tracks)
+        self.drawingPoints = point_columns((d.dx, d.dy) for d in self.drawings)
+        self.zonePoints = point_columns((z.dx, z.dy) for z in self.zones)
+
+        logger.info(
+            f"Compiled template: {len(self.footprints)} footprints, {len(self.tracks)} tracks, "
+            f"{len(self.drawings)} drawings, {len(self.zones)} zones, {self.culled} outside the region"
+        )
+
+    @property
+    def sourceAnchor(self) -> Tuple[int, int, float]:
+        """Where the anchor is on the sub-board, as (x, y, degrees)."""
+        return self._anchorX, self._anchorY, self._anchorAngle
+
+    @property
+    def geometry(self) -> TemplateGeometry:
+        """The coordinate columns on their own, to be placed in worker processes."""
+        return TemplateGeometry(
+            self.footprintPoints, self.trackStarts, self.trackEnds, self.drawingPoints, self.zonePoints
+        )
+
+    @cached_property
+    def itemKeys(self):
+        """(KIID, signature) of every track, drawing and zone, for incremental syncs."""
+        def keys(entries):
+            return tuple((entry.kiid, entry.signature) for entry in entries)
+
+        return keys(self.tracks), keys(self.drawings), keys(self.zones)
+
+    @cached_property
+    def itemBoxes(self):
+        """Bounding boxes relative to the anchor of every track, drawing and zone."""
+        def boxes(entries):
+            return tuple(entry.box for entry in entries)
+
+        return boxes(self.tracks), boxes(self.drawings), boxes(self.zones)
+
+    @classmethod
+    def fromBoard(
+        cls,
+        sourceBoard: pcbnew.BOARD,
+        anchorRef: Optional[str],
+        region=None
+    ) -> Optional["ReplicationTemplate"]:
+        """
+        Build the template around the footprint `anchorRef`, or the first footprint.
+        `region` is one of REGIONS or a rectangle in mm, see region_box.
+        """
+        footprints = list(sourceBoard.GetFootprints())
+        if not footprints:
+            return None
+
+        box = region_box(sourceBoard, region)
+        for footprint in footprints:
+            if footprint.GetReferenceAsString() == anchorRef:
+                return cls(sourceBoard, footprint, box)
+
+        logger.warning(f"Anchor {anchorRef} not found, using {footprints[0].GetReferenceAsString()}")
+        return cls(sourceBoard, footprints[0], box)
+
+    def _inRegion(self, items) -> list:
+        """The items whose bounding box overlaps the region, all of them without one."""
+        items = list(items)
+        if self.region is None:
+            return items
+
+        kept = [item for item in items if boxes_intersect(item_box(item), self.region)]
+        self.culled += len(items) - len(kept)
+        return kept
+
+    def _delta(self, pos: pcbnew.VECTOR2I) -> Tuple[int, int]:
+        return pos.x - self._anchorX, pos.y - self._anchorY
+
+    def _itemData(self, item: pcbnew.BOARD_ITEM) -> Tuple[str, str, Box]:
+        """KIID, signature and bounding box relative to the anchor of a track, drawing or zone."""
+        bbox = item.GetBoundingBox()
+        left, top = self._delta(bbox.GetOrigin())
+        box = (left, top, left + bbox.GetWidth(), top + bbox.GetHeight())
+        return item.m_Uuid.AsString(), item_signature(item), box
+
+    def _angle(self, degrees: float) -> float:
+        return degrees - self._anchorAngle
+
+    def _compileFootprint(self, footprint: pcbnew.FOOTPRINT) -> TemplateFootprint:
+        fields = tuple(
+            TemplateField(
+                field.GetName(),
+                *self._delta(field.GetPosition()),
+                self._angle(field.GetTextAngle().AsDegrees()),
+            )
+            for field in footprint.GetFields()
+        )
+
+        # The list of properties is from the ReplicateLayout plugin. Thanks @MitjaNemec!
+        localSettings = (
+            footprint.GetLocalClearance(),
+            footprint.GetLocalSolderMaskMargin(),
+            footprint.GetLocalSolderPasteMargin(),
+            footprint.GetLocalSolderPasteMarginRatio(),
+            footprint.GetLocalZoneConnection(),
+        )
+
+        return TemplateFootprint(
+            footprint.GetPath().AsString(),
+            *self._delta(footprint.GetPosition()),
+            self._angle(footprint.GetOrientationDegrees()),
+            footprint.IsFlipped(),
+            localSettings,
+            fields,
+            tuple((number, tuple(codes)) for number, codes in pad_table(footprint).items()),
+        )
+
+    def _compileTrack(self, track: pcbnew.PCB_TRACK) -> TemplateTrack:
+        # Via's ignore the end point, just copying anyways
+        return TemplateTrack(
+            track,
+            *self._delta(track.GetStart()),
+            *self._delta(track.GetEnd()),
+            track.GetNetCode(),
+            track.Type() == pcbnew.PCB_VIA_T,
+            *self._itemData(track),
+        )
@@ -0,0 +1,112 @@
+import math
+from typing import Iterable, Sequence, Tuple
+
+# NumPy is optional, KiCad doesn't ship it on every platform
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Below this many points the overhead of going through NumPy isn't worth it
+NUMPY_MIN_POINTS = 64
+
+
+def point_columns(points: Iterable[Tuple[int, int]]):
+    """Split (x, y) pairs into an x and a y column, as NumPy arrays when available."""
+    xs, ys = [], []
+    for x, y in points:
+        xs.append(x)
+        ys.append(y)
+
+    if numpy is not None and len(xs) >= NUMPY_MIN_POINTS:
+        return numpy.array(xs, dtype=numpy.int64), numpy.array(ys, dtype=numpy.int64)
+    return xs, ys
+
+
+class RigidTransform:
+    """
+    A rotation about the origin followed by an offset, on integer coordinates.
+    Has no pcbnew dependency so it can be pickled and used anywhere.
+    """
+
+    def __init__(self, rotation: float, offsetX: int, offsetY: int):
+        self.rotation = rotation % 360
+        self.offsetX = offsetX
+        self.offsetY = offsetY
+
+        # Right angles are done with exact integer arithmetic
+        quarter = round(self.rotation / 90)
+        if abs(self.rotation - quarter * 90) < 1e-9:
+            self._quarter = quarter % 4
+        else:
+            self._quarter = None
+
+        radians = math.radians(self.rotation)
+        self._sin = math.sin(radians)
+        self._cos = math.cos(radians)
+
+    def __reduce__(self):
+        return (RigidTransform, (self.rotation, self.offsetX, self.offsetY))
+
+    def point(self, dx: int, dy: int) -> Tuple[int, int]:
+        ox = self.offsetX
+        oy = self.offsetY
+        match self._quarter:
+            case 0:
+                return dx + ox, dy + oy
+            case 1:
+                return dy + ox, oy - dx
+            case 2:
+                return ox - dx, oy - dy
+            case 3:
+                return ox - dy, dx + oy
+
+        return (
+            int(dy * self._sin + dx * self._cos + ox),
+            int(dy * self._cos - dx * self._sin + oy),
+        )
+
+    def points(self, xs: Sequence[int], ys: Sequence[int]) -> Tuple[list, list]:
+        """Transform columns of coordinates, returns lists of python ints."""
+        if numpy is not None and len(xs) >= NUMPY_MIN_POINTS:
+            return self._pointsNumpy(xs, ys)
+
+        ox = self.offsetX
+        oy = self.offsetY
+        match self._quarter:
+            case 0:
+                return [x + ox for x in xs], [y + oy for y in ys]
+            case 1:
+                return [y + ox for y in ys], [oy - x for x in xs]
+            case 2:
+                return [ox - x for x in xs], [oy - y for y in ys]
+            case 3:
+                return [ox - y for y in ys], [x + oy for x in xs]
+
+        sin = self._sin
+        cos = self._cos
+        return (
+            [int(y * sin + x * cos + ox) for x, y in zip(xs, ys)],
+            [int(y * cos - x * sin + oy) for x, y in zip(xs, ys)],
+        )
+
+    def _pointsNumpy(self, xs, ys) -> Tuple[list, list]:
+        xs = numpy.asarray(xs, dtype=numpy.int64)
+        ys = numpy.asarray(ys, dtype=numpy.int64)
+        ox = self.offsetX
+        oy = self.offsetY
+        match self._quarter:
+            case 0:
+                newXs, newYs = xs + ox, ys + oy
+            case 1:
+                newXs, newYs = ys + ox, oy - xs
+            case 2:
+                newXs, newYs = ox - xs, oy - ys
+            case 3:
+                newXs, newYs = ox - ys, xs + oy
+            case _:
+                newXs = numpy.trunc(ys * self._sin + xs * self._cos + ox).astype(numpy.int64)
+                newYs = numpy.trunc(ys * self._cos - xs * self._sin + oy).astype(numpy.int64)
+
+        # pcbnew wants python ints, not numpy scalars
+        return newXs.tolist(), newYs.tolist()
@@ -0,0 +1,54 @@
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("hierpcb")
+
+# Keeps a root board in sync with its sub-projects while they're being edited.
+# The schematics and boards of every known sheet file are polled with a stat, and
+# a file has to stay the same for a while before it's acted on, KiCad writes a
+# board in more than one go. Only the instances of the sheet files that changed
+# are applied again, see hdata.reapply_changed. Doesn't need pcbnew.
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 1.0
+
+
+class SheetWatcher:
+    def __init__(self, manager: "SheetFileManager", debounce: float = DEFAULT_DEBOUNCE):
+        self.manager = manager
+        self.debounce = debounce
+        # Sheet path -> (file stats last seen, when they were first seen)
+        self._pending: Dict[Path, Tuple[tuple, float]] = {}
+        # Sheet path -> file stats already reported, for sheets that are no longer part
+        # of the hierarchy and so never get read again
+        self._reported: Dict[Path, tuple] = {}
+
+    def poll(self, now: Optional[float] = None) -> List[Path]:
+        """The sheet files whose schematic or board changed, and then didn't for `debounce` seconds."""
+        if now is None:
+            now = time.monotonic()
+
+        settled = []
+        for sheetPath, sheetFile in list(self.manager.sheetDict.items()):
+            if not sheetFile.isStale():
+                self._pending.pop(sheetPath, None)
+                self._reported.pop(sheetPath, None)
+                continue
+            stats = sheetFile.fileStats()
+            if stats == self._reported.get(sheetPath):
+                continue
+
+            seen = self._pending.get(sheetPath)
+            if seen is None or seen[0] != stats:
+                # Still being written, wait for it to settle
+                self._pending[sheetPath] = (stats, now)
+                continue
+
+            if now - seen[1] >= self.debounce:
+                del self._pending[sheetPath]
+                self._reported[sheetPath] = stats
+                settled.append(sheetPath)
+
+        return settled
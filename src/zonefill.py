@@ -0,0 +1,96 @@
+import logging
+from typing import Dict, List, Tuple
+
+import pcbnew
+
+from .profiling import profiler
+from .spatial import Box, GridIndex
+
+logger = logging.getLogger("hierpcb")
+
+# A copied zone keeps the source zone's fill, moved and rotated along with its outline.
+# That fill is only right if the copper around the copy matches the copper around the
+# source, which holds as long as nothing from outside the instance reaches into the zone.
+# Copies are trusted by default and only the ones with foreign copper nearby are refilled.
+
+
+def item_box(item: pcbnew.BOARD_ITEM) -> Box:
+    bbox = item.GetBoundingBox()
+    left = bbox.GetX()
+    top = bbox.GetY()
+    return left, top, left + bbox.GetWidth(), top + bbox.GetHeight()
+
+
+def copper_layers(zone: pcbnew.ZONE) -> List[int]:
+    return [layer for layer in zone.GetLayerSet().Seq() if pcbnew.IsCopperLayer(layer)]
+
+
+def keep_zone_fill(zone: pcbnew.ZONE) -> bool:
+    """Mark the fill a zone was copied with as up to date. Returns false if it has none."""
+    if zone.GetIsRuleArea() or not zone.IsFilled():
+        return False
+
+    # The fill hash is what DRC uses to tell that a zone needs refilling
+    for layer in copper_layers(zone):
+        zone.BuildHashValue(layer)
+    zone.SetNeedRefill(False)
+    return True
+
+
+def copper_index(board: pcbnew.BOARD) -> GridIndex:
+    """Tracks, pads and zones of the board by bounding box, with the KIID of what owns them."""
+    index = GridIndex()
+
+    for track in board.Tracks():
+        index.insert(item_box(track), (track.m_Uuid.AsString(), track))
+
+    for footprint in board.GetFootprints():
+        owner = footprint.m_Uuid.AsString()
+        for pad in footprint.Pads():
+            index.insert(item_box(pad), (owner, pad))
+
+    for zone in board.Zones():
+        if not zone.GetIsRuleArea():
+            index.insert(item_box(zone), (zone.m_Uuid.AsString(), zone))
+
+    return index
+
+
+def has_foreign_copper(index: GridIndex, zone: pcbnew.ZONE, ownItems: Dict[str, pcbnew.BOARD_ITEM]) -> bool:
+    """True if copper that isn't part of the zone's instance overlaps the zone's layers and box."""
+    zoneKiid = zone.m_Uuid.AsString()
+    layers = copper_layers(zone)
+
+    for owner, item in index.query(item_box(zone)):
+        if owner == zoneKiid or owner in ownItems:
+            continue
+        if any(item.IsOnLayer(layer) for layer in layers):
+            return True
+    return False
+
+
+def refill_stale_zones(board: pcbnew.BOARD, pendingZones: List[Tuple[pcbnew.ZONE, dict]]) -> int:
+    """
+    Refill the copied zones whose surroundings differ from their source's.
+    `pendingZones` is (zone, members of its instance's group by KIID). Returns how many were refilled.
+    """
+    with profiler.span("zoneCheck"):
+        index = copper_index(board)
+        stale = [
+            zone for zone, ownItems in pendingZones if has_foreign_copper(index, zone, ownItems)
+        ]
+        profiler.count("zones", len(pendingZones))
+
+    logger.info(f"Reused {len(pendingZones) - len(stale)} zone fills, refilling {len(stale)}")
+    if not stale:
+        return 0
+
+    with profiler.span("zoneFill"):
+        # Fill takes the same container type Zones() returns
+        zones = type(board.Zones())()
+        for zone in stale:
+            zones.append(zone)
+        pcbnew.ZONE_FILLER(board).Fill(zones)
+        profiler.count("zones", len(stale))
+
+    return len(stale)
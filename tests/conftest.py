@@ -0,0 +1,17 @@
+import sys
+import types
+from pathlib import Path
+
+# The plugin's modules are loaded as PACKAGE without running its __init__, the same way
+# benchmarks/bench.py does. Only the modules that don't need pcbnew are tested here.
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+PLUGIN_DIR = REPO_DIR / "src"
+EXAMPLES_DIR = REPO_DIR / "examples"
+DATA_DIR = Path(__file__).resolve().parent / "data"
+PACKAGE = "projinst"
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(PLUGIN_DIR)]
+    sys.modules[PACKAGE] = package
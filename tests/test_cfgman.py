@@ -0,0 +1,76 @@
+import json
+import os
+import stat
+
+from projinst.cfgman import ConfigMan
+
+
+def test_get_set_clear(tmp_path):
+    with ConfigMan(tmp_path / "a.json") as cfg:
+        assert cfg.get("applied", "/a", default=1) == 1
+        cfg.set("applied", "/a", value={"boardHash": "x"})
+        assert cfg.get("applied", "/a") == {"boardHash": "x"}
+        cfg.clear("applied", "/a")
+        cfg.clear("applied", "/missing")
+        cfg.clear("missing", "/a")
+        assert cfg.get("applied", "/a") is None
+
+
+def test_unchanged_config_is_not_written(tmp_path):
+    path = tmp_path / "a.json"
+    path.write_text(json.dumps({"enabled": {"/a": True}}))
+    before = path.stat().st_mtime_ns
+
+    with ConfigMan(path) as cfg:
+        # Setting what's already there isn't a change
+        cfg.set("enabled", "/a", value=True)
+        assert not cfg.dirty
+    assert path.stat().st_mtime_ns == before
+
+    with ConfigMan(tmp_path / "missing.json"):
+        pass
+    assert not (tmp_path / "missing.json").exists()
+
+
+def test_written_when_changed(tmp_path):
+    path = tmp_path / "a.json"
+    with ConfigMan(path) as cfg:
+        cfg.set("enabled", "/a", value=False)
+        assert cfg.dirty == {("enabled", "/a")}
+
+    assert json.loads(path.read_text()) == {"enabled": {"/a": False}}
+    assert "\n" in path.read_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["a.json"]
+
+
+def test_compact(tmp_path):
+    path = tmp_path / "a.json"
+    with ConfigMan(path) as cfg:
+        cfg.set("settings", "compactConfig", value=True)
+    assert path.read_text() == '{"settings":{"compactConfig":true}}'
+
+    with ConfigMan(path, compact=False) as cfg:
+        cfg.set("enabled", "/a", value=True)
+    assert "\n" in path.read_text()
+
+
+def test_write_keeps_permissions(tmp_path):
+    path = tmp_path / "a.json"
+    path.write_text("{}")
+    os.chmod(path, 0o640)
+
+    with ConfigMan(path) as cfg:
+        cfg.set("enabled", "/a", value=True)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
+def test_read_drops_changes(tmp_path):
+    path = tmp_path / "a.json"
+    path.write_text(json.dumps({"enabled": {"/a": True}}))
+
+    with ConfigMan(path) as cfg:
+        cfg.set("enabled", "/a", value=False)
+        cfg.read()
+        assert cfg.get("enabled", "/a") is True
+        assert not cfg.dirty
+    assert json.loads(path.read_text()) == {"enabled": {"/a": True}}
@@ -0,0 +1,52 @@
+import pytest
+
+from projinst import geometry
+from projinst.placeworker import InstanceGeometry, TemplateGeometry, init_worker, place, place_in_worker
+from projinst.transform import RigidTransform
+
+
+def template():
+    def columns(*points):
+        return [x for x, _ in points], [y for _, y in points]
+
+    return TemplateGeometry(
+        columns((0, 0), (10, 0)), columns((1, 1)), columns((2, 2)), columns(), columns((5, -5), (6, -6)),
+    )
+
+
+def test_place():
+    placed = place(template(), RigidTransform(90, 100, 200))
+    assert isinstance(placed, InstanceGeometry)
+    assert placed.footprints == ([100, 100], [200, 190])
+    assert placed.drawings == ([], [])
+    assert placed.zones == ([95, 94], [195, 194])
+
+
+def test_worker_side_matches_place():
+    rigid = RigidTransform(180, -5, 5)
+    init_worker(template())
+    assert place_in_worker(rigid) == place(template(), rigid)
+
+
+def test_small_jobs_stay_serial(monkeypatch):
+    def fail(*args):
+        raise AssertionError("workers started for a small job")
+
+    monkeypatch.setattr(geometry, "_place_parallel", fail)
+    rigids = [RigidTransform(90 * i, i, 0) for i in range(4)]
+    assert geometry.point_count(template()) == 6
+    assert geometry.place_many(template(), rigids, workers=4) == [place(template(), r) for r in rigids]
+
+
+def test_workers_leave_the_executable_alone(monkeypatch):
+    import multiprocessing.spawn
+
+    def broken(*args, **kwargs):
+        raise OSError("no workers")
+
+    monkeypatch.setattr(geometry, "python_executable", lambda: "/elsewhere/python")
+    monkeypatch.setattr(geometry, "ProcessPoolExecutor", broken)
+    previous = multiprocessing.spawn.get_executable()
+    with pytest.raises(OSError):
+        geometry._place_parallel(template(), [RigidTransform(0, 0, 0)], 2)
+    assert multiprocessing.spawn.get_executable() == previous
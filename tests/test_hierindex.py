@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from projinst.hierindex import HierarchyIndex
+
+
+def instance(name, uuidPath, hasBoard=False, children=()):
+    """Just what HierarchyIndex reads of a SheetInstance."""
+    return SimpleNamespace(
+        name=name, _uuidPath=uuidPath, _subSheets=list(children),
+        sheetFile=SimpleNamespace(hasBoard=hasBoard), _index=None,
+    )
+
+
+def hierarchy():
+    a1 = instance("A1", "/a/1", hasBoard=True)
+    a2 = instance("A2", "/a/2", hasBoard=True)
+    a = instance("A", "/a", children=[a1, a2])
+    b = instance("B", "/b", hasBoard=True)
+    c = instance("C", "/c")
+    d = instance("D", "/d", children=[instance("D1", "/d/1")])
+    root = instance("Root", "", children=[a, b, c, d])
+    return root
+
+
+def names(instances):
+    return [leaf.name for leaf in instances]
+
+
+def test_leaf_slices():
+    root = hierarchy()
+    index = HierarchyIndex()
+    index.add(root)
+
+    assert names(index.leafList) == ["A1", "A2", "B"]
+    assert names(index.leavesBelow("")) == ["A1", "A2", "B"]
+    assert names(index.leavesBelow("/a")) == ["A1", "A2"]
+    assert names(index.leavesBelow("/a/2")) == ["A2"]
+    assert names(index.leavesBelow("/b")) == ["B"]
+    assert index.leavesBelow("/c") == []
+    assert index.leavesBelow("/d") == []
+
+
+def test_boards_parents_and_names():
+    root = hierarchy()
+    index = HierarchyIndex()
+    index.add(root)
+
+    assert index.hasValidBoard == {
+        "": True, "/a": True, "/a/1": True, "/a/2": True, "/b": True,
+        "/c": False, "/d": False, "/d/1": False,
+    }
+    assert index.parent("/a/1").name == "A"
+    assert index.parent("/a").name == "Root"
+    assert index.parent("") is None
+    assert index.get("/d/1").name == "D1"
+    assert index.get("/missing") is None
+    assert index.names("/a/2") == ["A", "A2"]
+    assert index.names("") == []
+    assert all(node._index is index for node in index.nodes.values())
+
+
+def test_built_as_sub_sheets_arrive():
+    """The way RootInstance builds it: open the root, add each sub-sheet, then close."""
+    root = hierarchy()
+    index = HierarchyIndex()
+    index.open(root)
+
+    a = root._subSheets[0]
+    index.add(a, "")
+    # The root isn't closed yet, it has the leaves found so far
+    assert names(index.leavesBelow("")) == ["A1", "A2"]
+
+    for child in root._subSheets[1:]:
+        index.add(child, "")
+    index.close(root)
+
+    assert names(index.leavesBelow("")) == ["A1", "A2", "B"]
+    assert index.parent("/b") is root
+    assert index.hasValidBoard[""]
+
+
+def test_deep_hierarchy_without_recursion():
+    leaf = instance("Leaf", "/x" * 3000, hasBoard=True)
+    node = leaf
+    for depth in range(2999, 0, -1):
+        node = instance(f"N{depth}", "/x" * depth, children=[node])
+
+    index = HierarchyIndex()
+    index.add(node)
+    assert index.leavesBelow("/x") == [leaf]
+    assert len(index.names(leaf._uuidPath)) == 2999
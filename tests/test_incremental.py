@@ -0,0 +1,84 @@
+from projinst.incremental import CopyMatcher, box_digest, instance_pose
+from projinst.transform import RigidTransform
+
+# (source KIID, source signature) of each template item, and the box of its copy
+KEYS = [("s1", "sig1"), ("s2", "sig2"), ("s3", "sig3")]
+NET_CODES = [1, 2, None]
+NET_NAMES = {1: "GND", 2: "VCC"}
+RIGID = RigidTransform(90, 1_000_000, 2_000_000)
+ANCHOR = (5_000_000, 5_000_000, 0.0)
+
+
+def sync(previous, pose, boxes):
+    """One incremental run: returns the stale indices and the mapping for the next run."""
+    def targetDigest(targetKiid, signature):
+        box = boxes.get(targetKiid)
+        return None if box is None else box_digest(signature, box)
+
+    matcher = CopyMatcher(pose, NET_NAMES, previous, targetDigest)
+    stale = matcher.stale(KEYS, NET_CODES)
+    mapping = dict(matcher.mapping)
+    # What sync_volatile_items records for every recreated copy
+    for index, signature in stale:
+        targetKiid = f"t{index}-{len(boxes)}"
+        boxes[targetKiid] = [index, 0, 10, 10]
+        mapping[KEYS[index][0]] = [targetKiid, box_digest(signature, boxes[targetKiid])]
+    return [index for index, _ in stale], mapping, matcher.kept
+
+
+def test_unchanged_copies_are_kept():
+    boxes = {}
+    pose = instance_pose(RIGID, ANCHOR)
+    stale, mapping, _ = sync({}, pose, boxes)
+    assert stale == [0, 1, 2]
+
+    stale, again, kept = sync(mapping, pose, boxes)
+    assert stale == []
+    assert again == mapping
+    assert kept == {entry[0] for entry in mapping.values()}
+
+
+def test_moving_the_source_anchor_recreates_every_copy():
+    """Nothing but the anchor moved on the sub-board, so every item's signature is the same."""
+    boxes = {}
+    _, mapping, _ = sync({}, instance_pose(RIGID, ANCHOR), boxes)
+
+    movedAnchor = (ANCHOR[0] + 1_000_000, ANCHOR[1], ANCHOR[2])
+    stale, _, kept = sync(mapping, instance_pose(RIGID, movedAnchor), boxes)
+    assert stale == [0, 1, 2]
+    assert kept == set()
+
+    rotatedAnchor = (ANCHOR[0], ANCHOR[1], 90.0)
+    stale, _, _ = sync(mapping, instance_pose(RIGID, rotatedAnchor), boxes)
+    assert stale == [0, 1, 2]
+
+
+def test_moved_instance_net_change_and_hand_edits():
+    boxes = {}
+    pose = instance_pose(RIGID, ANCHOR)
+    _, mapping, _ = sync({}, pose, boxes)
+
+    # The instance's anchor moved on the board
+    stale, _, _ = sync(mapping, instance_pose(RigidTransform(90, 0, 0), ANCHOR), dict(boxes))
+    assert stale == [0, 1, 2]
+
+    # A net was renamed, only the copy on it goes
+    NET_NAMES[1] = "GND2"
+    try:
+        stale, _, _ = sync(mapping, pose, dict(boxes))
+    finally:
+        NET_NAMES[1] = "GND"
+    assert stale == [0]
+
+    # A copy was moved by hand, and another one deleted
+    edited = dict(boxes)
+    edited[mapping["s2"][0]] = [99, 99, 10, 10]
+    del edited[mapping["s3"][0]]
+    stale, _, _ = sync(mapping, pose, edited)
+    assert stale == [1, 2]
+
+
+def test_old_mapping_entries_are_recreated():
+    previous = {"s1": ["t0", "0" * 40, [0, 0, 10, 10]]}
+    stale, _, _ = sync(previous, instance_pose(RIGID, ANCHOR), {"t0": [0, 0, 10, 10]})
+    assert stale == [0, 1, 2]
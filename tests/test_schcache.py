@@ -0,0 +1,121 @@
+import json
+import os
+import time
+
+from projinst.schcache import RACY_WINDOW_NS, USED_RESOLUTION_NS, SheetCache
+
+SHEET = '(kicad_sch (uuid "root") (sheet (property "Sheetname" "A") (property "Sheetfile" "a.kicad_sch") (uuid "a")))'
+PARSED = {"uuid": "root", "sheet": [{"property": {"Sheetname": "A", "Sheetfile": "a.kicad_sch"}, "uuid": "a"}]}
+
+
+def write_sheet(path, text=SHEET):
+    path.write_text(text, encoding="utf-8")
+    # Old enough not to be in the racy window, so a stat is trusted
+    old = time.time_ns() - 10 * RACY_WINDOW_NS
+    os.utime(path, ns=(old, old))
+
+
+def test_miss_then_hit(tmp_path):
+    sheet = tmp_path / "root.kicad_sch"
+    cachePath = tmp_path / "cache.json"
+    write_sheet(sheet)
+
+    with SheetCache(cachePath) as cache:
+        assert cache.parse(sheet) == PARSED
+        assert cache._dirty
+    written = cachePath.stat().st_mtime_ns
+
+    # A hit on a recently used entry doesn't write the cache again
+    with SheetCache(cachePath) as cache:
+        assert cache.parse(sheet) == PARSED
+        assert not cache._dirty
+    assert cachePath.stat().st_mtime_ns == written
+
+
+def test_old_use_is_refreshed(tmp_path):
+    sheet = tmp_path / "root.kicad_sch"
+    cachePath = tmp_path / "cache.json"
+    write_sheet(sheet)
+    with SheetCache(cachePath) as cache:
+        cache.parse(sheet)
+
+    data = json.loads(cachePath.read_text())
+    entry = next(iter(data["entries"].values()))
+    entry["used"] -= 2 * USED_RESOLUTION_NS
+    cachePath.write_text(json.dumps(data))
+
+    with SheetCache(cachePath) as cache:
+        cache.parse(sheet)
+        assert cache._dirty
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    sheet = tmp_path / "root.kicad_sch"
+    cachePath = tmp_path / "cache.json"
+    write_sheet(sheet)
+    with SheetCache(cachePath) as cache:
+        cache.parse(sheet)
+
+    write_sheet(sheet, SHEET.replace('"root"', '"changed"'))
+    with SheetCache(cachePath) as cache:
+        assert cache.parse(sheet)["uuid"] == "changed"
+        assert cache._dirty
+
+
+def test_bad_entries_are_misses(tmp_path):
+    sheet = tmp_path / "root.kicad_sch"
+    other = tmp_path / "other.kicad_sch"
+    cachePath = tmp_path / "cache.json"
+    write_sheet(sheet)
+    write_sheet(other)
+    with SheetCache(cachePath) as cache:
+        cache.parse(sheet)
+        cache.parse(other)
+
+    data = json.loads(cachePath.read_text())
+    entries = list(data["entries"].values())
+    del entries[0]["hash"]
+    entries[1]["mtime"] = "not a number"
+    cachePath.write_text(json.dumps(data))
+
+    with SheetCache(cachePath) as cache:
+        assert cache.entries == {}
+        assert cache.parse(sheet) == PARSED
+        assert cache.parse(other) == PARSED
+
+
+def test_corrupt_file_is_ignored(tmp_path):
+    sheet = tmp_path / "root.kicad_sch"
+    cachePath = tmp_path / "cache.json"
+    write_sheet(sheet)
+
+    for content in ("{not json", '{"version": 1, "entries": [1, 2]}', "[]"):
+        cachePath.write_text(content)
+        with SheetCache(cachePath) as cache:
+            assert cache.entries == {}
+            assert cache.parse(sheet) == PARSED
+
+
+def test_prune(tmp_path):
+    cachePath = tmp_path / "cache.json"
+    sheets = []
+    for index in range(3):
+        sheet = tmp_path / f"{index}.kicad_sch"
+        write_sheet(sheet)
+        sheets.append(sheet)
+
+    with SheetCache(cachePath, maxEntries=2) as cache:
+        for sheet in sheets:
+            cache.parse(sheet)
+        cache.entries[str(sheets[0].resolve())]["used"] = 0
+
+    # The least recently used entry goes first
+    with SheetCache(cachePath) as cache:
+        assert set(cache.entries) == {str(sheets[1].resolve()), str(sheets[2].resolve())}
+
+    # Then the ones whose file is gone, the next time the cache is written
+    sheets[1].unlink()
+    with SheetCache(cachePath) as cache:
+        cache.write()
+    with SheetCache(cachePath) as cache:
+        assert set(cache.entries) == {str(sheets[2].resolve())}
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from conftest import DATA_DIR, EXAMPLES_DIR, REPO_DIR
+from projinst.sexpscan import SexpError, SexpScanner, atom_value
+from projinst.simpleSchParser import sch_parse_file, sch_parse_text
+
+
+def test_atom_value():
+    assert atom_value("bare") == "bare"
+    assert atom_value('"quoted string"') == "quoted string"
+    assert atom_value(r'"a \"b\" c\\d"') == 'a "b" c\\d'
+    assert atom_value(r'"line\nbreak"') == "line\nbreak"
+
+
+def test_children_and_skip():
+    scanner = SexpScanner('(root (a 1 (deep (deeper ")"))) x (b "2") (c 3 4))')
+    scanner.open("root")
+
+    seen = {}
+    for keyword in scanner.children():
+        if keyword == "a":
+            scanner.skip()
+        elif keyword == "b":
+            seen["b"] = scanner.atom()
+            scanner.skip()
+        else:
+            seen[keyword] = scanner.values()
+
+    assert seen == {"b": "2", "c": ["3", "4"]}
+    assert scanner.next() is None
+
+
+def test_values_skip_child_lists():
+    scanner = SexpScanner("(at 1.5 (unlocked yes) 2 90)")
+    scanner.open("at")
+    assert scanner.values() == ["1.5", "2", "90"]
+
+
+def test_errors():
+    with pytest.raises(SexpError):
+        SexpScanner("(kicad_pcb)").open("kicad_sch")
+    with pytest.raises(SexpError):
+        SexpScanner("bare").open()
+
+    scanner = SexpScanner("(kicad_sch (sheet (uuid x)")
+    scanner.open("kicad_sch")
+    with pytest.raises(SexpError):
+        for _ in scanner.children():
+            scanner.skip()
+
+
+def test_schematics_match_baseline():
+    """The scanner based parser returns what the sexpdata based one did, see data/baseline_sch.json."""
+    baseline = json.loads((DATA_DIR / "baseline_sch.json").read_text(encoding="utf-8"))
+    assert baseline
+
+    for relativePath, expected in baseline.items():
+        assert sch_parse_file(REPO_DIR / relativePath) == expected, relativePath
+
+
+def test_every_example_is_in_the_baseline():
+    baseline = json.loads((DATA_DIR / "baseline_sch.json").read_text(encoding="utf-8"))
+    found = {path.relative_to(REPO_DIR).as_posix() for path in EXAMPLES_DIR.rglob("*.kicad_sch")}
+    assert found == set(baseline)
+
+
+def test_sheet_properties_and_other_blocks():
+    text = """(kicad_sch (version 20231120) (uuid "root-uuid")
+      (lib_symbols (symbol "R" (property "Reference" "R")))
+      (sheet (at 10 10) (size 20 20)
+        (property "Sheetname" "Power" (at 10 9 0) (effects (font (size 1.27 1.27))))
+        (property "Sheetfile" "power.kicad_sch" (at 10 31 0))
+        (uuid "sheet-uuid")
+        (pin "VIN" input (at 10 15 180) (uuid "pin-uuid"))))"""
+
+    assert sch_parse_text(text) == {
+        "uuid": "root-uuid",
+        "sheet": [{
+            "property": {"Sheetname": "Power", "Sheetfile": "power.kicad_sch"},
+            "uuid": "sheet-uuid",
+        }],
+    }
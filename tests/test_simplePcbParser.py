@@ -0,0 +1,37 @@
+import json
+
+from conftest import DATA_DIR, EXAMPLES_DIR, REPO_DIR
+from projinst.simplePcbParser import PcbFootprint, pcb_parse_text, pcb_read_footprints
+
+
+def test_boards_match_baseline():
+    """data/baseline_pcb.json holds the footprints of every example board as read with sexpdata."""
+    baseline = json.loads((DATA_DIR / "baseline_pcb.json").read_text(encoding="utf-8"))
+    found = {path.relative_to(REPO_DIR).as_posix() for path in EXAMPLES_DIR.rglob("*.kicad_pcb")}
+    assert found == set(baseline)
+
+    for relativePath, expected in baseline.items():
+        footprints = pcb_read_footprints(REPO_DIR / relativePath)
+        assert [list(footprint) for footprint in footprints] == expected, relativePath
+
+
+def test_limit():
+    board = next(EXAMPLES_DIR.rglob("Basic.kicad_pcb"))
+    assert pcb_read_footprints(board, limit=2) == pcb_read_footprints(board)[:2]
+
+
+def test_old_and_new_footprint_formats():
+    text = """(kicad_pcb (version 20221018)
+      (net 0 "")
+      (module "R_0603" (layer "B.Cu") (at 1.5 -2.25 90)
+        (fp_text reference "R1" (at 0 0)) (path "/a/b"))
+      (segment (start 0 0) (end 1 1) (width 0.2) (layer "F.Cu") (net 0))
+      (footprint "C_0603" (layer "F.Cu") (at 10 20)
+        (property "Reference" "C1" (at 0 0 0) (layer "F.SilkS"))
+        (path "/a/c")
+        (pad "1" smd rect (at -0.8 0) (size 1 1) (layers "F.Cu"))))"""
+
+    assert pcb_parse_text(text) == [
+        PcbFootprint("R1", "/a/b", 1_500_000, -2_250_000, 90.0, True),
+        PcbFootprint("C1", "/a/c", 10_000_000, 20_000_000, 0.0, False),
+    ]
@@ -0,0 +1,45 @@
+import random
+
+from projinst.spatial import MAX_CELLS_PER_BOX, GridIndex, boxes_intersect
+
+
+def test_boxes_intersect():
+    assert boxes_intersect((0, 0, 10, 10), (5, 5, 15, 15))
+    # Touching edges count
+    assert boxes_intersect((0, 0, 10, 10), (10, 0, 20, 10))
+    assert not boxes_intersect((0, 0, 10, 10), (11, 0, 20, 10))
+    assert not boxes_intersect((0, 0, 10, 10), (0, 11, 10, 20))
+
+
+def test_query_matches_brute_force():
+    rng = random.Random(1)
+    index = GridIndex(cellSize=100)
+    boxes = []
+    for value in range(300):
+        left, top = rng.randrange(-2_000, 2_000), rng.randrange(-2_000, 2_000)
+        box = (left, top, left + rng.randrange(0, 400), top + rng.randrange(0, 400))
+        boxes.append(box)
+        index.insert(box, value)
+    assert len(index) == 300
+
+    for _ in range(100):
+        left, top = rng.randrange(-2_500, 2_500), rng.randrange(-2_500, 2_500)
+        query = (left, top, left + rng.randrange(0, 800), top + rng.randrange(0, 800))
+        found = list(index.query(query))
+        assert len(found) == len(set(found))
+        assert set(found) == {value for value, box in enumerate(boxes) if boxes_intersect(box, query)}
+
+
+def test_oversized_boxes():
+    index = GridIndex(cellSize=10)
+    # A ground pour covering far more cells than MAX_CELLS_PER_BOX
+    pour = (0, 0, 10 * MAX_CELLS_PER_BOX, 10 * MAX_CELLS_PER_BOX)
+    index.insert(pour, "pour")
+    index.insert((5, 5, 6, 6), "pad")
+
+    assert index._oversized == [0]
+    assert sorted(index.query((0, 0, 8, 8))) == ["pad", "pour"]
+    assert list(index.query((100, 100, 101, 101))) == ["pour"]
+    assert list(index.query((-50, -50, -40, -40))) == []
+    # A query bigger than MAX_CELLS_PER_BOX looks at everything
+    assert sorted(index.query((-1, -1, 10**6, 10**6))) == ["pad", "pour"]
@@ -0,0 +1,68 @@
+import math
+import pickle
+
+import pytest
+
+from projinst import transform
+from projinst.transform import NUMPY_MIN_POINTS, RigidTransform, point_columns
+
+POINTS = [(0, 0), (1, 0), (0, 1), (123_456, -7_890), (-1_000_001, 2_500_003)]
+
+
+def reference(rotation, offsetX, offsetY, dx, dy):
+    radians = math.radians(rotation)
+    return (
+        round(dy * math.sin(radians) + dx * math.cos(radians) + offsetX),
+        round(dy * math.cos(radians) - dx * math.sin(radians) + offsetY),
+    )
+
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270, -90, 360, 450, -180])
+def test_quarter_turns_are_exact(rotation):
+    rigid = RigidTransform(rotation, 1_000, -2_000)
+    assert rigid._quarter is not None
+    for dx, dy in POINTS:
+        assert rigid.point(dx, dy) == reference(rotation, 1_000, -2_000, dx, dy)
+
+
+def test_nearly_quarter_turn_is_exact():
+    assert RigidTransform(90 + 1e-12, 0, 0)._quarter == 1
+    assert RigidTransform(89.9, 0, 0)._quarter is None
+
+
+def test_quarter_turn_directions():
+    # Rotating (1, 0) by 90 degrees takes it to (0, -1), y points down on a board
+    assert RigidTransform(90, 0, 0).point(1, 0) == (0, -1)
+    assert RigidTransform(180, 0, 0).point(1, 0) == (-1, 0)
+    assert RigidTransform(270, 0, 0).point(1, 0) == (0, 1)
+
+
+@pytest.mark.parametrize("rotation", [0, 30, 90, 135.5, 180, 270])
+def test_points_match_point(rotation):
+    rigid = RigidTransform(rotation, 5_000, 7_000)
+    xs, ys = zip(*POINTS)
+    newXs, newYs = rigid.points(list(xs), list(ys))
+    assert list(zip(newXs, newYs)) == [rigid.point(dx, dy) for dx, dy in POINTS]
+
+
+@pytest.mark.parametrize("rotation", [0, 45, 90, 180, 270, 300.25])
+def test_numpy_matches_python(rotation, monkeypatch):
+    if transform.numpy is None:
+        pytest.skip("NumPy isn't installed")
+
+    count = NUMPY_MIN_POINTS * 2
+    points = [(i * 10_007 - 300_000, 50_000 - i * 3_001) for i in range(count)]
+    rigid = RigidTransform(rotation, 123, -456)
+
+    xs, ys = point_columns(points)
+    withNumpy = rigid.points(xs, ys)
+    assert all(type(x) is int for x in withNumpy[0])
+
+    monkeypatch.setattr(transform, "numpy", None)
+    assert rigid.points(*point_columns(points)) == withNumpy
+
+
+def test_pickle():
+    rigid = RigidTransform(90, 10, 20)
+    copy = pickle.loads(pickle.dumps(rigid))
+    assert (copy.rotation, copy.offsetX, copy.offsetY, copy._quarter) == (90, 10, 20, 1)
@@ -0,0 +1,78 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from projinst.watch import SheetWatcher
+
+SHEET = Path("sub.kicad_sch")
+READ = ((1, 100), (1, 200))
+
+
+class SheetFile:
+    """What SheetWatcher reads of a hdata.SheetFile: the stats it was read with and the current ones."""
+    def __init__(self):
+        self.read = READ
+        self.stats = READ
+
+    def fileStats(self):
+        return self.stats
+
+    def isStale(self):
+        return self.stats != self.read
+
+
+def watcher(debounce=1.0):
+    sheetFile = SheetFile()
+    manager = SimpleNamespace(sheetDict={SHEET: sheetFile})
+    return SheetWatcher(manager, debounce=debounce), sheetFile, manager
+
+
+def test_unchanged_is_never_reported():
+    sheetWatcher, _, _ = watcher()
+    assert sheetWatcher.poll(now=0) == []
+    assert sheetWatcher.poll(now=10) == []
+
+
+def test_reported_once_settled():
+    sheetWatcher, sheetFile, _ = watcher()
+    sheetFile.stats = ((2, 100), (1, 200))
+
+    assert sheetWatcher.poll(now=0) == []
+    assert sheetWatcher.poll(now=0.5) == []
+    assert sheetWatcher.poll(now=1.0) == [SHEET]
+    # Only once, even though it hasn't been read again yet
+    assert sheetWatcher.poll(now=2.0) == []
+
+
+def test_still_being_written():
+    sheetWatcher, sheetFile, _ = watcher()
+    sheetFile.stats = ((1, 100), (2, 210))
+    assert sheetWatcher.poll(now=0) == []
+
+    # Changed again before it settled, the debounce starts over
+    sheetFile.stats = ((1, 100), (3, 220))
+    assert sheetWatcher.poll(now=0.9) == []
+    assert sheetWatcher.poll(now=1.5) == []
+    assert sheetWatcher.poll(now=2.0) == [SHEET]
+
+
+def test_reported_again_after_the_next_change():
+    sheetWatcher, sheetFile, _ = watcher()
+    sheetFile.stats = ((2, 100), (1, 200))
+    sheetWatcher.poll(now=0)
+    assert sheetWatcher.poll(now=1) == [SHEET]
+
+    # Read again by the apply
+    sheetFile.read = sheetFile.stats
+    assert sheetWatcher.poll(now=2) == []
+
+    sheetFile.stats = ((3, 100), (1, 200))
+    sheetWatcher.poll(now=3)
+    assert sheetWatcher.poll(now=4) == [SHEET]
+
+
+def test_sheets_leaving_the_hierarchy():
+    sheetWatcher, sheetFile, manager = watcher()
+    sheetFile.stats = ((2, 100), (1, 200))
+    sheetWatcher.poll(now=0)
+    manager.sheetDict = {}
+    assert sheetWatcher.poll(now=5) == []